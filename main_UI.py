@@ -15,8 +15,7 @@ License:
 Dependencies:
   - vdif_plotting.py
   - vdif_printing.py
-  - vdif_properties.py
-  - vdif_is_simple.py
+  - vdif_file.py
   - tqdm (for progress bars)
   - matplotlib (for plotting, if required in `vdif_plotting`)
   - Pillow
@@ -31,12 +30,12 @@ Usage:
 
 from src import vdif_plotting as pl
 from src import vdif_printing as prnt
-from src import vdif_properties as props
-from src import vdif_is_simple as simp
 from src import vdif_file_search as fs
 from src import predix_splitter as ps
 from src import predix_reader as pr
 from src import vdif_builder as build
+from src import vdif_file as vf
+from src import vdif_tail as tail
 import os
 
 def print_welcome_message():
@@ -56,6 +55,8 @@ def display_commands():
     print("  - help            - Brings up this menu")
     print("  - is_simple       - Check if .vdif is simple, contiguous, and ordered")
     print("  - properties      - Get properties of a simple .vdif file")
+    print("  - index           - Build or load the frame index and list gaps and invalid frames")
+    print("  - tail            - Follow a file that is still being recorded, validating new frames")
     print("  - print_first     - Print the first frame (short format)")
     print("  - plot_first      - Plot the first frame")
     print("  - print_first_all - Print the first frame (full format)")
@@ -66,7 +67,13 @@ def display_commands():
     print("  - plot_repeated_waterfall  - Plot the resultant period sum of waterfall plots")
     print("  - auto_correlate  - Correlate a signal with itself using match filtering")
     print("  - correlate_chirp - Correlates the signal with a chirp ")
+    print("  - correlate_chirp_bank - Correlates the signal with a grid of chirps and lists the SNR of each")
+    print("  - correlate_chirp_stream - Correlates a long range with a chirp in blocks, plotting fast time vs. slow time")
+    print("  - correlate_chirp_decimated - As correlate_chirp_stream, shifting the chirp band to 0 Hz and decimating first")
+    print("  - detect_chirp    - Correlates a long range with a chirp in blocks and logs the echoes found by CFAR")
+    print("  - range_doppler   - Pulse-compresses each pulse period with a chirp and plots the range-Doppler map")
     print("  - correlate_chirp_shifted - Doppler Compensates using a PREDIX file, then Correlates the signal with a chirp")
+    print("  - correlate_chirp_shifted_stream - As correlate_chirp_stream, Doppler compensating each block using a PREDIX file")
     print("  - exit            - Exit the program")
     print("  - clear           - clear the terminal\n")
 
@@ -124,8 +131,11 @@ def build_vdif_files():
             print("Unknown command. Please try again.")
 
 def process_vdif_files():
-    vdif_file = fs.get_vdif_file_path()
+    # Keep one session open so that commands share the mapping, properties and index
+    with vf.VdifFile(fs.get_vdif_file_path()) as vdif_file:
+        run_analyser_commands(vdif_file)
 
+def run_analyser_commands(vdif_file):
     while True:
         print("\n  ---- VDIF ANALYSER ----")
         command = get_command()
@@ -133,9 +143,13 @@ def process_vdif_files():
         if command == "help":
             display_commands()
         elif command == "is_simple":
-            simp.check_simplicity(vdif_file)
+            vdif_file.check_simplicity()
         elif command == "properties":
-            props.print_vdif_file_properties(vdif_file)
+            vdif_file.print_properties()
+        elif command == "index":
+            vdif_file.print_index()
+        elif command == "tail":
+            tail.tail_vdif_file(vdif_file)
         elif command == "print_first":
             prnt.print_first_frame_short(vdif_file)
         elif command == "plot_first":
@@ -156,8 +170,20 @@ def process_vdif_files():
             pl.auto_correlate(vdif_file)
         elif command == "correlate_chirp":
             pl.correlate_chirp(vdif_file)
+        elif command == "correlate_chirp_bank":
+            pl.correlate_chirp_bank(vdif_file)
+        elif command == "correlate_chirp_stream":
+            pl.correlate_chirp_streaming(vdif_file)
+        elif command == "correlate_chirp_decimated":
+            pl.correlate_chirp_streaming(vdif_file, decimate=True)
+        elif command == "detect_chirp":
+            pl.detect_chirp(vdif_file)
+        elif command == "range_doppler":
+            pl.plot_frames_range_doppler(vdif_file)
         elif command == "correlate_chirp_shifted":
             pl.correlate_chirp_shifted(vdif_file)
+        elif command == "correlate_chirp_shifted_stream":
+            pl.correlate_chirp_streaming(vdif_file, compensate_doppler=True)
         elif command == "exit":
             print("Exiting the analyser. Returning to main menu.")
             break
@@ -1,7 +1,6 @@
 from src import vdif_plotting as pl
 from src import vdif_printing as prnt
-from src import vdif_properties as props
-from src import vdif_is_simple as simp
+from src import vdif_file as vf
 from src import vdif_file_search as fs
 from src import predix_splitter as ps
 from src import predix_reader as pr
@@ -9,15 +8,18 @@ from src import vdif_builder as build
 
 def main():
     # Analysing a vdif file
-    vdif_file = "vdif_sr8.0MHz_bw4.0MHz_pw2.5us_pp25.0us_dur10.0s_epoch48_start15572600s_snr10.0_randomPhase_dopplerShift.vdif"
+    vdif_file_path = "vdif_sr8.0MHz_bw4.0MHz_pw2.5us_pp25.0us_dur10.0s_epoch48_start15572600s_snr10.0_randomPhase_dopplerShift.vdif"
+
+    # Open the file once and share the session between the steps below
+    vdif_file = vf.VdifFile(vdif_file_path)
 
     # Verify that the file is simple as defined in the vdif manual
     print("Checking simplicity")
-    simp.check_simplicity(vdif_file)
+    vdif_file.check_simplicity()
 
     # Print the file properties
     print("Printing properties")
-    props.print_vdif_file_properties(vdif_file)
+    vdif_file.print_properties()
 
     # Print the first frame of the vdif file in short
     print("Printing first frame")
@@ -56,6 +58,8 @@ def main():
 
     pl.correlate_chirp_shifted(vdif_file, predix_file, start_time, end_time, bandwidth, pulse_width, phase_offset)
 
+    vdif_file.close()
+
     build.plots_to_pdf()
 
     input("Press Enter to close graphs...")
@@ -1,23 +1,48 @@
-import mmap
-import src.vdif_properties as props
-import src.vdif_data_frame_reader as fr
 import src.vdif_datetime as dt
+import src.vdif_file as vf
 
-def process_data_window(file_path, process_function, start_seconds=None, end_seconds=None):
+def process_data_window(vdif_file, process_function, start_seconds=None, end_seconds=None, workers=1, channel=0, thread_id=None):
     """
     Process a VDIF file by extracting data for a user-specified time range and applying a function.
     Args:
-        file_path (str): Path to the VDIF file.
+        vdif_file (str or VdifFile): Path to the VDIF file, or an open session on it.
         process_function (callable): Function to process the extracted data (e.g., plotting or printing).
+            It is called as process_function(file_info, starting_header, data, start_seconds, end_seconds),
+            where data holds the "samples" and their "time_axis" (see fr.build_vdif_data).
+        workers (int): Number of processes to extract the data with.
+        channel (int): Channel of multi-channel data to process. None passes every channel.
+        thread_id (int): Thread of a multi-thread file to process. Defaults to the lowest thread ID.
     """
-    file_info = props.print_vdif_file_properties(file_path)
-    
-    if start_seconds == None or end_seconds == None:
-        start_seconds, end_seconds = dt.get_time_range_from_user(file_info)
+    with vf.open_vdif_file(vdif_file) as session:
+        file_info = session.print_properties()
 
-    with open(file_path, 'rb') as file:
-        mmapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
-        starting_header, data = fr.generate_data_from_time_range(file_info, mmapped_file, start_seconds, end_seconds)
+        if start_seconds == None or end_seconds == None:
+            start_seconds, end_seconds = dt.get_time_range_from_user(file_info)
+
+        starting_header, data = session.read(start_seconds, end_seconds, workers, thread_id, channel)
 
     process_function(file_info, starting_header, data, start_seconds, end_seconds)
 
+
+def process_data_chunks(vdif_file, process_function, start_seconds=None, end_seconds=None, frames_per_chunk=1000, overlap_frames=0, channel=0, thread_id=None):
+    """
+    Process a VDIF file chunk by chunk over a user-specified time range, so that the range
+    does not have to fit in memory.
+    Args:
+        vdif_file (str or VdifFile): Path to the VDIF file, or an open session on it.
+        process_function (callable): Function called once per chunk, with the same arguments as
+            in process_data_window but with the data of that chunk only.
+        frames_per_chunk (int): Number of frames in each chunk.
+        overlap_frames (int): Number of frames shared between consecutive chunks.
+        channel (int): Channel of multi-channel data to process. None passes every channel.
+        thread_id (int): Thread of a multi-thread file to process. Defaults to the lowest thread ID.
+    """
+    with vf.open_vdif_file(vdif_file) as session:
+        file_info = session.print_properties()
+
+        if start_seconds == None or end_seconds == None:
+            start_seconds, end_seconds = dt.get_time_range_from_user(file_info)
+
+        chunks = session.iterate_chunks(start_seconds, end_seconds, frames_per_chunk, overlap_frames, thread_id, channel)
+        for starting_header, data in chunks:
+            process_function(file_info, starting_header, data, start_seconds, end_seconds)
@@ -14,6 +14,15 @@ from tqdm import tqdm
 from PIL import Image
 import os
 
+# Chirps laid out at a time by generate_fm_chirp
+CHIRP_BLOCK_CHIRPS = 4096
+
+# Output samples delayed at a time by doppler_shift
+DOPPLER_CHUNK_SAMPLES = 1 << 18
+
+# Taps of the windowed sinc that interpolates fractional delays
+FRACTIONAL_DELAY_TAPS = 16
+
 def create_vdif_file(data_array, sample_rate, filename, 
                     start_seconds_from_epoch=0.0, epoch=48, station_id=0,
                     bits_per_sample=8):
@@ -89,6 +98,11 @@ def create_vdif_file(data_array, sample_rate, filename,
 def generate_fm_chirp(B, chirp_length, signal_period, sample_rate, total_duration, signal_portion, randomise_phase=False):
     """
     Generate an FM chirp signal with specified parameters, preallocating the array.
+
+    Each period is a gap of zeros followed by one chirp, and the chirps that fit whole into
+    the duration are kept. The chirp is computed once, and the train is laid out a block of
+    CHIRP_BLOCK_CHIRPS chirps at a time through a (chirps x period) view of the output. Random
+    phases are applied to the block as a rotation of the chirp's cosine and sine.
     
     Args:
         B (float): Bandwidth (Hz).
@@ -100,51 +114,52 @@ def generate_fm_chirp(B, chirp_length, signal_period, sample_rate, total_duratio
         randomise_phase (bool): Randomize phase for each chirp (default: False).
     
     Returns:
-        np.ndarray: Generated signal (complex-valued).
+        np.ndarray: Generated signal (int8), the real part of the chirps.
     """
 
     print(f"Chirp Length: {chirp_length} s")
     print(f"Signal Period: {signal_period} s")
     # Calculate total samples and preallocate array
     total_samples = int(total_duration * sample_rate)
-    signal = np.zeros(total_samples, dtype=np.complex128)
+    signal = np.zeros(total_samples, dtype=np.int8)
     
     # Time vector for one chirp
     t_chirp = np.linspace(0, chirp_length, int(chirp_length * sample_rate), endpoint=False)
     chirp_samples = len(t_chirp)
-    
-    current_sample = 0  # Track the current sample index
-    num_chirps = int(total_duration / signal_period)  # Estimate the number of chirps
-    
+    gap_samples = int((signal_period - chirp_length) * sample_rate)
+    if gap_samples < 0:
+        raise ValueError("The chirp is longer than the signal period.")
+
+    period_samples = gap_samples + chirp_samples
+    num_chirps = total_samples // period_samples if period_samples > 0 else 0
+
+    # One row per period, with the chirp after the gap
+    chirps = signal[:num_chirps * period_samples].reshape(num_chirps, period_samples)[:, gap_samples:]
+
+    # The chirp without its phase offset, scaled to the output
+    chirp_phase = np.pi * (B / chirp_length) * t_chirp**2
+    scale = 63 * signal_portion
+    scaled_cos = scale * np.cos(chirp_phase)
+    scaled_sin = scale * np.sin(chirp_phase)
+
+    # Draw every phase at once, which gives the same values as one draw per chirp
+    phases = np.random.uniform(0, 2 * np.pi, num_chirps) if randomise_phase else None
+
     # Add a progress bar
     with tqdm(total=num_chirps, desc="Generating FM chirp", unit="chirp") as pbar:
-        while True:
-            # Calculate next chirp start
-            next_chirp_sample = current_sample + int((signal_period - chirp_length) * sample_rate)
-            
-            # Add gap (zeros) between current_sample and next_chirp_sample
-            gap_start = current_sample
-            gap_end = min(next_chirp_sample, total_samples)
-            gap_length = gap_end - gap_start
-            if gap_length > 0:
-                signal[gap_start:gap_end] = 0
-            
-            # Add chirp if there's space
-            chirp_start = gap_end
-            chirp_end = chirp_start + chirp_samples
-            if chirp_end <= total_samples:
-                # Generate random phase if needed
-                phase = np.random.uniform(0, 2 * np.pi) if randomise_phase else 0
-                chirp = np.exp(1j * (np.pi * (B / chirp_length) * t_chirp**2 + phase))
-                
-                # Insert chirp into the signal
-                signal[chirp_start:chirp_end] = chirp
-                current_sample = chirp_end
-                pbar.update(1)  # Update progress bar
+        for block_start in range(0, num_chirps, CHIRP_BLOCK_CHIRPS):
+            block = chirps[block_start:block_start + CHIRP_BLOCK_CHIRPS]
+
+            if phases is None:
+                block[:] = scaled_cos.astype(np.int8)
             else:
-                break  # Exit loop if no space for another chirp
-    
-    return (signal.real * 63 * signal_portion).astype(np.int8)
+                # Re(exp(j(chirp_phase + phase))) = cos(chirp_phase) cos(phase) - sin(chirp_phase) sin(phase)
+                block_phases = phases[block_start:block_start + len(block), np.newaxis]
+                block[:] = (scaled_cos * np.cos(block_phases) - scaled_sin * np.sin(block_phases)).astype(np.int8)
+
+            pbar.update(len(block))
+
+    return signal
 
 def add_noise(signal, noise_portion):
     """
@@ -172,6 +187,31 @@ def add_noise(signal, noise_portion):
 
 def generate_rtt_from_predix(epoch, seconds_since_epoch, duration, sample_rate, predix_file=None):
     
+    rtt_interp = get_rtt_interpolator(epoch, predix_file)
+    if rtt_interp is None:
+        return
+
+    # Generate the time array for the desired duration and sample rate, offset from the start
+    # after the steps are taken so that their spacing keeps full precision
+    time_array = seconds_since_epoch + np.arange(int(np.ceil(duration * sample_rate))) / sample_rate
+
+    # Interpolate the RTT values for the time array
+    rtt_values = rtt_interp(time_array)
+
+    return rtt_values
+
+def get_rtt_interpolator(epoch, predix_file=None):
+    """
+    Reads the RTT column of a PREDIX file into a function of time.
+
+    Args:
+        epoch (int): Reference epoch of the VDIF file (half years since 2000).
+        predix_file (str): Path to the PREDIX file. The user is asked to pick one if None.
+
+    Returns:
+        scipy.interpolate.interp1d: The RTT (s) at seconds since the reference epoch, linearly
+            interpolated between the PREDIX rows. None if the file has no RTT column.
+    """
     if not predix_file:
         predix_file = ps.find_and_select_txt_file()
         
@@ -202,19 +242,17 @@ def generate_rtt_from_predix(epoch, seconds_since_epoch, duration, sample_rate,
     times_since_epoch = (timestamps_np - epoch_time).astype('float64')
 
     # Create an interpolation function for the RTT values
-    rtt_interp = interp1d(times_since_epoch, rtt_column, kind='linear', fill_value="extrapolate")
+    return interp1d(times_since_epoch, rtt_column, kind='linear', fill_value="extrapolate")
 
-    # Generate the time array for the desired duration and sample rate
-    start_time = seconds_since_epoch
-    end_time = start_time + duration
-    time_array = np.arange(start_time, end_time, 1/sample_rate)
-
-    # Interpolate the RTT values for the time array
-    rtt_values = rtt_interp(time_array)
-
-    return rtt_values
+def get_rtt_minimum(rtt_interp, start_seconds, end_seconds):
+    """
+    Returns the smallest RTT of a linear RTT interpolator over a time range, which is at one
+    end of the range or at one of the PREDIX times within it.
+    """
+    knots = rtt_interp.x[(rtt_interp.x > start_seconds) & (rtt_interp.x < end_seconds)]
+    return float(np.min(rtt_interp(np.concatenate(([start_seconds, end_seconds], knots)))))
 
-def doppler_shift(data, rtt, sample_rate):
+def doppler_shift(data, rtt, sample_rate, fractional_delay=False):
     """
     Applies Doppler shift to a signal using pre-interpolated RTT values.
     Uses a sneaky trick to shift the delayed time function to start at t=0.
@@ -223,6 +261,31 @@ def doppler_shift(data, rtt, sample_rate):
         data (np.array): Input signal (no time bearing).
         rtt (np.array): Pre-interpolated RTT values (in seconds).
         sample_rate (float): Sample rate of the input signal (in Hz).
+        fractional_delay (bool): Interpolate the sub-sample part of the delay (default: False).
+
+    Returns:
+        np.array: Doppler-shifted signal (received array).
+    """
+    return doppler_shift_with_rtt_function(data, lambda indices: rtt[indices], np.min(rtt), len(rtt), sample_rate, fractional_delay)
+
+def doppler_shift_with_rtt_function(data, rtt_function, rtt_reference, num_samples, sample_rate, fractional_delay=False):
+    """
+    Applies Doppler shift to a signal, evaluating the RTT a chunk of DOPPLER_CHUNK_SAMPLES
+    output samples at a time, so that no array of the RTT of every sample is needed.
+
+    The delayed index of every output sample is computed with array arithmetic. By default
+    each output takes the input sample at its delayed time rounded towards zero. With
+    fractional_delay, it is interpolated between the input samples around its delayed time
+    with a Blackman windowed sinc of FRACTIONAL_DELAY_TAPS taps, which keeps the signal
+    band-limited.
+
+    Args:
+        data (np.array): Input signal (no time bearing).
+        rtt_function (callable): Gives the RTT values (in seconds) of an array of output sample numbers.
+        rtt_reference (float): RTT that is not delayed, at most the smallest RTT of the output (see get_rtt_minimum).
+        num_samples (int): Number of output samples.
+        sample_rate (float): Sample rate of the input signal (in Hz).
+        fractional_delay (bool): Interpolate the sub-sample part of the delay (default: False).
 
     Returns:
         np.array: Doppler-shifted signal (received array).
@@ -230,80 +293,216 @@ def doppler_shift(data, rtt, sample_rate):
     # Time step for the input signal
     dt = 1 / sample_rate
 
-    # Generate time array for the input signal
-    signal_time = np.arange(len(data)) * dt
+    # Initialize the received array with zeros
+    received_array = np.zeros(num_samples, dtype=np.int8)
 
-    # Shift the RTT values to start at t=0
-    rtt_min = np.min(rtt)
-    rtt_shifted = rtt - rtt_min
+    print("Doppler Shifting...")
+    for chunk_start in tqdm(range(0, num_samples, DOPPLER_CHUNK_SAMPLES), unit="chunk"):
+        chunk_end = min(chunk_start + DOPPLER_CHUNK_SAMPLES, num_samples)
 
-    # Initialize the received array with zeros (size defined by rtt array)
-    received_array = np.zeros(len(rtt))
+        # Shift the RTT values to start at t=0
+        rtt_shifted = rtt_function(np.arange(chunk_start, chunk_end)) - rtt_reference
 
-    # Loop over each time step in the RTT array with a progress bar
-    print("Doppler Shifting...")
-    for i, rtt_value in tqdm(enumerate(rtt_shifted), total=len(rtt_shifted)):
-        # Calculate the delayed time (shifted to start at t=0)
-        delayed_time = signal_time[i] - rtt_value
+        # Calculate the delayed time (shifted to start at t=0), in input samples
+        delayed_position = (np.arange(chunk_start, chunk_end) * dt - rtt_shifted) / dt
 
-        # Compute the delayed index using flooring
-        delayed_index = int(delayed_time / dt)
+        # Compute the delayed index, rounding towards zero
+        delayed_index = np.trunc(delayed_position).astype(np.int64)
 
-        # Skip if delayed index is out of bounds
-        if delayed_index >= len(data) or delayed_index < 0:
-            continue
+        # Skip the samples whose delayed index is out of bounds
+        valid = (delayed_index >= 0) & (delayed_index < len(data))
 
-        # Assign the value from data to received_array
-        received_array[i] = data[delayed_index]
+        if fractional_delay:
+            values = interpolate_fractional_delay(data, delayed_position[valid])
+            received_array[chunk_start:chunk_end][valid] = np.clip(np.round(values), -128, 127)
+        else:
+            received_array[chunk_start:chunk_end][valid] = data[delayed_index[valid]]
 
-    return received_array.astype(np.int8)
+    return received_array
 
-def inverse_doppler_shift(received_data, rtt, sample_rate):
+def interpolate_fractional_delay(data, positions):
+    """
+    Interpolates a signal at fractional sample positions with a Blackman windowed sinc of
+    FRACTIONAL_DELAY_TAPS taps. The taps of each position are normalised to sum to one,
+    and samples beyond the ends of the signal are taken as zero.
+
+    Args:
+        data (np.array): The signal.
+        positions (np.array): Positions to interpolate at, in samples.
+
+    Returns:
+        np.array: The interpolated values.
+    """
+    half_taps = FRACTIONAL_DELAY_TAPS // 2
+    first_index = np.floor(positions).astype(np.int64) - half_taps + 1
+    tap_indices = first_index[:, np.newaxis] + np.arange(FRACTIONAL_DELAY_TAPS)
+
+    # Distance of each tap from its position, and the windowed sinc weight there
+    offsets = positions[:, np.newaxis] - tap_indices
+    weights = np.sinc(offsets) * (0.42 + 0.5 * np.cos(np.pi * offsets / half_taps) + 0.08 * np.cos(2 * np.pi * offsets / half_taps))
+    weights /= np.sum(weights, axis=1, keepdims=True)
+    weights[(tap_indices < 0) | (tap_indices >= len(data))] = 0
+
+    return np.sum(weights * np.take(data, tap_indices, mode="clip"), axis=1)
+
+def inverse_doppler_shift(received_data, rtt, sample_rate, fill_holes=False):
     """
     Reconstructs the transmitted signal from a received signal by reversing the Doppler shift.
 
+    Each received sample is moved to the transmitted sample nearest its received time less
+    its RTT above the smallest RTT. Where several received samples land on the same
+    transmitted sample the last one is kept, and transmitted samples that none land on are
+    zero, or with fill_holes hold the sample before them. The signal is compensated a chunk
+    of DOPPLER_CHUNK_SAMPLES at a time (see compensate_doppler_chunk).
+
     Args:
         received_data (np.array): Received signal affected by Doppler shift.
         rtt (np.array): RTT values (in seconds) at each received time step.
         sample_rate (float): Sample rate of the signal (in Hz).
+        fill_holes (bool): Fill transmitted samples that no received sample lands on with the sample before them.
 
     Returns:
         np.array: Reconstructed transmitted signal.
     """
-    dt = 1 / sample_rate  # Time step for the signal
+    print("Compensating for Doppler shifting...")
 
-    received_time = np.arange(len(received_data)) * dt  # Time array for received signal
+    compensator = start_doppler_compensator(sample_rate, lambda indices: rtt[indices], np.min(rtt), received_data.dtype, fill_holes)
 
-    # Shift RTT so that it starts from zero
-    rtt_min = np.min(rtt)
-    rtt_shifted = rtt - rtt_min
+    transmitted_chunks = []
+    for chunk_start in tqdm(range(0, len(received_data), DOPPLER_CHUNK_SAMPLES), desc="Reconstructing signal", unit="chunk"):
+        transmitted_chunks.append(compensate_doppler_chunk(compensator, received_data[chunk_start:chunk_start + DOPPLER_CHUNK_SAMPLES]))
+    transmitted_chunks.append(flush_doppler_compensator(compensator))
 
-    print("Compensating for Doppler shifting...")
+    return np.concatenate(transmitted_chunks).astype(np.int8)
+
+def start_doppler_compensator(sample_rate, rtt_function, rtt_reference, dtype=np.int8, fill_holes=False):
+    """
+    Starts a Doppler compensation that consecutive chunks of a received signal are passed
+    through by compensate_doppler_chunk, so that a long section can be compensated as it is read.
 
-    # Compute transmitted time
-    transmitted_time = received_time - rtt_shifted
+    Args:
+        sample_rate (float): Sample rate of the signal (in Hz).
+        rtt_function (callable): Gives the RTT values (in seconds) of an array of received sample
+            numbers, counted from the first sample of the first chunk.
+        rtt_reference (float): RTT that is not moved, at most the smallest RTT of the section (see get_rtt_minimum).
+        dtype (np.dtype): Type of the signal's samples.
+        fill_holes (bool): Fill transmitted samples that no received sample lands on with the sample before them.
 
-    # Initialize transmitted signal
-    transmitted_array = np.zeros(len(received_data), dtype=received_data.dtype)
+    Returns:
+        dict: The compensator.
+    """
+    return {
+        "sample_rate": sample_rate,
+        "rtt_function": rtt_function,
+        "rtt_reference": rtt_reference,
+        "fill_holes": fill_holes,
+        "inputs_done": 0,
+        "remainder": np.zeros(0, dtype=dtype),
+        "outputs_done": 0,
+        "pending": np.zeros(0, dtype=dtype),
+        "pending_written": np.zeros(0, dtype=bool),
+        "last_value": 0,
+    }
+
+def compensate_doppler_chunk(compensator, received_data, flush=False):
+    """
+    Moves the next chunk of a received signal to its transmitted times (see inverse_doppler_shift).
 
-    # Find valid indices
-    valid_indices = (transmitted_time >= 0) & (transmitted_time < received_time[-1])
+    As the RTT changes by less than one sample per sample, each received sample lands no
+    earlier than the one before it. The transmitted samples before where the last received
+    sample of the chunk lands are final and are returned, and the rest are kept for the next
+    chunk. The last received sample is itself kept back until the next chunk, so that the
+    final sample of the section is known when it is moved.
 
-    # Get valid time and data
-    valid_transmitted_time = transmitted_time[valid_indices]
-    valid_received_data = received_data[valid_indices]
+    Args:
+        compensator (dict): Compensator from start_doppler_compensator.
+        received_data (np.array): The next samples of the received signal.
+        flush (bool): If True the signal ends here, and every remaining transmitted sample is returned.
 
-    # Compute integer indices
-    transmitted_indices = np.round(valid_transmitted_time / dt).astype(int)
+    Returns:
+        np.array: The next transmitted samples. Over a whole section, there are as many as received samples.
+    """
+    dt = 1 / compensator["sample_rate"]  # Time step for the signal
+
+    received_data = np.concatenate((compensator["remainder"], received_data))
+    if not flush:
+        compensator["remainder"] = received_data[-1:]
+        received_data = received_data[:-1]
+
+    first_input = compensator["inputs_done"]
+    compensator["inputs_done"] += len(received_data)
+    received_indices = np.arange(first_input, compensator["inputs_done"])
+    received_time = received_indices * dt
+
+    # Compute transmitted time, shifting the RTT so that it starts from zero
+    transmitted_time = received_time - (compensator["rtt_function"](received_indices) - compensator["rtt_reference"])
 
-    # Ensure no out-of-bounds indices
-    transmitted_indices = np.clip(transmitted_indices, 0, len(received_data) - 1)
+    # Find valid indices, dropping the samples moved past the end of the section
+    valid_indices = transmitted_time >= 0
+    if flush and len(received_time):
+        valid_indices &= transmitted_time < received_time[-1]
 
-    # Process with progress bar
-    for i in tqdm(range(len(transmitted_indices)), desc="Reconstructing signal", unit="samples"):
-        transmitted_array[transmitted_indices[i]] = valid_received_data[i]
+    transmitted_indices = np.round(transmitted_time[valid_indices] / dt).astype(np.int64)
+    valid_received_data = received_data[valid_indices]
 
-    return transmitted_array.astype(np.int8)
+    # Keep the last received sample landing on each transmitted sample. No sample may land
+    # at all, as on the flush of a falling or constant RTT
+    if len(transmitted_indices) > 1:
+        if np.all(transmitted_indices[1:] >= transmitted_indices[:-1]):
+            last = np.append(transmitted_indices[1:] != transmitted_indices[:-1], True)
+        else:
+            last = np.zeros(len(transmitted_indices), dtype=bool)
+            last[len(transmitted_indices) - 1 - np.unique(transmitted_indices[::-1], return_index=True)[1]] = True
+        transmitted_indices = transmitted_indices[last]
+        valid_received_data = valid_received_data[last]
+
+    # Samples already returned can not be changed, which needs the RTT to change faster than time
+    outputs_done = compensator["outputs_done"]
+    kept = transmitted_indices >= outputs_done
+    transmitted_indices = transmitted_indices[kept] - outputs_done
+    valid_received_data = valid_received_data[kept]
+
+    # Write into the transmitted samples not yet returned
+    if flush:
+        pending_length = compensator["inputs_done"] - outputs_done
+        kept = transmitted_indices < pending_length
+        transmitted_indices = transmitted_indices[kept]
+        valid_received_data = valid_received_data[kept]
+    else:
+        pending_length = max(len(compensator["pending"]), transmitted_indices.max() + 1 if len(transmitted_indices) else 0)
+    num_pending = min(len(compensator["pending"]), pending_length)
+    pending = np.zeros(pending_length, dtype=compensator["pending"].dtype)
+    pending_written = np.zeros(pending_length, dtype=bool)
+    pending[:num_pending] = compensator["pending"][:num_pending]
+    pending_written[:num_pending] = compensator["pending_written"][:num_pending]
+    pending[transmitted_indices] = valid_received_data
+    pending_written[transmitted_indices] = True
+
+    # Later received samples land no earlier than the last one of this chunk
+    if flush:
+        num_final = pending_length
+    else:
+        num_final = transmitted_indices[-1] if len(transmitted_indices) else 0
+    transmitted_array = pending[:num_final]
+    written = pending_written[:num_final]
+    compensator["pending"] = pending[num_final:]
+    compensator["pending_written"] = pending_written[num_final:]
+    compensator["outputs_done"] += num_final
+
+    if compensator["fill_holes"] and num_final:
+        # Take each sample from the last written sample at or before it
+        sources = np.where(written, np.arange(num_final), -1)
+        np.maximum.accumulate(sources, out=sources)
+        transmitted_array = np.where(sources >= 0, transmitted_array[np.maximum(sources, 0)], compensator["last_value"]).astype(transmitted_array.dtype)
+        compensator["last_value"] = transmitted_array[-1]
+
+    return transmitted_array
+
+def flush_doppler_compensator(compensator):
+    """
+    Ends the signal passed through a compensator, returning its remaining transmitted samples.
+    """
+    return compensate_doppler_chunk(compensator, compensator["remainder"][:0], flush=True)
 
 def build_vdif():
     print("Welcome to the VDIF builder interface.")
@@ -325,13 +524,19 @@ def build_vdif():
     add_doppler_shift = input("Would you like to simulate doppler shift with a PREDIX file? (Y/n, default Y): ").strip().lower() != "n"
     
     if add_doppler_shift:
-        rtt = generate_rtt_from_predix(epoch, seconds_since_epoch, duration, sample_rate)
+        fractional_delay = input("Would you like to interpolate the fractional part of the delay? (y/N, default N): ").strip().lower() == "y"
+        rtt_interp = get_rtt_interpolator(epoch)
+        add_doppler_shift = rtt_interp is not None
 
     data = generate_fm_chirp(bandwidth, pulse_width, pulse_period, sample_rate, duration+1, signal_portion, randomise_phase)
     data = add_noise(data, noise_portion)
         
     if add_doppler_shift:
-        data = doppler_shift(data, rtt, sample_rate)
+        # The RTT at the times generate_rtt_from_predix gives, evaluated a chunk at a time
+        num_samples = int(np.ceil(duration * sample_rate))
+        rtt_function = lambda indices: rtt_interp(seconds_since_epoch + indices / sample_rate)
+        rtt_reference = get_rtt_minimum(rtt_interp, seconds_since_epoch, seconds_since_epoch + (num_samples - 1) / sample_rate)
+        data = doppler_shift_with_rtt_function(data, rtt_function, rtt_reference, num_samples, sample_rate, fractional_delay)
 
     # Construct the filename using an f-string
     filename = (
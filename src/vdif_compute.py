@@ -0,0 +1,713 @@
+"""
+-------------------------------------------------
+File: vdif_compute.py
+Description: The numerical side of the analyses, with no plotting. Each
+             compute function returns its result arrays in a dict, so that
+             scripted and headless batch jobs can save the numbers directly
+             with save_result, and vdif_plotting and vdif_correlating only
+             draw them.
+License: see LICENCE.txt
+Dependencies:
+    - numpy
+    - scipy
+    - tqdm
+-------------------------------------------------
+"""
+
+import os
+import itertools
+import numpy as np
+from collections import OrderedDict
+from scipy.signal import stft
+from tqdm import tqdm
+import src.vdif_fft as fft
+import src.vdif_precision as prec
+import src.vdif_analysing as anal
+
+# Lags of the overlap-save correlation computed in one batch of FFTs
+OVERLAP_SAVE_BATCH_BLOCKS = 256
+
+# Largest number of slow-time lines kept for the fast time vs. slow time heatmap
+MAX_SLOW_TIME_LINES = 1000
+
+# Pulses pulse-compressed in one batch of FFTs by compute_range_doppler
+RANGE_DOPPLER_BATCH_PULSES = 1024
+
+# Memory the batched correlations of compute_template_bank may use at once
+TEMPLATE_BANK_BATCH_BYTES = 256 * 1024**2
+
+# Speed of light in m/s
+SPEED_OF_LIGHT = 299792458.0
+
+# Chirp template spectra kept in memory, least recently used first, and their size limit
+template_spectra = OrderedDict()
+TEMPLATE_CACHE_BYTES = 512 * 1024**2
+
+# Directory chirp template spectra are also saved to and loaded from. None keeps them in memory only
+TEMPLATE_CACHE_DIRECTORY = None
+
+def generate_chirp(sample_rate, bandwidth, pulse_width, phase_offset):
+    """
+    Generate a single chirp that starts at 0 Hz and sweeps up to the bandwidth over a pulse width.
+
+    Args:
+        sample_rate (float): Sampling rate of the signal (samples per second).
+        bandwidth (float): Bandwidth of the chirp in Hz.
+        pulse_width (float): Duration of the chirp in seconds.
+        phase_offset (float): Phase of the chirp in radians.
+
+    Returns:
+        np.ndarray: The int8 chirp, one pulse width long.
+    """
+    chirp_samples = int(pulse_width * sample_rate)  # Number of samples for chirp duration
+    t = np.arange(chirp_samples) / sample_rate  # Time vector for chirp duration
+
+    # Chirp rate
+    k = bandwidth / pulse_width  # Hz per second
+
+    # Generate chirp using exponential phase
+    chirp_signal = np.exp(1j * (np.pi * k * t**2 + phase_offset)).real
+
+    return (63 * chirp_signal).astype(np.int8)  # Scale the chirp
+
+def get_overlap_save_length(template_length):
+    """
+    Picks the FFT length of the overlap-save correlation for a template: a fast length
+    several times longer than the template, so that most of each FFT gives new lags.
+    """
+    return fft.next_fast_length(max(8 * template_length, 4096))
+
+def get_template_spectrum(template, fft_length):
+    """
+    Returns the conjugated spectrum of a template zero-padded to fft_length. Real templates
+    give the non-negative frequencies only, and complex templates every frequency.
+    """
+    return np.conj(fft.spectrum(template, fft_length))
+
+def get_chirp_spectrum(sample_rate, bandwidth, pulse_width, phase_offset, fft_length, full=False):
+    """
+    Returns the conjugated spectrum of a chirp zero-padded to fft_length, ready to multiply
+    with the spectrum of a signal. Spectra are kept in an LRU cache keyed by the chirp
+    parameters and FFT length, and saved to TEMPLATE_CACHE_DIRECTORY if it is set, so
+    repeated correlations skip building and transforming the template. Spectra computed at
+    each precision (see vdif_precision) are kept apart.
+
+    Args:
+        sample_rate (float): Sampling rate of the signal (samples per second).
+        bandwidth (float): Bandwidth of the chirp in Hz.
+        pulse_width (float): Duration of the chirp in seconds.
+        phase_offset (float): Phase of the chirp in radians.
+        fft_length (int): Length of the transform.
+        full (bool): Whether to return every frequency, for complex signals (see fft.spectrum).
+
+    Returns:
+        np.ndarray: The read-only conjugated template spectrum.
+    """
+    key = (float(bandwidth), float(pulse_width), float(phase_offset), float(sample_rate), int(fft_length), bool(full), prec.PRECISION)
+
+    if key in template_spectra:
+        template_spectra.move_to_end(key)
+        return template_spectra[key]
+
+    template_spectrum = load_chirp_spectrum(key)
+    if template_spectrum is None:
+        chirp_signal = generate_chirp(sample_rate, bandwidth, pulse_width, phase_offset)
+        template_spectrum = np.conj(fft.spectrum(chirp_signal, fft_length, full))
+        save_chirp_spectrum(key, template_spectrum)
+
+    template_spectrum.setflags(write=False)
+    template_spectra[key] = template_spectrum
+
+    # Evict the least recently used spectra, always keeping the newest
+    while len(template_spectra) > 1 and sum(spectrum.nbytes for spectrum in template_spectra.values()) > TEMPLATE_CACHE_BYTES:
+        template_spectra.popitem(last=False)
+
+    return template_spectrum
+
+def get_chirp_spectrum_path(key):
+    bandwidth, pulse_width, phase_offset, sample_rate, fft_length, full, precision = key
+    filename = f"chirp_bw{bandwidth!r}_pw{pulse_width!r}_ph{phase_offset!r}_sr{sample_rate!r}_n{fft_length}_{'full' if full else 'real'}_{precision}.npy"
+    return os.path.join(TEMPLATE_CACHE_DIRECTORY, filename)
+
+def load_chirp_spectrum(key):
+    """
+    Loads a chirp template spectrum saved by save_chirp_spectrum.
+    Returns:
+        np.ndarray: The spectrum, or None if caching to disk is off or it has not been saved.
+    """
+    if TEMPLATE_CACHE_DIRECTORY is None:
+        return None
+
+    spectrum_path = get_chirp_spectrum_path(key)
+    if not os.path.exists(spectrum_path):
+        return None
+
+    try:
+        return np.load(spectrum_path, allow_pickle=False)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable template {spectrum_path}: {e}")
+        return None
+
+def save_chirp_spectrum(key, template_spectrum):
+    """
+    Saves a chirp template spectrum to TEMPLATE_CACHE_DIRECTORY, if it is set.
+    """
+    if TEMPLATE_CACHE_DIRECTORY is None:
+        return
+
+    try:
+        os.makedirs(TEMPLATE_CACHE_DIRECTORY, exist_ok=True)
+        np.save(get_chirp_spectrum_path(key), template_spectrum)
+    except OSError as e:
+        print(f"Could not save the template to {TEMPLATE_CACHE_DIRECTORY}: {e}")
+
+def clear_template_cache():
+    """
+    Empties the in-memory cache of chirp template spectra. Saved spectra are kept.
+    """
+    template_spectra.clear()
+
+def matched_filter_chunk(values, template_spectrum, template_length, fft_length, flush=False, analytic=False):
+    """
+    Correlates a block of a long signal with a short template by overlap-save, giving
+    c[n] = sum_m s[n + m] t*[m] for each lag n that the block holds all of the samples for.
+    Can be called repeatedly on consecutive blocks, passing the remainder of each call in
+    front of the next block, so the signal never has to be in memory all at once.
+
+    Args:
+        values (np.ndarray): Signal values, following on from the remainder of the last call.
+        template_spectrum (np.ndarray): Template spectrum from get_template_spectrum. Complex
+            values need the spectrum of every frequency, and give a complex correlation.
+        template_length (int): Length of the template in samples.
+        fft_length (int): FFT length the template spectrum was computed with.
+        flush (bool): If True the signal ends here, and the last lags are correlated with zeros past the end.
+        analytic (bool): Whether to give the analytic signal of the correlation of real values, whose
+            magnitude is its envelope, instead of the real correlation.
+
+    Returns:
+        tuple: The correlation at each lag computed, and the values left over for the next call.
+    """
+    step = fft_length - template_length + 1  # New lags given by each FFT
+    num_lags = len(values) if flush else max(0, len(values) - template_length + 1)
+    num_blocks = num_lags // step if not flush else -(-num_lags // step)
+
+    if num_blocks == 0:
+        return np.zeros(0), values
+
+    if flush:
+        values = np.concatenate((values, np.zeros((num_blocks - 1) * step + fft_length - len(values), dtype=values.dtype)))
+
+    is_complex = np.iscomplexobj(values)
+    correlation = np.empty(num_blocks * step, dtype=prec.complex_dtype() if is_complex or analytic else prec.real_dtype())
+    blocks = np.lib.stride_tricks.sliding_window_view(values, fft_length)[::step]
+
+    for batch_start in range(0, num_blocks, OVERLAP_SAVE_BATCH_BLOCKS):
+        batch = blocks[batch_start:min(batch_start + OVERLAP_SAVE_BATCH_BLOCKS, num_blocks)]
+
+        # The first step samples of each circular correlation do not wrap around
+        if is_complex:
+            batch_correlation = fft.ifft(fft.fft(batch, axis=-1) * template_spectrum, fft_length, axis=-1)
+        elif analytic:
+            batch_correlation = fft.analytic_inverse(fft.rfft(batch, axis=-1) * template_spectrum, fft_length, axis=-1)
+        else:
+            batch_correlation = fft.irfft(fft.rfft(batch, axis=-1) * template_spectrum, fft_length, axis=-1)
+        correlation[batch_start * step:(batch_start + len(batch)) * step] = batch_correlation[:, :step].ravel()
+
+    if flush:
+        return correlation[:num_lags], values[:0]
+    return correlation, values[num_blocks * step:]
+
+def start_integrator(fast_time_samples):
+    """
+    Starts an incoherent integration of pulse-compressed rows. Rows are added with
+    add_to_integrator, and the accumulators only hold one value per fast time bin, so
+    the integration can run for as long as the observation lasts.
+
+    Args:
+        fast_time_samples (int): Number of fast time bins in each row.
+
+    Returns:
+        dict: The integrator, holding the number of rows added, the running sum, sum of squares and
+              peak of each fast time bin, and the number of rows and SNR after each add (the SNR growth).
+    """
+    return {
+        "count": 0,
+        "sum": np.zeros(fast_time_samples),
+        "sum_of_squares": np.zeros(fast_time_samples),
+        "peak": np.zeros(fast_time_samples),
+        "snr_history_counts": [],
+        "snr_history": [],
+    }
+
+def add_to_integrator(integrator, rows):
+    """
+    Adds the magnitudes of a block of pulse-compressed rows (rows x fast time bins) to an integrator.
+    """
+    if len(rows) == 0:
+        return
+
+    integrator["count"] += len(rows)
+    integrator["sum"] += np.sum(rows, axis=0)
+    integrator["sum_of_squares"] += np.sum(rows**2, axis=0)
+    np.maximum(integrator["peak"], np.max(rows, axis=0), out=integrator["peak"])
+
+    integrator["snr_history_counts"].append(integrator["count"])
+    integrator["snr_history"].append(get_integration_report(integrator)["snr"])
+
+def get_integration_report(integrator):
+    """
+    Reports the integrated profile of an integrator so far.
+
+    The noise floor is the median of the mean profile, and the noise of the mean in each bin is
+    its standard deviation over the rows divided by the square root of the number of rows. The
+    SNR is the height of the strongest bin above the floor in units of the median noise, so it
+    grows as the square root of the number of rows for a steady echo.
+
+    Returns:
+        dict:
+            - "count": Number of rows integrated.
+            - "profile", "std", "peak": Mean, standard deviation and peak of each fast time bin.
+            - "peak_bin": Fast time bin of the strongest mean.
+            - "noise_floor", "snr": The noise floor and SNR of the mean profile.
+    """
+    count = max(integrator["count"], 1)
+    profile = integrator["sum"] / count
+    std = np.sqrt(np.maximum(integrator["sum_of_squares"] / count - profile**2, 0))
+
+    noise_floor = np.median(profile)
+    noise = np.median(std) / np.sqrt(count)
+    peak_bin = int(np.argmax(profile))
+    snr = (profile[peak_bin] - noise_floor) / noise if noise > 0 else 0.0
+
+    return {
+        "count": integrator["count"],
+        "profile": profile,
+        "std": std,
+        "peak": integrator["peak"],
+        "peak_bin": peak_bin,
+        "noise_floor": noise_floor,
+        "snr": float(snr),
+    }
+
+def start_fast_time_summary(fast_time_samples, expected_rows, skip_samples=100):
+    """
+    Starts a fast time vs. slow time summary that correlation blocks are added to by
+    add_to_fast_time_summary. The heatmap keeps at most MAX_SLOW_TIME_LINES lines, each
+    the mean of the same number of rows, so its size does not depend on the duration.
+
+    Args:
+        fast_time_samples (int): Number of samples in each row (one pulse period).
+        expected_rows (int): Number of rows the whole correlation is expected to give.
+        skip_samples (int): Number of lags dropped from the start of the correlation.
+
+    Returns:
+        dict: The summary.
+    """
+    return {
+        "fast_time_samples": fast_time_samples,
+        "rows_per_line": max(1, -(-expected_rows // MAX_SLOW_TIME_LINES)),
+        "skip_samples": skip_samples,
+        "remainder": np.zeros(0, dtype=prec.real_dtype()),
+        "pending_rows": np.zeros((0, fast_time_samples), dtype=prec.real_dtype()),
+        "lines": [],
+        "integrator": start_integrator(fast_time_samples),
+    }
+
+def add_to_fast_time_summary(summary, correlation):
+    """
+    Cuts the next lags of a correlation into rows of one pulse period, and adds their
+    magnitudes to the integrator and to the heatmap of a fast time summary.
+    """
+    fast_time_samples = summary["fast_time_samples"]
+
+    skip = min(summary["skip_samples"], len(correlation))
+    summary["skip_samples"] -= skip
+    values = np.concatenate((summary["remainder"], correlation[skip:]))
+
+    num_rows = len(values) // fast_time_samples
+    rows = np.abs(values[:num_rows * fast_time_samples].reshape(num_rows, fast_time_samples))
+    summary["remainder"] = values[num_rows * fast_time_samples:]
+    add_to_integrator(summary["integrator"], rows)
+
+    # Average whole groups of rows into heatmap lines
+    rows_per_line = summary["rows_per_line"]
+    rows = np.concatenate((summary["pending_rows"], rows))
+    num_lines = len(rows) // rows_per_line
+    if num_lines:
+        summary["lines"].append(rows[:num_lines * rows_per_line].reshape(num_lines, rows_per_line, fast_time_samples).mean(axis=1))
+    summary["pending_rows"] = rows[num_lines * rows_per_line:]
+
+def compute_range_doppler(samples, sample_rate, pulse_period, bandwidth, pulse_width, phase_offset, carrier_frequency=None, window=True):
+    """
+    Cuts samples into one row per pulse repetition period, pulse-compresses every row with a
+    chirp in batched FFTs, then transforms each delay bin across the pulses (slow time) to
+    give a range-Doppler map.
+
+    Each row is correlated together with the first template-length samples of the next one,
+    so echoes that straddle the end of a period are compressed as in one long correlation.
+    Real samples are compressed to their analytic signal, so that approaching and receding
+    targets fall at Doppler frequencies of opposite sign.
+
+    Args:
+        samples (np.ndarray): Real or complex samples.
+        sample_rate (float): Sampling rate of the samples (samples per second).
+        pulse_period (float): Pulse repetition period in seconds.
+        bandwidth, pulse_width, phase_offset (float): Parameters of the transmitted chirp.
+        carrier_frequency (float): Carrier frequency in Hz, used to convert Doppler shifts to velocities.
+        window (bool): Whether to apply a Hann window across slow time before the Doppler FFT.
+
+    Returns:
+        dict:
+            - "range_doppler": Magnitude of the map, one row per Doppler bin and one column per delay bin.
+            - "doppler_frequencies": Doppler frequency of each row (Hz), from -PRF/2 to PRF/2.
+            - "delays": Delay of each column within the pulse period (s).
+            - "ranges": Round-trip range of each column (m), unambiguous only within one pulse period.
+            - "velocities": Radial velocity of each row (m/s), or None without a carrier frequency.
+            - "num_pulses": Number of pulses integrated.
+    """
+    samples_per_pulse = int(round(pulse_period * sample_rate))
+    template_length = int(pulse_width * sample_rate)
+    window_length = samples_per_pulse + template_length - 1
+    num_pulses = (len(samples) - template_length + 1) // samples_per_pulse if len(samples) >= window_length else 0
+    if num_pulses < 1:
+        raise ValueError("The samples do not span a whole pulse period.")
+
+    is_complex = np.iscomplexobj(samples)
+    fft_length = fft.next_fast_length(window_length)
+    template_spectrum = get_chirp_spectrum(sample_rate, bandwidth, pulse_width, phase_offset, fft_length, is_complex)
+
+    # Rows of one pulse period plus the overlap the correlation needs
+    rows = np.lib.stride_tricks.sliding_window_view(samples, window_length)[::samples_per_pulse][:num_pulses]
+    compressed = np.empty((num_pulses, samples_per_pulse), dtype=prec.complex_dtype())
+
+    for batch_start in range(0, num_pulses, RANGE_DOPPLER_BATCH_PULSES):
+        batch = rows[batch_start:batch_start + RANGE_DOPPLER_BATCH_PULSES]
+        batch_spectrum = fft.spectrum(batch, fft_length) * template_spectrum
+        if is_complex:
+            batch_compressed = fft.ifft(batch_spectrum, fft_length)
+        else:
+            batch_compressed = fft.analytic_inverse(batch_spectrum, fft_length)
+        compressed[batch_start:batch_start + len(batch)] = batch_compressed[:, :samples_per_pulse]
+
+    # Doppler FFT across slow time
+    if window:
+        compressed *= np.hanning(num_pulses)[:, np.newaxis]
+    range_doppler = np.abs(np.fft.fftshift(fft.fft(compressed, axis=0), axes=0))
+    doppler_frequencies = np.fft.fftshift(np.fft.fftfreq(num_pulses, d=pulse_period))
+    delays = np.arange(samples_per_pulse) / sample_rate
+
+    return {
+        "range_doppler": range_doppler,
+        "doppler_frequencies": doppler_frequencies,
+        "delays": delays,
+        "ranges": delays * SPEED_OF_LIGHT / 2,
+        "velocities": doppler_frequencies * SPEED_OF_LIGHT / (2 * carrier_frequency) if carrier_frequency else None,
+        "num_pulses": num_pulses,
+    }
+
+def compute_template_bank(samples, sample_rate, bandwidths, pulse_widths, phase_offsets, skip_samples=100):
+    """
+    Match filters samples with every chirp of a grid of parameters, to find the chirp that
+    best fits an unknown transmitter. The spectrum of the samples is computed once, and is
+    multiplied with the template spectra of a batch of hypotheses at a time in one array
+    operation, with the batches sized to TEMPLATE_BANK_BATCH_BYTES.
+
+    The template spectra are not put in the template cache, as a large grid would push out
+    the spectra that single correlations reuse.
+
+    Args:
+        samples (np.ndarray): Real or complex samples.
+        sample_rate (float): Sampling rate of the samples (samples per second).
+        bandwidths, pulse_widths, phase_offsets (list of float): Values of each chirp parameter.
+            Every combination of them is one hypothesis.
+        skip_samples (int): Number of lags at each end of the correlation that are set to 0,
+            as in compute_correlation.
+
+    Returns:
+        dict: One entry per hypothesis, in the order of itertools.product(bandwidths, pulse_widths, phase_offsets):
+            - "bandwidths", "pulse_widths", "phase_offsets": The parameters of each hypothesis.
+            - "peaks", "peak_lags": Largest correlation magnitude and the lag it is at.
+            - "noise_floors": Median correlation magnitude.
+            - "snrs": Height of the peak above the noise floor, in units of the noise estimated
+              from the median absolute deviation of the magnitudes.
+            - "best": Index of the hypothesis with the highest SNR.
+    """
+    hypotheses = np.array(list(itertools.product(bandwidths, pulse_widths, phase_offsets)), dtype=float).reshape(-1, 3)
+    num_hypotheses = len(hypotheses)
+    if num_hypotheses == 0:
+        raise ValueError("The template bank has no hypotheses.")
+
+    # The one forward FFT of the samples
+    fft_length = fft.next_fast_length(len(samples))
+    is_complex = np.iscomplexobj(samples)
+    signal_spectrum = fft.spectrum(samples, fft_length)
+
+    chirps = [generate_chirp(sample_rate, *hypothesis) for hypothesis in hypotheses]
+    template_length = max(len(chirp_signal) for chirp_signal in chirps)
+
+    peaks = np.zeros(num_hypotheses)
+    peak_lags = np.zeros(num_hypotheses, dtype=np.int64)
+    noise_floors = np.zeros(num_hypotheses)
+    snrs = np.zeros(num_hypotheses)
+
+    # Spectra, products and correlations of a batch are in memory together
+    batch_size = max(1, TEMPLATE_BANK_BATCH_BYTES // (fft_length * 40))
+
+    for batch_start in tqdm(range(0, num_hypotheses, batch_size), desc="Correlating Templates"):
+        batch_end = min(batch_start + batch_size, num_hypotheses)
+
+        templates = np.zeros((batch_end - batch_start, template_length), dtype=np.int8)
+        for row, chirp_signal in enumerate(chirps[batch_start:batch_end]):
+            templates[row, :len(chirp_signal)] = chirp_signal
+
+        template_spectra_batch = np.conj(fft.spectrum(templates, fft_length, is_complex))
+        correlations = np.abs(fft.inverse_spectrum(signal_spectrum * template_spectra_batch, fft_length, is_complex)[:, :len(samples)])
+        correlations[:, :skip_samples] = 0  # Set the 0-shift spike to 0
+        correlations[:, len(samples) - skip_samples + 1:] = 0
+
+        batch_peak_lags = np.argmax(correlations, axis=1)
+        batch_peaks = correlations[np.arange(len(correlations)), batch_peak_lags]
+        batch_noise_floors = np.median(correlations, axis=1)
+        batch_noise = 1.4826 * np.median(np.abs(correlations - batch_noise_floors[:, np.newaxis]), axis=1)
+
+        peaks[batch_start:batch_end] = batch_peaks
+        peak_lags[batch_start:batch_end] = batch_peak_lags
+        noise_floors[batch_start:batch_end] = batch_noise_floors
+        snrs[batch_start:batch_end] = np.divide(batch_peaks - batch_noise_floors, batch_noise,
+                                                out=np.zeros(len(batch_peaks)), where=batch_noise > 0)
+
+    return {
+        "bandwidths": hypotheses[:, 0],
+        "pulse_widths": hypotheses[:, 1],
+        "phase_offsets": hypotheses[:, 2],
+        "peaks": peaks,
+        "peak_lags": peak_lags,
+        "noise_floors": noise_floors,
+        "snrs": snrs,
+        "best": int(np.argmax(snrs)),
+    }
+
+def compute_spectrum(samples, sample_rate):
+    """
+    Computes the amplitude spectrum shown by plot_data_fourier.
+
+    Args:
+        samples (np.ndarray): Real or complex samples.
+        sample_rate (float): Sampling rate of the samples (samples per second).
+
+    Returns:
+        dict: "frequencies" of the first half of the bins, and the "amplitude" of the
+              fftshifted spectrum in those bins.
+    """
+    num_samples = len(samples)
+    fft_result = fft.spectrum(samples)
+    frequencies = fft.spectrum_frequencies(num_samples, sample_rate)[:num_samples//2]
+    if np.iscomplexobj(samples):
+        amplitude = np.abs(np.fft.fftshift(fft_result))[:num_samples//2]
+    else:
+        # The shifted negative frequencies of real data mirror the positive ones
+        amplitude = np.abs(fft_result[num_samples//2:0:-1])
+
+    return {"frequencies": frequencies, "amplitude": amplitude}
+
+def compute_waterfall(samples, sample_rate, window_size=2048, overlap=0):
+    """
+    Computes the Short-Time Fourier Transform (STFT) amplitude shown by plot_data_waterfall.
+
+    Returns:
+        dict: The STFT "frequencies" and "times", and the "amplitude" (frequencies x times).
+    """
+    frequencies, times, Zxx = stft(prec.as_working_dtype(samples), fs=sample_rate, nperseg=window_size, noverlap=overlap)
+    return {"frequencies": frequencies, "times": times, "amplitude": np.abs(Zxx)}
+
+def sum_waterfall_chunks(values, sampling_rate, chunk_duration=50e-6, window_size=32, overlap=24, summed_amplitude=None):
+    """
+    Slice values into equally timed chunks, perform STFT on each chunk and add the cubed amplitudes
+    to a running sum. Can be called repeatedly on consecutive blocks of a long signal.
+
+    Parameters:
+        values (numpy.ndarray): Signal values.
+        sampling_rate (float): Sampling rate of the data.
+        chunk_duration (float): Duration of each chunk in seconds.
+        window_size (int): The size of the window for STFT.
+        overlap (int): The number of points overlapping between segments.
+        summed_amplitude (numpy.ndarray, optional): Running sum from a previous call.
+
+    Returns:
+        tuple: The summed amplitude, the frequencies and times of the STFT bins, and the values
+               left over after the last complete chunk.
+    """
+    # Convert durations to sample counts
+    chunk_size = int(chunk_duration * sampling_rate)
+
+    # Number of complete chunks
+    total_chunks = len(values) // chunk_size
+    chunks = values[:total_chunks * chunk_size].reshape(total_chunks, chunk_size)
+
+    # Transform the chunks in batches to bound the size of the STFT output
+    batch_size = 256
+    frequencies = None
+    times = None
+
+    for batch_start in tqdm(range(0, total_chunks, batch_size), desc="Processing Chunks"):
+        batch = chunks[batch_start:batch_start + batch_size]
+
+        # Perform STFT on every chunk of the batch
+        frequencies, times, Zxx = stft(prec.as_working_dtype(batch), fs=sampling_rate, nperseg=window_size, noverlap=overlap, axis=-1)
+
+        # Compute amplitude and sum over the chunks
+        amplitude = np.sum(np.abs(Zxx)**3, axis=0)
+
+        if summed_amplitude is None:
+            # The running sum is kept in double precision, as it may run over a long range
+            summed_amplitude = amplitude.astype(np.float64)
+        else:
+            summed_amplitude += amplitude
+
+    return summed_amplitude, frequencies, times, values[total_chunks * chunk_size:]
+
+def compute_fast_slow_time(correlation, sample_rate, fast_time_duration=25e-6, skip_samples=100):
+    """
+    Cuts a correlation into rows of one pulse period for a fast time vs. slow time map.
+
+    Args:
+        correlation (np.ndarray): The correlation at each lag.
+        sample_rate (float): Sampling rate of the correlated samples.
+        fast_time_duration (float): Pulse period in seconds, the length of each row.
+        skip_samples (int): Number of lags dropped from the start of the correlation.
+
+    Returns:
+        dict: "correlation_2d" (slow time x fast time), the summed "intensity" of each fast time
+              bin, the "fast_time_axis" in microseconds, and the "fast_time_duration" and
+              "slow_time_duration" in seconds.
+    """
+    correlation = correlation[skip_samples:]
+    slow_time_duration = len(correlation) / sample_rate
+
+    # Calculate the number of samples in fast time and slow time
+    fast_time_samples = int(fast_time_duration * sample_rate)
+    slow_time_samples = int(slow_time_duration / fast_time_duration)
+
+    # Reshape the correlation into a 2D grid
+    correlation_2d = correlation[:fast_time_samples * slow_time_samples].reshape(slow_time_samples, fast_time_samples)
+
+    return {
+        "correlation_2d": correlation_2d,
+        "intensity": np.sum(np.abs(correlation_2d), axis=0),  # Sum down the columns
+        "fast_time_axis": np.linspace(-fast_time_duration * 1e6/2, fast_time_duration * 1e6/2, fast_time_samples),
+        "fast_time_duration": fast_time_duration,
+        "slow_time_duration": slow_time_duration,
+    }
+
+def compute_correlation(samples, sample_rate, template=None, template_spectrum=None, fast_time_duration=25e-6):
+    """
+    Match filters samples with a template, as shown by vdif_correlating.plot_correlation.
+
+    Args:
+        samples (np.ndarray): Real or complex samples.
+        sample_rate (float): Sampling rate of the samples (samples per second).
+        template (np.ndarray): The template, zero-padded to the FFT length. Not needed if template_spectrum is given.
+        template_spectrum (np.ndarray): The conjugated template spectrum of length
+            fft.next_fast_length(len(samples)), e.g. from get_chirp_spectrum.
+        fast_time_duration (float): Pulse period in seconds, the length of each fast time row.
+
+    Returns:
+        dict: The positive "frequencies" and, in those bins, the "spectrum" of the samples, the
+              conjugated "template_spectrum" and the "power_spectrum"; the "correlation" at each
+              lag with the 0-shift spike set to 0; and the fast time map from compute_fast_slow_time.
+    """
+    # Pad to a fast length
+    fft_length = fft.next_fast_length(len(samples))
+    is_complex = np.iscomplexobj(samples)
+    fft_result = fft.spectrum(samples, fft_length)
+    frequency = fft.spectrum_frequencies(fft_length, sample_rate, is_complex)
+
+    if template_spectrum is None:
+        template_spectrum = np.conj(fft.spectrum(template, fft_length, is_complex))
+
+    # Compute the power spectrum, and its inverse FFT without the padding
+    power_spectrum = fft_result * template_spectrum
+    correlation = fft.inverse_spectrum(power_spectrum, fft_length, is_complex)[:len(samples)]
+    for i in range(100):
+        correlation[i] = 0  # Set the 0-shift spike to 0
+        correlation[-i] = 0  # Set the 0-shift spike to 0
+
+    return {
+        "frequencies": frequency[:fft_length//2],
+        "spectrum": fft_result[:fft_length//2],
+        "template_spectrum": template_spectrum[:fft_length//2],
+        "power_spectrum": power_spectrum[:fft_length//2],
+        "correlation": correlation,
+        **compute_fast_slow_time(correlation, sample_rate, fast_time_duration),
+    }
+
+def compute_chirp_correlation(samples, sample_rate, bandwidth, pulse_width, phase_offset, fast_time_duration=25e-6):
+    """
+    Match filters samples with a chirp, using a cached template spectrum. See compute_correlation.
+    """
+    fft_length = fft.next_fast_length(len(samples))
+    template_spectrum = get_chirp_spectrum(sample_rate, bandwidth, pulse_width, phase_offset, fft_length, np.iscomplexobj(samples))
+    return compute_correlation(samples, sample_rate, template_spectrum=template_spectrum, fast_time_duration=fast_time_duration)
+
+def compute_auto_correlation(samples, sample_rate, fast_time_duration=25e-6):
+    """
+    Correlates samples with themselves, as shown by vdif_correlating.plot_auto_correlation.
+
+    Returns:
+        dict: The positive "frequencies" and, in those bins, the "spectrum" and "power_spectrum";
+              the circular "correlation" at each lag with the 0-shift spike set to 0; and the
+              fast time map from compute_fast_slow_time.
+    """
+    # The FFT is not padded, as padding would change the circular autocorrelation
+    num_samples = len(samples)
+    is_complex = np.iscomplexobj(samples)
+    fft_result = fft.spectrum(samples)
+    frequency = fft.spectrum_frequencies(num_samples, sample_rate, is_complex)
+
+    power_spectrum = fft_result * np.conjugate(fft_result)
+    correlation = fft.inverse_spectrum(power_spectrum, num_samples, is_complex)
+    for i in range(100):
+        correlation[i] = 0  # Set the 0-shift spike to 0
+        correlation[-i] = 0  # Set the 0-shift spike to 0
+
+    return {
+        "frequencies": frequency[:num_samples//2],
+        "spectrum": fft_result[:num_samples//2],
+        "power_spectrum": power_spectrum[:num_samples//2],
+        "correlation": correlation,
+        **compute_fast_slow_time(correlation, sample_rate, fast_time_duration),
+    }
+
+def save_result(result, file_path):
+    """
+    Saves the arrays and numbers of a compute result to an .npz file, skipping entries that are None.
+    """
+    np.savez(file_path, **{key: np.asarray(value) for key, value in result.items() if value is not None})
+
+def compute_data_window(vdif_file, compute_function, output_path=None, start_seconds=None, end_seconds=None, **kwargs):
+    """
+    Runs a compute function on a time range of a VDIF file without plotting anything,
+    optionally saving its result.
+
+    Args:
+        vdif_file (str or VdifFile): Path to the VDIF file, or an open session on it.
+        compute_function (callable): One of the compute_* functions, called as
+            compute_function(samples, sample_rate, **kwargs).
+        output_path (str): Path of an .npz file to save the result to. None does not save it.
+        start_seconds, end_seconds (float): The time range. The user is asked for it if None.
+
+    Returns:
+        dict: The result of the compute function.
+    """
+    result = {}
+
+    def function(file_info, starting_header, data, start_seconds, end_seconds):
+        result.update(compute_function(data["samples"], file_info["sample_rate"], **kwargs))
+
+    anal.process_data_window(vdif_file, function, start_seconds, end_seconds)
+
+    if output_path is not None:
+        save_result(result, output_path)
+        print(f"Result saved as {output_path}")
+
+    return result
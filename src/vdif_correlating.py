@@ -2,18 +2,15 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 import src.vdif_plotting as plot
+import src.vdif_fft as fft
+import src.vdif_compute as comp
 
-def generate_chirp_template(signal_array, sample_rate, bandwidth=None, pulse_width=None, phase_offset=None):
+def get_chirp_parameters(bandwidth=None, pulse_width=None, phase_offset=None):
     """
-    Generate a single chirp that starts at 0 Hz and sweeps up to 4 MHz over a pulse width,
-    then fills the rest of the array with zeros.
-
-    Args:
-        signal_array (np.ndarray): Array to determine the length of the output.
-        sample_rate (float): Sampling rate of the signal (samples per second).
+    Asks the user for any chirp parameters that are not given.
 
     Returns:
-        np.ndarray: The chirp signal padded with zeros.
+        tuple: The bandwidth (Hz), pulse width (s) and phase offset (rad).
     """
     # Ask user for parameters with defaults
     if (not bandwidth) or (not pulse_width) or (phase_offset==None):
@@ -28,32 +25,229 @@ def generate_chirp_template(signal_array, sample_rate, bandwidth=None, pulse_wid
             pulse_width = 2.5e-6
             phase_offset = 0
 
-    num_samples = len(signal_array)  # Total number of samples in the output
-    chirp_samples = int(pulse_width * sample_rate)  # Number of samples for chirp duration
-    t = np.arange(chirp_samples) / sample_rate  # Time vector for chirp duration
+    return bandwidth, pulse_width, phase_offset
+
+def get_chirp_grid(bandwidths=None, pulse_widths=None, phase_offsets=None):
+    """
+    Asks the user for the values of each chirp parameter of a template bank that are not given.
+
+    Returns:
+        tuple: The lists of bandwidths (Hz), pulse widths (s) and phase offsets (rad).
+    """
+    if (not bandwidths) or (not pulse_widths) or (not phase_offsets):
+        try:
+            print("Specify the chirp parameters to try, separated by commas")
+            bandwidths = [float(value) for value in (input("Enter bandwidths in Hz (default: 4e6): ") or "4e6").split(",")]
+            pulse_widths = [float(value) for value in (input("Enter pulse widths in seconds (default: 2.5e-6): ") or "2.5e-6").split(",")]
+            phase_offsets = [float(value) for value in (input("Enter phase offsets in radians (default: 0): ") or "0").split(",")]
+        except ValueError:
+            print("Invalid input. Using default values.")
+            bandwidths = [4e6]
+            pulse_widths = [2.5e-6]
+            phase_offsets = [0]
+
+    return bandwidths, pulse_widths, phase_offsets
+
+def generate_chirp_template(signal_array, sample_rate, bandwidth=None, pulse_width=None, phase_offset=None):
+    """
+    Generate a single chirp that starts at 0 Hz and sweeps up to 4 MHz over a pulse width,
+    then fills the rest of the array with zeros.
 
-    # Chirp rate
-    k = bandwidth / pulse_width  # Hz per second
+    Args:
+        signal_array (np.ndarray): Array to determine the length of the output.
+        sample_rate (float): Sampling rate of the signal (samples per second).
 
-    # Generate chirp using exponential phase
-    chirp_signal = np.exp(1j * (np.pi * k * t**2 + phase_offset)).real
+    Returns:
+        np.ndarray: The chirp signal padded with zeros.
+    """
+    bandwidth, pulse_width, phase_offset = get_chirp_parameters(bandwidth, pulse_width, phase_offset)
+    chirp_signal = comp.generate_chirp(sample_rate, bandwidth, pulse_width, phase_offset)
 
     # Create full-length array and insert chirp
-    output_signal = np.zeros(num_samples, dtype=np.int8)
-    output_signal[:chirp_samples] = (63 * chirp_signal).astype(np.int8)  # Scale and insert chirp
+    output_signal = np.zeros(len(signal_array), dtype=np.int8)
+    output_signal[:len(chirp_signal)] = chirp_signal
 
     return output_signal
 
-def plot_correlation(signal, template, resolution, file_path, pdf_file="correction_plots.pdf"):
+def print_integration_report(report, resolution):
+    """
+    Prints a summary of an integration report.
+    """
+    print(f"Integrated Pulses: {report['count']}")
+    print(f"Strongest Fast Time Bin: {report['peak_bin']} ({report['peak_bin'] / resolution * 1e6:.3f} µs)")
+    print(f"Noise Floor: {report['noise_floor']:.3f}")
+    print(f"SNR: {report['snr']:.2f}")
+
+def print_template_bank(bank, resolution, max_rows=20):
+    """
+    Prints the hypotheses of a template bank from comp.compute_template_bank, highest SNR first.
+
+    Args:
+        bank (dict): The template bank results.
+        resolution (float): Sampling resolution (samples per second).
+        max_rows (int): Largest number of hypotheses printed.
+    """
+    order = np.argsort(bank["snrs"])[::-1][:max_rows]
+
+    print(f"{'Bandwidth (Hz)':>15} | {'Pulse Width (s)':>15} | {'Phase (rad)':>11} | {'Peak':>12} | {'Peak Lag (µs)':>13} | {'SNR':>8}")
+    print("-" * 90)
+    for i in order:
+        print(f"{bank['bandwidths'][i]:>15.6g} | {bank['pulse_widths'][i]:>15.6g} | {bank['phase_offsets'][i]:>11.4g} | "
+              f"{bank['peaks'][i]:>12.4g} | {bank['peak_lags'][i] / resolution * 1e6:>13.3f} | {bank['snrs'][i]:>8.2f}")
+
+    best = bank["best"]
+    print(f"\nBest of {len(bank['snrs'])} Hypotheses: bandwidth {bank['bandwidths'][best]:g} Hz, "
+          f"pulse width {bank['pulse_widths'][best]:g} s, phase offset {bank['phase_offsets'][best]:g} rad")
+
+def plot_template_bank(bank, file_path):
+    """
+    Plots the SNR of each hypothesis of a template bank from comp.compute_template_bank.
+
+    Args:
+        bank (dict): The template bank results.
+        file_path (str): Path to the input file for the title.
+    """
+    best = bank["best"]
+
+    plt.figure(figsize=(10, 6))
+    plt.plot(bank["snrs"], marker='o', label="SNR")
+    plt.plot(best, bank["snrs"][best], marker='*', markersize=15, linestyle='none',
+             label=f"Best: {bank['bandwidths'][best]:g} Hz, {bank['pulse_widths'][best]:g} s, {bank['phase_offsets'][best]:g} rad")
+    plt.xlabel("Hypothesis")
+    plt.ylabel("SNR")
+    plt.title(f"Chirp Template Bank\nFile: {file_path}")
+    plt.grid(True)
+    plt.legend(loc="upper right")
+    plt.tight_layout()
+
+    plot.save_plot_auto_increment(directory='plots', base_filename='plot')
+
+    print("Showing plots...")
+    plt.show(block=False)
+
+def plot_fast_time_summary(summary, resolution, file_path):
+    """
+    Plots the fast time vs. slow time heatmap, summed intensity and SNR growth of a fast time summary.
+
+    Args:
+        summary (dict): Summary from start_fast_time_summary.
+        resolution (float): Sampling resolution (samples per second).
+        file_path (str): Path to the input file for the title.
+    """
+    fast_time_samples = summary["fast_time_samples"]
+    fast_time_duration = fast_time_samples / resolution
+    integrator = summary["integrator"]
+    slow_time_duration = integrator["count"] * fast_time_duration
+    heatmap = np.concatenate(summary["lines"]) if summary["lines"] else np.zeros((0, fast_time_samples))
+
+    fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(10, 12), gridspec_kw={'height_ratios': [3, 1, 1]})
+    fig.suptitle(f"Streamed Match Filtering Results\nFile: {file_path}", fontsize=12)
+
+    # Plot the 2D correlation as a heatmap
+    im = ax1.imshow(heatmap, aspect='auto', cmap='viridis',
+                    extent=[-fast_time_duration * 1e6/2, fast_time_duration * 1e6/2, slow_time_duration, 0])  # Convert fast time to microseconds
+    ax1.set_xlabel("Fast Time (µs)")
+    ax1.set_ylabel("Slow Time (s)")
+    ax1.set_title("Fast Time vs. Slow Time Correlation")
+
+    # Plot the intensity line below the heatmap
+    fast_time_axis = np.linspace(-fast_time_duration * 1e6/2, fast_time_duration * 1e6/2, fast_time_samples)
+
+    ax2.plot(fast_time_axis, integrator["sum"], label="Intensity vs. Fast Time")
+    ax2.set_xlabel("Fast Time (µs)")
+    ax2.set_ylabel("Intensity")
+    ax2.set_title("Summed Intensity Across Slow Time")
+    ax2.legend(loc="upper right")
+    ax2.grid(True)
+
+    # Plot how the SNR grew as pulses were integrated
+    ax3.plot(integrator["snr_history_counts"], integrator["snr_history"], label="SNR vs. Integrated Pulses")
+    ax3.set_xlabel("Integrated Pulses")
+    ax3.set_ylabel("SNR")
+    ax3.set_title("SNR Growth")
+    ax3.legend(loc="upper left")
+    ax3.grid(True)
+
+    # Adjust layout to ensure no overlap
+    fig.tight_layout(rect=[0, 0, 0.85, 1])  # Leave space for the color bar
+
+    # Add colorbar manually outside the main plot
+    cbar_ax = fig.add_axes([0.88, 0.15, 0.02, 0.7])  # Position of the color bar
+    fig.colorbar(im, cax=cbar_ax, label="Magnitude")
+
+    plot.save_plot_auto_increment(directory='plots', base_filename='plot')
+
+    print("Showing plots...")
+    plt.show(block=False)
+
+def get_range_doppler_parameters(pulse_period=None, carrier_frequency=None):
+    """
+    Asks the user for the pulse repetition period if it is not given, and for the optional carrier frequency.
+
+    Returns:
+        tuple: The pulse period (s) and the carrier frequency (Hz), which is None if not known.
+    """
+    if not pulse_period:
+        try:
+            pulse_period = float(input("Enter pulse repetition period in seconds (default: 25e-6): ") or 25e-6)
+            carrier_frequency = float(input("Enter carrier frequency in Hz to show velocities (default: none): ") or 0) or None
+        except ValueError:
+            print("Invalid input. Using default values.")
+            pulse_period = 25e-6
+            carrier_frequency = None
+
+    return pulse_period, carrier_frequency
+
+def plot_range_doppler(range_doppler, file_path):
+    """
+    Plots a range-Doppler map from compute_range_doppler in decibels.
+
+    Args:
+        range_doppler (dict): The map from compute_range_doppler.
+        file_path (str): Path to the input file for the title.
+    """
+    delays = range_doppler["delays"] * 1e6  # Convert delays to microseconds
+    if range_doppler["velocities"] is not None:
+        doppler_axis = range_doppler["velocities"]
+        doppler_label = "Radial Velocity (m/s)"
+    else:
+        doppler_axis = range_doppler["doppler_frequencies"]
+        doppler_label = "Doppler Frequency (Hz)"
+
+    power_db = 20 * np.log10(range_doppler["range_doppler"] + np.finfo(float).tiny)
+
+    fig, ax = plt.subplots(figsize=(10, 8))
+    fig.suptitle(f"Range-Doppler Map of {range_doppler['num_pulses']} pulses\nFile: {file_path}", fontsize=12)
+
+    im = ax.imshow(power_db, aspect='auto', cmap='viridis', origin='lower',
+                   extent=[delays[0], delays[-1], doppler_axis[0], doppler_axis[-1]])
+    ax.set_xlabel("Delay Within Pulse Period (µs)")
+    ax.set_ylabel(doppler_label)
+    ax.set_title("Pulse-Compressed Range-Doppler Map")
+    fig.colorbar(im, ax=ax, label="Magnitude (dB)")
+
+    fig.tight_layout()
+    plot.save_plot_auto_increment(directory='plots', base_filename='plot')
+
+    print("Showing plots...")
+    plt.show(block=False)
+
+def plot_correlation(signal, template, resolution, file_path, pdf_file="correction_plots.pdf", template_spectrum=None):
     """
     Perform match filtering on the input data and generate plots.
 
     Args:
-        data (np.ndarray): The input signal with time in the first column and voltage data in the second column.
+        signal (dict): The input samples and their time axis, from fr.build_vdif_data.
+        template (np.ndarray): The template to match against the signal. It is zero-padded to the signal length.
         resolution (float): Sampling resolution (samples per second).
         file_path (str): Path to the input file for the subtitle.
         pdf_file (str): Name of the output PDF file to save the plots.
+        template_spectrum (np.ndarray): The conjugated template spectrum of length
+            fft.next_fast_length(len(signal)), e.g. from comp.get_chirp_spectrum. Computed from the template if None.
     """
+    print("Match filtering...")
+    result = comp.compute_correlation(signal["samples"], resolution, template, template_spectrum)
+
     # Create a figure with 2x2 subplots, sharing the x-axis for the first column
     fig, axs = plt.subplots(3, 2, figsize=(12, 10), sharex='col')
 
@@ -66,9 +260,7 @@ def plot_correlation(signal, template, resolution, file_path, pdf_file="correcti
     print("Plotting signal voltage data...")
 
     # Plot the original signal (top left)
-    t = signal[:, 0]
-    input_data = signal[:, 1]
-    axs[0, 0].plot(input_data, label="$s_C (τ)$")
+    axs[0, 0].plot(signal["samples"], label="$s_C (τ)$")
     axs[0, 0].set_title("Original Signal, $s_C (τ)$")
     axs[0, 0].set_xlabel("Time (s)")
     axs[0, 0].set_ylabel("Amplitude (V)")
@@ -77,13 +269,8 @@ def plot_correlation(signal, template, resolution, file_path, pdf_file="correcti
 
     print("Plotting signal FFT...")
 
-    # Compute the FFT of the input data (top right)
-    fft_result = np.fft.fft(input_data)
-    frequency = np.fft.fftfreq(len(input_data), d=1/resolution)
-    positive_frequencies = frequency[:len(frequency)//2]
-    positive_fft = fft_result[:len(frequency)//2]
-
-    axs[0, 1].plot(positive_frequencies, np.abs(positive_fft), label="$S_C(f) = F[s_C(τ)]$")
+    # Plot the FFT of the input data (top right)
+    axs[0, 1].plot(result["frequencies"], np.abs(result["spectrum"]), label="$S_C(f) = F[s_C(τ)]$")
     axs[0, 1].set_title("FFT of Input Signal, $S_C(f)$")
     axs[0, 1].set_xlabel("Frequency (Hz)")
     axs[0, 1].set_ylabel("Amplitude (V)")
@@ -92,7 +279,7 @@ def plot_correlation(signal, template, resolution, file_path, pdf_file="correcti
 
     print("Plotting template voltage data...")
 
-    # Plot the original signal (top left)
+    # Plot the template (middle left)
     axs[1, 0].plot(template, label="$s_C (τ)$")
     axs[1, 0].set_title("Template Signal, $s_C (τ)$")
     axs[1, 0].set_xlabel("Time (s)")
@@ -102,13 +289,8 @@ def plot_correlation(signal, template, resolution, file_path, pdf_file="correcti
 
     print("Plotting template FFT...")
 
-    # Compute the FFT of the input data (top right)
-    template_fft_result = np.fft.fft(template)
-    frequency = np.fft.fftfreq(len(template), d=1/resolution)
-    positive_frequencies = frequency[:len(frequency)//2]
-    positive_fft = template_fft_result[:len(frequency)//2]
-
-    axs[1, 1].plot(positive_frequencies, np.abs(positive_fft), label="$S_C(f) = F[s_C(τ)]$")
+    # Plot the conjugated FFT of the template (middle right)
+    axs[1, 1].plot(result["frequencies"], np.abs(result["template_spectrum"]), label="$S_C(f) = F[s_C(τ)]$")
     axs[1, 1].set_title("FFT of Template, $S_C(f)$")
     axs[1, 1].set_xlabel("Frequency (Hz)")
     axs[1, 1].set_ylabel("Amplitude (V)")
@@ -117,11 +299,8 @@ def plot_correlation(signal, template, resolution, file_path, pdf_file="correcti
 
     print("Plotting Power Spectrum...")
 
-    # Compute the power spectrum (bottom right)
-    power_spectrum = fft_result * np.conjugate(template_fft_result)
-    positive_power_spectrum = power_spectrum[:len(frequency)//2]
-
-    axs[2, 1].plot(positive_frequencies, np.abs(positive_power_spectrum), label="$C_S (f) = S_C(f) S_C^{*} (f)$")
+    # Plot the power spectrum (bottom right)
+    axs[2, 1].plot(result["frequencies"], np.abs(result["power_spectrum"]), label="$C_S (f) = S_C(f) S_C^{*} (f)$")
     axs[2, 1].set_title("Power Spectrum, $C_S (f)$")
     axs[2, 1].set_xlabel("Frequency (Hz)")
     axs[2, 1].set_ylabel("Power $|V|^2$")
@@ -130,76 +309,34 @@ def plot_correlation(signal, template, resolution, file_path, pdf_file="correcti
 
     print("Plotting Correlation...")
 
-    # Compute the inverse FFT of the power spectrum (bottom left)
-    ifft_result = np.fft.ifft(power_spectrum).real
-    for i in range(100):
-        ifft_result[i] = 0  # Set the 0-shift spike to 0
-        ifft_result[-i] = 0  # Set the 0-shift spike to 0
-
-    axs[2, 0].plot(ifft_result**2, label="$c_S(t)^2 = F^{-1}[C_S (f)] ^2$", alpha=0.8)
+    # Plot the inverse FFT of the power spectrum (bottom left)
+    axs[2, 0].plot(result["correlation"]**2, label="$c_S(t)^2 = F^{-1}[C_S (f)] ^2$", alpha=0.8)
     axs[2, 0].set_title("Match Filtered Signal, $c_S(t)^2$")
     axs[2, 0].set_xlabel("Time (s)")
     axs[2, 0].set_ylabel("Power $|V|^2$")
     axs[2, 0].legend(loc="upper right")
     axs[2, 0].grid(True)
 
-    print("Creating Fast Time vs. Slow Time Plot...")
-
-    ifft_result = ifft_result[100:]
-
-    # Reshape the data for fast time vs. slow time plot
-    fast_time_duration = 25e-6  # 25 microseconds
-    slow_time_duration = len(ifft_result)/resolution
-
-    # Calculate the number of samples in fast time and slow time
-    fast_time_samples = int(fast_time_duration * resolution)
-    slow_time_samples = int(slow_time_duration / fast_time_duration)
-
-    # Reshape the ifft_result into a 2D grid
-    correlation_2d = ifft_result[:fast_time_samples * slow_time_samples].reshape(slow_time_samples, fast_time_samples)
-
-    # Create a new figure for the Fast Time vs. Slow Time plot
-    fig2, (ax2, ax3) = plt.subplots(2, 1, figsize=(10, 10), gridspec_kw={'height_ratios': [3, 1]})
-
-    # Plot the 2D correlation as a heatmap
-    im = ax2.imshow(np.abs(correlation_2d), aspect='auto', cmap='viridis', 
-                    extent=[-fast_time_duration * 1e6/2, fast_time_duration * 1e6/2, slow_time_duration, 0])  # Convert fast time to microseconds
-    ax2.set_xlabel("Fast Time (µs)")
-    ax2.set_ylabel("Slow Time (s)")
-    ax2.set_title("Fast Time vs. Slow Time Correlation")
-
-    # Calculate and plot the intensity line below the heatmap
-    intensity = np.sum(np.abs(correlation_2d), axis=0)  # Sum down the columns
-    fast_time_axis = np.linspace(-fast_time_duration * 1e6/2, fast_time_duration * 1e6/2, fast_time_samples)
-
-    ax3.plot(fast_time_axis, intensity, label="Intensity vs. Fast Time")
-    ax3.set_xlabel("Fast Time (µs)")
-    ax3.set_ylabel("Intensity")
-    ax3.set_title("Summed Intensity Across Slow Time")
-    ax3.legend(loc="upper right")
-    ax3.grid(True)
+    plot_fast_slow_time(result)
 
-    # Adjust layout to ensure no overlap
-    fig2.tight_layout(rect=[0, 0, 0.85, 1])  # Leave space for the color bar
 
-    # Add colorbar manually outside the main plot
-    cbar_ax = fig2.add_axes([0.88, 0.15, 0.02, 0.7])  # Position of the color bar
-    fig2.colorbar(im, cax=cbar_ax, label="Magnitude")
+def plot_chirp_correlation(signal, resolution, file_path, bandwidth=None, pulse_width=None, phase_offset=None):
+    """
+    Match filters the input data with a chirp, using a cached template spectrum, and generates plots.
 
-    plot.save_plot_auto_increment(directory='plots', base_filename='plot')
+    Args:
+        signal (dict): The input samples and their time axis, from fr.build_vdif_data.
+        resolution (float): Sampling resolution (samples per second).
+        file_path (str): Path to the input file for the subtitle.
+        bandwidth, pulse_width, phase_offset (float): Chirp parameters. The user is asked for any that are None.
+    """
+    bandwidth, pulse_width, phase_offset = get_chirp_parameters(bandwidth, pulse_width, phase_offset)
 
-    print("Showing plots...")
-    # Show the plots
-    plt.show(block=False)
+    fft_length = fft.next_fast_length(len(signal["samples"]))
+    template_spectrum = comp.get_chirp_spectrum(resolution, bandwidth, pulse_width, phase_offset, fft_length, np.iscomplexobj(signal["samples"]))
+    template = comp.generate_chirp(resolution, bandwidth, pulse_width, phase_offset)
 
-    # print(f"Saving to '{pdf_file}'...")
-    # # Save the plots to a PDF
-    # with PdfPages(pdf_file) as pdf:
-    #     pdf.savefig(fig)
-    #     pdf.savefig(fig2)
-    # plt.close(fig)
-    # plt.close(fig2)
-    # print("Done")
+    plot_correlation(signal, template, resolution, file_path, template_spectrum=template_spectrum)
 
 
 def plot_auto_correlation(data, resolution, file_path, pdf_file="auto_correlation_plots.pdf"):
@@ -207,11 +344,14 @@ def plot_auto_correlation(data, resolution, file_path, pdf_file="auto_correlatio
     Perform match filtering on the input data and generate plots.
 
     Args:
-        data (np.ndarray): The input signal with time in the first column and voltage data in the second column.
+        data (dict): The input samples and their time axis, from fr.build_vdif_data.
         resolution (float): Sampling resolution (samples per second).
         file_path (str): Path to the input file for the subtitle.
         pdf_file (str): Name of the output PDF file to save the plots.
     """
+    print("Auto correlating...")
+    result = comp.compute_auto_correlation(data["samples"], resolution)
+
     # Create a figure with 2x2 subplots, sharing the x-axis for the first column
     fig, axs = plt.subplots(2, 2, figsize=(12, 10), sharex='col')
 
@@ -224,9 +364,7 @@ def plot_auto_correlation(data, resolution, file_path, pdf_file="auto_correlatio
     print("Plotting voltage data...")
 
     # Plot the original signal (top left)
-    t = data[:, 0]
-    input_data = data[:, 1]
-    axs[0, 0].plot(input_data, label="$s_C (τ)$")
+    axs[0, 0].plot(data["samples"], label="$s_C (τ)$")
     axs[0, 0].set_title("Original Signal, $s_C (τ)$")
     axs[0, 0].set_xlabel("Time (s)")
     axs[0, 0].set_ylabel("Amplitude (V)")
@@ -235,13 +373,8 @@ def plot_auto_correlation(data, resolution, file_path, pdf_file="auto_correlatio
 
     print("Plotting FFT...")
 
-    # Compute the FFT of the input data (top right)
-    fft_result = np.fft.fft(input_data)
-    frequency = np.fft.fftfreq(len(input_data), d=1/resolution)
-    positive_frequencies = frequency[:len(frequency)//2]
-    positive_fft = fft_result[:len(frequency)//2]
-
-    axs[0, 1].plot(positive_frequencies, np.abs(positive_fft), label="$S_C(f) = F[s_C(τ)]$")
+    # Plot the FFT of the input data (top right)
+    axs[0, 1].plot(result["frequencies"], np.abs(result["spectrum"]), label="$S_C(f) = F[s_C(τ)]$")
     axs[0, 1].set_title("FFT of Input Signal, $S_C(f)$")
     axs[0, 1].set_xlabel("Frequency (Hz)")
     axs[0, 1].set_ylabel("Amplitude (V)")
@@ -250,11 +383,8 @@ def plot_auto_correlation(data, resolution, file_path, pdf_file="auto_correlatio
 
     print("Plotting Power Spectrum...")
 
-    # Compute the power spectrum (bottom right)
-    power_spectrum = fft_result * np.conjugate(fft_result)
-    positive_power_spectrum = power_spectrum[:len(frequency)//2]
-
-    axs[1, 1].plot(positive_frequencies, np.abs(positive_power_spectrum), label="$C_S (f) = S_C(f) S_C^{*} (f)$")
+    # Plot the power spectrum (bottom right)
+    axs[1, 1].plot(result["frequencies"], np.abs(result["power_spectrum"]), label="$C_S (f) = S_C(f) S_C^{*} (f)$")
     axs[1, 1].set_title("Power Spectrum, $C_S (f)$")
     axs[1, 1].set_xlabel("Frequency (Hz)")
     axs[1, 1].set_ylabel("Power $|V|^2$")
@@ -263,49 +393,42 @@ def plot_auto_correlation(data, resolution, file_path, pdf_file="auto_correlatio
 
     print("Plotting Correlation...")
 
-    # Compute the inverse FFT of the power spectrum (bottom left)
-    ifft_result = np.fft.ifft(power_spectrum).real
-    for i in range(100):
-        ifft_result[i] = 0  # Set the 0-shift spike to 0
-        ifft_result[-i] = 0  # Set the 0-shift spike to 0
-
-    axs[1, 0].plot(ifft_result**2, label="$c_S(t)^2 = F^{-1}[C_S (f)] ^2$", alpha=0.8)
+    # Plot the inverse FFT of the power spectrum (bottom left)
+    axs[1, 0].plot(result["correlation"]**2, label="$c_S(t)^2 = F^{-1}[C_S (f)] ^2$", alpha=0.8)
     axs[1, 0].set_title("Match Filtered Signal, $c_S(t)^2$")
     axs[1, 0].set_xlabel("Time (s)")
     axs[1, 0].set_ylabel("Power $|V|^2$")
     axs[1, 0].legend(loc="upper right")
     axs[1, 0].grid(True)
 
-    print("Creating Fast Time vs. Slow Time Plot...")
+    plot_fast_slow_time(result)
 
-    ifft_result = ifft_result[100:]
 
-    # Reshape the data for fast time vs. slow time plot
-    fast_time_duration = 25e-6  # 25 microseconds
-    slow_time_duration = len(ifft_result)/resolution
+def plot_fast_slow_time(result):
+    """
+    Plots the fast time vs. slow time map of a correlation and its summed intensity, saves
+    the plots and shows them.
 
-    # Calculate the number of samples in fast time and slow time
-    fast_time_samples = int(fast_time_duration * resolution)
-    slow_time_samples = int(slow_time_duration / fast_time_duration)
+    Args:
+        result (dict): Result of comp.compute_correlation or comp.compute_auto_correlation.
+    """
+    print("Creating Fast Time vs. Slow Time Plot...")
 
-    # Reshape the ifft_result into a 2D grid
-    correlation_2d = ifft_result[:fast_time_samples * slow_time_samples].reshape(slow_time_samples, fast_time_samples)
+    fast_time_duration = result["fast_time_duration"]
+    slow_time_duration = result["slow_time_duration"]
 
     # Create a new figure for the Fast Time vs. Slow Time plot
     fig2, (ax2, ax3) = plt.subplots(2, 1, figsize=(10, 10), gridspec_kw={'height_ratios': [3, 1]})
 
     # Plot the 2D correlation as a heatmap
-    im = ax2.imshow(np.abs(correlation_2d), aspect='auto', cmap='viridis', 
+    im = ax2.imshow(np.abs(result["correlation_2d"]), aspect='auto', cmap='viridis', 
                     extent=[-fast_time_duration * 1e6/2, fast_time_duration * 1e6/2, slow_time_duration, 0])  # Convert fast time to microseconds
     ax2.set_xlabel("Fast Time (µs)")
     ax2.set_ylabel("Slow Time (s)")
     ax2.set_title("Fast Time vs. Slow Time Correlation")
 
-    # Calculate and plot the intensity line below the heatmap
-    intensity = np.sum(np.abs(correlation_2d), axis=0)  # Sum down the columns
-    fast_time_axis = np.linspace(-fast_time_duration * 1e6/2, fast_time_duration * 1e6/2, fast_time_samples)
-
-    ax3.plot(fast_time_axis, intensity, label="Intensity vs. Fast Time")
+    # Plot the intensity line below the heatmap
+    ax3.plot(result["fast_time_axis"], result["intensity"], label="Intensity vs. Fast Time")
     ax3.set_xlabel("Fast Time (µs)")
     ax3.set_ylabel("Intensity")
     ax3.set_title("Summed Intensity Across Slow Time")
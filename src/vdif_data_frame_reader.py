@@ -13,13 +13,21 @@ Dependencies:
 """
 
 import struct
+import mmap
+import functools
+import multiprocessing
+from multiprocessing import shared_memory
 import numpy as np
-from tqdm import tqdm
+import src.vdif_precision as prec
+
+# Number of frames decoded at a time when gathering frames from around a file
+DECODE_BLOCK_FRAMES = 4096
 
 def generate_data_from_time_range(file_info, 
                                   mmapped_file, 
                                   start_seconds_from_epoch, 
-                                  end_seconds_from_epoch):
+                                  end_seconds_from_epoch,
+                                  workers=1):
     """
     Generates the data from the VDIF frames between the specified time range.
     Args:
@@ -27,8 +35,74 @@ def generate_data_from_time_range(file_info,
         mmapped_file (mmap.mmap): Memory-mapped file object.
         start_seconds (float): The start time in seconds since the VDIF file's reference epoch.
         end_seconds (float): The end time in seconds since the VDIF file's reference epoch.
+        workers (int): Number of processes to decode with.
+    Returns:
+        tuple:
+            - header_info (dict): Parsed header of the first frame in the range.
+            - dict: The samples and their time axis, as described in build_vdif_data.
+    """
+    start_offset, total_frames = get_frame_range(file_info, mmapped_file, start_seconds_from_epoch, end_seconds_from_epoch)
+
+    if total_frames == 0:
+        raise ValueError("The requested time range does not contain any complete frames.")
+
+    return generate_data_from_frame_run(file_info, mmapped_file, start_offset, total_frames, workers)
+
+
+def iterate_data_chunks(file_info,
+                        mmapped_file,
+                        start_seconds_from_epoch,
+                        end_seconds_from_epoch,
+                        frames_per_chunk=1000,
+                        overlap_frames=0):
+    """
+    Yields the data between the specified time range in chunks of whole frames, so
+    that ranges larger than memory can be processed. Each chunk is decoded from a
+    zero-copy view of the mmap, so only one chunk is held in memory at a time.
+    Args:
+        file_info (dict): Information about the VDIF file.
+        mmapped_file (mmap.mmap): Memory-mapped file object.
+        start_seconds_from_epoch (float): The start time in seconds since the VDIF file's reference epoch.
+        end_seconds_from_epoch (float): The end time in seconds since the VDIF file's reference epoch.
+        frames_per_chunk (int): Number of frames in each chunk.
+        overlap_frames (int): Number of frames repeated from the end of one chunk at the start of the next.
+    Yields:
+        tuple:
+            - header_info (dict): Parsed header of the first frame in the chunk.
+            - dict: The samples of the chunk and their time axis, as described in build_vdif_data.
+    """
+    if not 0 <= overlap_frames < frames_per_chunk:
+        raise ValueError("overlap_frames must be at least 0 and less than frames_per_chunk.")
+
+    frame_length = file_info["frame_length"]
+    start_offset, total_frames = get_frame_range(file_info, mmapped_file, start_seconds_from_epoch, end_seconds_from_epoch)
+    step = frames_per_chunk - overlap_frames
+
+    chunk_start = 0
+    while chunk_start < total_frames:
+        num_frames = min(frames_per_chunk, total_frames - chunk_start)
+        offset = start_offset + chunk_start * frame_length
+
+        yield generate_data_from_frame_run(file_info, mmapped_file, offset, num_frames)
+
+        # Stop once the end of the range has been yielded, rather than yielding a chunk of only overlap
+        if chunk_start + num_frames >= total_frames:
+            break
+        chunk_start += step
+
+
+def get_frame_range(file_info, mmapped_file, start_seconds_from_epoch, end_seconds_from_epoch):
+    """
+    Finds the frames of a simple VDIF file that lie within the specified time range.
+    Args:
+        file_info (dict): Information about the VDIF file.
+        mmapped_file (mmap.mmap): Memory-mapped file object.
+        start_seconds_from_epoch (float): The start time in seconds since the VDIF file's reference epoch.
+        end_seconds_from_epoch (float): The end time in seconds since the VDIF file's reference epoch.
     Returns:
-        np.ndarray: The continuous data array, including time and value.
+        tuple:
+            - int: Byte offset of the first frame in the range.
+            - int: Number of complete frames in the range.
     """
     # Extract the frame length and frames per second from the file info
     frame_length = file_info["frame_length"]
@@ -43,38 +117,406 @@ def generate_data_from_time_range(file_info,
     start_offset = int(frames_per_second * start_seconds) * frame_length
     end_offset = int(frames_per_second * end_seconds) * frame_length
 
-    # Calculate the total number of frames to process
+    # Calculate the total number of frames to process, clamped to the end of the file
     total_frames = (end_offset - start_offset) // frame_length
+    total_frames = max(0, min(total_frames, (len(mmapped_file) - start_offset) // frame_length))
+
+    return start_offset, total_frames
+
+
+def generate_data_from_frame_run(file_info, mmapped_file, start_offset, num_frames, workers=1):
+    """
+    Generates the data of a run of back to back frames, such as the frames of a time range of
+    a simple file. They are decoded as in generate_data_from_frame_offsets, so invalid frames
+    are filled with zeros and counted as missing however many workers decode them.
+    Returns:
+        tuple:
+            - header_info (dict): Parsed header of the first frame of the run.
+            - dict: The samples and their time axis, as described in build_vdif_data.
+    """
+    frames_per_second = file_info["frames_per_second"]
+    header_info = read_vdif_frame_header(mmapped_file, start_offset)
+    first_frame_key = header_info["seconds_from_epoch"] * frames_per_second + header_info["frame_number"]
+    frame_offsets = start_offset + np.arange(num_frames, dtype=np.int64) * file_info["frame_length"]
+    return generate_data_from_frame_offsets(file_info, mmapped_file, first_frame_key, frame_offsets, frames_per_second, workers)
+
+
+def generate_data_from_frame_offsets(file_info, mmapped_file, first_frame_key, frame_offsets, frames_per_second, workers=1, reference_offset=None):
+    """
+    Generates the data of a run of consecutive frame times whose frames may lie anywhere in
+    the file, such as one located with a frame index. Missing and invalid frames are filled
+    with zeros so that the samples keep a regular time axis. A run with no frames at all is
+    only given if a reference frame is, and is all zeros with every frame counted as missing.
+    Args:
+        file_info (dict): Information about the VDIF file.
+        mmapped_file (mmap.mmap): Memory-mapped file object.
+        first_frame_key (int): Time key (frames since the reference epoch) of the first frame.
+        frame_offsets (np.ndarray): Byte offset of the frame for each consecutive time key, or -1 if missing.
+        frames_per_second (int): Number of frames per second of the file.
+        workers (int): Number of processes to decode with. Each decodes its own share of the frames.
+        reference_offset (int): Byte offset of a frame of the same stream to describe a run with no frames by.
+    Returns:
+        tuple:
+            - header_info (dict): Parsed header of the first frame present in the run, or of the reference frame.
+            - dict: The samples and their time axis, as described in build_vdif_data.
+    """
+    frame_length = file_info["frame_length"]
+    present = frame_offsets >= 0
+
+    if not np.any(present) and reference_offset is None:
+        raise ValueError("The requested time range does not contain any frames.")
+    if np.any(frame_offsets[present] % frame_length):
+        raise ValueError("Frames are not aligned to the frame length. Files with mixed frame lengths are not supported.")
+
+    header_info = read_vdif_frame_header(mmapped_file, int(frame_offsets[present][0]) if np.any(present) else int(reference_offset))
+    header_size = 32 if header_info["legacy_mode"] == 0 else 16
+    bits_per_sample = header_info["bits_per_sample"]
+
+    # One row of samples per frame
+    samples_per_frame = (frame_length - header_size) * 8 // bits_per_sample
+    shape = (len(frame_offsets), samples_per_frame)
+    dtype = get_sample_dtype(bits_per_sample)
+
+    if workers > 1:
+        data, missing_frames = decode_frames_in_parallel(file_info["file_path"], frame_offsets, shape, dtype,
+                                                         frame_length, header_size, bits_per_sample, workers)
+    else:
+        data = np.empty(shape, dtype=dtype)
+        missing_frames = decode_frames_at_offsets(mmapped_file, frame_offsets, frame_length, header_size, bits_per_sample, data)
+
+    vdif_data = build_vdif_data(data.reshape(-1), header_info, file_info)
+    vdif_data["time_axis"]["start_seconds_from_epoch"] = first_frame_key // frames_per_second
+    vdif_data["time_axis"]["start_frame_number"] = first_frame_key % frames_per_second
+    vdif_data["time_axis"]["frames_per_second"] = frames_per_second
+    vdif_data["time_axis"]["missing_frames"] = missing_frames
+
+    return header_info, vdif_data
+
+
+def decode_frames_at_offsets(mmapped_file, frame_offsets, frame_length, header_size, bits_per_sample, out):
+    """
+    Decodes the frames at the given offsets into a preallocated sample array, a block of
+    frames at a time. Missing (offset -1) and invalid frames are filled with zeros.
+    Args:
+        mmapped_file (mmap.mmap): Memory-mapped file object.
+        frame_offsets (np.ndarray): Byte offset of each frame, or -1 if missing.
+        frame_length (int): Length of each frame in bytes.
+        header_size (int): Length of each frame header in bytes.
+        bits_per_sample (int): Bits per sample of the data.
+        out (np.ndarray): A (frames x samples per frame) array to decode into.
+    Returns:
+        int: The number of missing and invalid frames.
+    """
+    missing_frames = 0
+
+    for block_start in range(0, len(frame_offsets), DECODE_BLOCK_FRAMES):
+        block_offsets = frame_offsets[block_start:block_start + DECODE_BLOCK_FRAMES]
+        block_out = out[block_start:block_start + len(block_offsets)]
+        present = block_offsets >= 0
+
+        if np.all(present) and np.all(np.diff(block_offsets) == frame_length):
+            # The frames are back to back, so view them directly
+            frames = get_frame_view(mmapped_file, int(block_offsets[0]), len(block_offsets), frame_length)
+        else:
+            # Gather the frames from wherever they are in the file
+            all_frames = get_frame_view(mmapped_file, 0, len(mmapped_file) // frame_length, frame_length)
+            frames = all_frames[np.where(present, block_offsets // frame_length, 0)]
+
+        decode_vdif_payloads(frames[:, header_size:], bits_per_sample, out=block_out)
+
+        # The invalid data flag is the top bit of word 0
+        missing = ~present | (frames[:, 3] >> 7).astype(bool)
+        block_out[missing] = 0
+        missing_frames += int(np.count_nonzero(missing))
+
+    return missing_frames
+
+
+def decode_frames_in_parallel(file_path, frame_offsets, shape, dtype, frame_length, header_size, bits_per_sample, workers):
+    """
+    Splits the frames into one share per worker process. Each worker maps the file itself and
+    decodes its share straight into memory shared with this process, so no samples are pickled.
+
+    Where processes are forked, the shared memory is an anonymous mapping that the returned
+    array owns: the workers inherit it, and it is freed with the last array that views it, so
+    the samples are never copied. Otherwise it is a named shared memory block, which is
+    released once the samples have been copied out of it.
+    Returns:
+        tuple:
+            - np.ndarray: The (frames x samples per frame) decoded samples.
+            - int: The number of missing and invalid frames.
+    """
+    num_frames = len(frame_offsets)
+    bounds = np.linspace(0, num_frames, min(workers, num_frames) + 1).astype(int)
+    num_bytes = max(1, int(np.prod(shape)) * dtype.itemsize)
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        output = mmap.mmap(-1, num_bytes)
+        tasks = [(file_path, shape, dtype, bounds[i], frame_offsets[bounds[i]:bounds[i + 1]],
+                  frame_length, header_size, bits_per_sample) for i in range(len(bounds) - 1)]
+
+        with multiprocessing.get_context("fork").Pool(len(tasks), initializer=set_inherited_output, initargs=(output,)) as pool:
+            missing_frames = sum(pool.starmap(decode_frames_to_inherited_output, tasks))
+
+        return np.frombuffer(output, dtype=dtype, count=int(np.prod(shape))).reshape(shape), missing_frames
+
+    output = shared_memory.SharedMemory(create=True, size=num_bytes)
+    try:
+        tasks = [(file_path, output.name, shape, dtype, bounds[i], frame_offsets[bounds[i]:bounds[i + 1]],
+                  frame_length, header_size, bits_per_sample) for i in range(len(bounds) - 1)]
+
+        with multiprocessing.Pool(len(tasks)) as pool:
+            missing_frames = sum(pool.starmap(decode_frames_to_shared_memory, tasks))
+
+        # Copy the samples out so the shared block can be released
+        data = np.ndarray(shape, dtype=dtype, buffer=output.buf).copy()
+    finally:
+        output.close()
+        output.unlink()
+
+    return data, missing_frames
+
+
+# The output mapping of decode_frames_in_parallel, in its forked worker processes
+inherited_output = None
+
+def set_inherited_output(output):
+    global inherited_output
+    inherited_output = output
+
+
+def decode_frames_to_inherited_output(file_path, shape, dtype, row_start, frame_offsets, frame_length, header_size, bits_per_sample):
+    """
+    Forked worker process of decode_frames_in_parallel. Decodes its frames into rows
+    row_start onwards of the inherited output mapping.
+    Returns:
+        int: The number of missing and invalid frames.
+    """
+    data = np.frombuffer(inherited_output, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mmapped_file:
+            return decode_frames_at_offsets(mmapped_file, frame_offsets, frame_length, header_size,
+                                            bits_per_sample, data[row_start:row_start + len(frame_offsets)])
+
+
+def decode_frames_to_shared_memory(file_path, shared_memory_name, shape, dtype, row_start, frame_offsets,
+                                   frame_length, header_size, bits_per_sample):
+    """
+    Worker process of decode_frames_in_parallel. Decodes its frames into rows
+    row_start onwards of the shared sample array.
+    Returns:
+        int: The number of missing and invalid frames.
+    """
+    output = shared_memory.SharedMemory(name=shared_memory_name)
+    try:
+        data = np.ndarray(shape, dtype=dtype, buffer=output.buf)
+        with open(file_path, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mmapped_file:
+                missing_frames = decode_frames_at_offsets(mmapped_file, frame_offsets, frame_length, header_size,
+                                                          bits_per_sample, data[row_start:row_start + len(frame_offsets)])
+        del data
+    finally:
+        output.close()
+
+    return missing_frames
+
+
+def build_vdif_data(samples, header_info, file_info):
+    """
+    Pairs decoded samples with a description of their time axis. The time of each
+    sample is only generated when asked for with generate_time_data.
+    Args:
+        samples (np.ndarray): The decoded samples (int8 or int16), in payload order.
+        header_info (dict): Parsed header of the frame holding the first sample.
+        file_info (dict): File metadata containing 'frames_per_second' and 'sample_rate'.
+    Returns:
+        dict: "samples" holding the sample array (see deinterleave_samples) and "time_axis"
+              holding the start second, start frame and sample rate of the samples, and the
+              number of missing frames filled with zeros.
+    """
+    samples = deinterleave_samples(samples, header_info["num_channels"], header_info["data_type"] == "Complex")
+
+    time_axis = {
+        "start_seconds_from_epoch": header_info["seconds_from_epoch"],
+        "start_frame_number": header_info["frame_number"],
+        "frames_per_second": file_info["frames_per_second"],
+        "sample_rate": file_info["sample_rate"],
+        "num_samples": samples.shape[-1],
+        "missing_frames": 0,
+    }
+
+    return {
+        "samples": samples,
+        "time_axis": time_axis,
+    }
+
+
+def deinterleave_samples(samples, num_channels, is_complex):
+    """
+    Separates the channels and I/Q components of decoded payload samples. Each time step of a
+    payload holds one sample per channel, and each complex sample is an I value then a Q value.
+    Args:
+        samples (np.ndarray): The decoded samples, in payload order.
+        num_channels (int): Number of channels in the data.
+        is_complex (bool): Whether the samples are complex.
+    Returns:
+        np.ndarray: A (channels x samples) array, or a 1D array for single channel data.
+                    Complex samples have the complex dtype of the current precision (see
+                    vdif_precision). Real samples are returned as views.
+    """
+    if is_complex:
+        # Pair up each I and Q value as the two halves of a complex value
+        samples = samples.astype(prec.real_dtype()).view(prec.complex_dtype())
+
+    if num_channels == 1:
+        return samples
+
+    # Samples of the same channel are num_channels apart
+    return samples.reshape(-1, num_channels).T
+
+
+def select_channel(data, channel=0):
+    """
+    Selects one channel of multi-channel data, leaving single channel data as it is.
+    Args:
+        data (dict): The samples and their time axis, from build_vdif_data.
+        channel (int): Index of the channel to keep.
+    Returns:
+        dict: The samples of the channel and the same time axis.
+    """
+    if data["samples"].ndim == 1:
+        return data
+
+    return {
+        "samples": data["samples"][channel],
+        "time_axis": data["time_axis"],
+    }
+
+
+def generate_time_data(time_axis, start=0, stop=None, relative=False):
+    """
+    Generates the time stamps of a slice of samples from a time axis.
+    Args:
+        time_axis (dict): The time axis of the samples, from build_vdif_data.
+        start (int): Index of the first sample to generate a time for.
+        stop (int): Index one past the last sample. Defaults to the end of the samples.
+        relative (bool): Return seconds since the first sample rather than since the
+                         reference epoch. Relative times keep full sub-sample precision.
+    Returns:
+        np.ndarray: The time of each sample in seconds (float64).
+    """
+    if stop is None:
+        stop = time_axis["num_samples"]
+
+    time_data = np.arange(start, stop) / time_axis["sample_rate"]
+
+    if relative:
+        return time_data
+
+    time_base = time_axis["start_seconds_from_epoch"] + time_axis["start_frame_number"] / time_axis["frames_per_second"]
+    return time_base + time_data
+
+
+def get_frame_view(mmapped_file, start_offset, num_frames, frame_length):
+    """
+    Returns a zero-copy view of consecutive frames in a memory-mapped file.
+    Args:
+        mmapped_file (mmap.mmap): Memory-mapped file object.
+        start_offset (int): Byte offset of the first frame.
+        num_frames (int): Number of frames in the view.
+        frame_length (int): Length of each frame in bytes (header included).
+    Returns:
+        np.ndarray: A (frames x frame_length) uint8 array backed by the mmap.
+    """
+    frames = np.frombuffer(mmapped_file, dtype=np.uint8, count=num_frames * frame_length, offset=start_offset)
+    return frames.reshape(num_frames, frame_length)
+
+
+def get_sample_dtype(bits_per_sample):
+    """
+    Returns the dtype that samples of the given size are decoded to.
+    """
+    if bits_per_sample in (1, 2, 4, 8):
+        return np.dtype(np.int8)
+    elif bits_per_sample == 16:
+        return np.dtype('<i2')
+    else:
+        raise ValueError(f"Unsupported bits per sample: {bits_per_sample}")
+
+
+@functools.lru_cache(maxsize=None)
+def get_low_bit_lookup_table(bits_per_sample):
+    """
+    Builds a table of the samples packed in every possible byte of 1, 2 or 4 bit data.
+    Samples are packed from the least significant bit up. 1 and 2 bit samples take the
+    symmetric levels of the VDIF specification (-1, +1 and -3, -1, +1, +3), and 4 bit
+    samples are offset binary, like 8 and 16 bit samples.
+    Args:
+        bits_per_sample (int): 1, 2 or 4.
+    Returns:
+        np.ndarray: A (256 x samples per byte) int8 array. Row b holds the samples of byte b.
+    """
+    samples_per_byte = 8 // bits_per_sample
+    byte_values = np.arange(256, dtype=np.uint8)[:, np.newaxis]
+    shifts = np.arange(samples_per_byte, dtype=np.uint8) * bits_per_sample
+    codes = (byte_values >> shifts) & ((1 << bits_per_sample) - 1)
+
+    if bits_per_sample == 4:
+        levels = codes.astype(np.int8) - 8
+    else:
+        levels = 2 * codes.astype(np.int8) - ((1 << bits_per_sample) - 1)
+
+    return levels.astype(np.int8)
+
+
+def decode_vdif_payloads(payloads, bits_per_sample, out=None):
+    """
+    Converts offset-binary VDIF payload bytes into signed samples.
+    Args:
+        payloads (np.ndarray): A (frames x payload bytes) uint8 array, may be a strided view.
+        bits_per_sample (int): Bits per sample of the data.
+        out (np.ndarray, optional): A (frames x samples per frame) array to decode into.
+    Returns:
+        np.ndarray: A (frames x samples per frame) array of int8 (1, 2, 4 and 8 bit) or int16 (16 bit) samples.
+    """
+    dtype = get_sample_dtype(bits_per_sample)
 
-    # Initialize a numpy array to store the continuous data
-    all_data = []
+    if bits_per_sample < 8:
+        # Look up the samples packed in each byte
+        samples_per_byte = 8 // bits_per_sample
+        lookup_table = get_low_bit_lookup_table(bits_per_sample)
+        if out is None:
+            out = np.empty((payloads.shape[0], payloads.shape[1] * samples_per_byte), dtype=dtype)
+        np.take(lookup_table, payloads, axis=0, out=out.reshape(payloads.shape[0], payloads.shape[1], samples_per_byte))
+        return out
 
-    # Start at the beginning of the selected range
-    offset = start_offset
-    starting_header_info = None
+    if bits_per_sample == 16:
+        payloads = payloads.view('<u2')
+    if out is None:
+        out = np.empty(payloads.shape, dtype=dtype)
 
-    # Use tqdm for the progress bar
-    with tqdm(total=total_frames, desc="Generating data", unit="frame") as pbar:
-        while offset < end_offset:
-            # Read each frame's header and data
-            if starting_header_info is None:
-                starting_header_info, data = read_vdif_frame_data(mmapped_file, offset, file_info)
-            else:
-                _, data = read_vdif_frame_data(mmapped_file, offset, file_info)
+    # Flipping the top bit of offset-binary data gives two's complement
+    sign_bit = np.array(1 << (bits_per_sample - 1), dtype=payloads.dtype)
+    np.bitwise_xor(payloads, sign_bit, out=out.view(payloads.dtype))
 
-            # Append data to the continuous array
-            all_data.append(data)
+    return out
 
-            # Move to the next frame
-            offset += frame_length
 
-            # Update the progress bar
-            pbar.update(1)
+def decode_vdif_frames(frames, header_info):
+    """
+    Decodes the payloads of a block of whole VDIF frames into one continuous sample array.
+    Args:
+        frames (np.ndarray): A (frames x frame_length) uint8 array, as from get_frame_view.
+        header_info (dict): Parsed header of the first frame in the block.
+    Returns:
+        np.ndarray: The samples of every frame, in order.
+    """
+    header_size = 32 if header_info["legacy_mode"] == 0 else 16
 
-    # Convert the list of data arrays into a single continuous numpy array
-    all_data = np.vstack(all_data)
+    # Decode the payloads of every frame at once
+    data = decode_vdif_payloads(frames[:, header_size:], header_info["bits_per_sample"])
 
-    return starting_header_info, all_data
+    return data.reshape(-1)
 
 
 def unpack_vdif_header_start(header_bytes):
@@ -134,6 +576,86 @@ def unpack_vdif_extended_user_data(header_bytes):
         "extended_data": extended_data.hex()
     }
 
+# One row per frame, holding the fields of the first half of its header
+VDIF_HEADER_TABLE_DTYPE = np.dtype([
+    ("offset", np.int64),
+    ("invalid_data", np.uint8),
+    ("legacy_mode", np.uint8),
+    ("seconds_from_epoch", np.uint32),
+    ("reference_epoch", np.uint8),
+    ("frame_number", np.uint32),
+    ("vdif_version", np.uint8),
+    ("num_channels", np.uint32),
+    ("frame_length", np.uint32),
+    ("data_type", np.uint8),  # 0 for Real, 1 for Complex
+    ("bits_per_sample", np.uint8),
+    ("thread_id", np.uint16),
+    ("station_id", np.uint16),
+])
+
+def read_vdif_header_table(mmapped_file, frame_length=None, start_frame=0, num_frames=None):
+    """
+    Decodes the headers of a run of frames into one structured array, reading the header
+    words of every frame through a strided view of the mmap.
+    Args:
+        mmapped_file (mmap.mmap): Memory-mapped file object.
+        frame_length (int): Length of each frame in bytes. Read from the first frame if None.
+        start_frame (int): Index of the first frame to decode.
+        num_frames (int): Number of frames to decode. Defaults to every complete frame to the end of the file.
+    Returns:
+        np.ndarray: A structured array of VDIF_HEADER_TABLE_DTYPE, one row per frame.
+    """
+    if frame_length is None:
+        frame_length = read_vdif_frame_header(mmapped_file, 0)["frame_length"]
+
+    start_offset = start_frame * frame_length
+    available_frames = max(0, (len(mmapped_file) - start_offset) // frame_length)
+    if num_frames is None or num_frames > available_frames:
+        num_frames = available_frames
+
+    # Words 0-3 of every header
+    frames = get_frame_view(mmapped_file, start_offset, num_frames, frame_length)
+    words = frames[:, :16].view('<u4')
+    word_0, word_1, word_2, word_3 = words[:, 0], words[:, 1], words[:, 2], words[:, 3]
+
+    table = np.empty(num_frames, dtype=VDIF_HEADER_TABLE_DTYPE)
+    table["offset"] = start_offset + np.arange(num_frames, dtype=np.int64) * frame_length
+
+    # Parse fields from Word 0
+    table["invalid_data"] = (word_0 >> 31) & 0x1
+    table["legacy_mode"] = (word_0 >> 30) & 0x1
+    table["seconds_from_epoch"] = word_0 & 0x3FFFFFFF
+
+    # Parse fields from Word 1
+    table["reference_epoch"] = (word_1 >> 24) & 0x3F
+    table["frame_number"] = word_1 & 0xFFFFFF
+
+    # Parse fields from Word 2
+    table["vdif_version"] = (word_2 >> 29) & 0x7
+    table["num_channels"] = np.left_shift(np.uint32(1), (word_2 >> 24) & 0x1F)
+    table["frame_length"] = (word_2 & 0xFFFFFF) * 8  # Convert 8-byte units to bytes
+
+    # Parse fields from Word 3
+    table["data_type"] = (word_3 >> 31) & 0x1
+    table["bits_per_sample"] = ((word_3 >> 26) & 0x1F) + 1
+    table["thread_id"] = (word_3 >> 16) & 0x3FF
+    table["station_id"] = word_3 & 0xFFFF
+
+    return table
+
+def get_frame_time_keys(header_table, frames_per_second):
+    """
+    Gives each frame in a header table a single sortable time key, the number of frames
+    since the reference epoch. Consecutive frames of a contiguous file have keys that
+    increase by one, so gaps and reordering can be found by comparing neighbours.
+    Args:
+        header_table (np.ndarray): Header table from read_vdif_header_table.
+        frames_per_second (int): Number of frames per second of the file.
+    Returns:
+        np.ndarray: The int64 time key of each frame.
+    """
+    return header_table["seconds_from_epoch"].astype(np.int64) * frames_per_second + header_table["frame_number"]
+
 def read_vdif_frame_data(mmapped_file, offset, file_info):
     """
     Reads a VDIF frame from an mmapped file starting at a given offset.
@@ -146,44 +668,16 @@ def read_vdif_frame_data(mmapped_file, offset, file_info):
     Returns:
         tuple: 
             - header_info (dict): Parsed header information from the VDIF frame.
-            - np.array: The unpacked data samples as a 2D array with columns [time, value].
+            - dict: The unpacked data samples and their time axis, as described in build_vdif_data.
     """
     # Read header information from the specified offset
     header_info = read_vdif_frame_header(mmapped_file, offset)
 
-    # Extract frame length, bits per sample, and other header details
-    frame_length = header_info["frame_length"]
-    bits_per_sample = header_info["bits_per_sample"]
-    seconds_from_epoch = header_info["seconds_from_epoch"]
-    frame_number = header_info["frame_number"]
-    frames_per_second = file_info["frames_per_second"]
-
-    # Calculate header size and data length
-    header_size = 32 if header_info["legacy_mode"] == 0 else 16
-
-    # Read the data portion of the frame
-    data_bytes = mmapped_file[offset + header_size: offset + frame_length]
-
-    # Unpack data based on bits per sample
-    if bits_per_sample == 8:
-        data = np.frombuffer(data_bytes, dtype=np.uint8)
-    elif bits_per_sample == 16:
-        data = np.frombuffer(data_bytes, dtype=np.int16)
-    else:
-        raise ValueError(f"Unsupported bits per sample: {bits_per_sample}")
-    
-    # Adjust data values
-    data = data - 2**(bits_per_sample - 1)
-    data = data.astype(np.int8)
-
-    # Generate time data for each sample
-    time_base = seconds_from_epoch + frame_number / frames_per_second
-    time_data = np.array([time_base + i / (len(data) * frames_per_second) for i in range(len(data))])
-
-    # Combine time and value data into a 2D array
-    result = np.column_stack((time_data, data))
+    # Read and decode the data portion of the frame
+    frame = get_frame_view(mmapped_file, offset, 1, header_info["frame_length"])
+    samples = decode_vdif_frames(frame, header_info)
 
-    return header_info, result
+    return header_info, build_vdif_data(samples, header_info, file_info)
 
 def read_vdif_frame_header(mmapped_file, offset):
     """
@@ -0,0 +1,185 @@
+"""
+-------------------------------------------------
+File: vdif_decimation.py
+Description: Reduces the sample rate of data whose signal only fills part of
+             the recorded band, before it is correlated. The data can first be
+             shifted so the signal band is centred on 0 Hz, then it is low-pass
+             filtered and only every decimation-th output is kept. The filter is
+             evaluated in polyphase form, so only the kept outputs are computed,
+             and it keeps its state between chunks so a long section can be
+             decimated block by block as it is read.
+License: see LICENCE.txt
+Dependencies:
+    - numpy
+    - scipy
+-------------------------------------------------
+"""
+
+import numpy as np
+from scipy.signal import firwin
+import src.vdif_precision as prec
+
+# Filter taps per decimated output sample
+DECIMATION_TAPS_PER_PHASE = 16
+
+# Fraction of the output band kept by the filter, the rest being its transition band
+DECIMATION_PASSBAND = 0.8
+
+def get_decimation_factor(sample_rate, bandwidth, shift_to_baseband=False):
+    """
+    Returns the largest decimation that keeps a signal band from 0 Hz to the bandwidth within
+    the passband of the filter. Shifting the band to be centred on 0 Hz gives complex output,
+    which needs half the sample rate of real output for the same band.
+
+    Args:
+        sample_rate (float): Sampling rate of the input (samples per second).
+        bandwidth (float): Highest frequency of the signal in Hz.
+        shift_to_baseband (bool): Whether the band is shifted to be centred on 0 Hz.
+
+    Returns:
+        int: The decimation factor, at least 1.
+    """
+    output_band = bandwidth / 2 if shift_to_baseband else bandwidth
+    return max(1, int(DECIMATION_PASSBAND * sample_rate / (2 * output_band)))
+
+def get_decimation_parameters(sample_rate, bandwidth, decimation=None, center_frequency=None):
+    """
+    Asks the user for the decimation and the frequency to shift to 0 Hz, if they are not given.
+
+    Returns:
+        tuple: The decimation factor and the centre frequency in Hz, which is None for no shift.
+    """
+    if not decimation:
+        try:
+            center_frequency = float(input(f"Enter the frequency in Hz to shift to 0 Hz (default: {bandwidth / 2:g}, 0 for none): ") or bandwidth / 2) or None
+            automatic = get_decimation_factor(sample_rate, bandwidth, center_frequency is not None)
+            decimation = int(input(f"Enter the decimation factor (default: {automatic}): ") or automatic)
+        except ValueError:
+            print("Invalid input. Using default values.")
+            center_frequency = bandwidth / 2
+            decimation = get_decimation_factor(sample_rate, bandwidth, True)
+
+    return decimation, center_frequency
+
+def start_decimator(sample_rate, decimation, center_frequency=None, taps_per_phase=DECIMATION_TAPS_PER_PHASE):
+    """
+    Starts a decimator that consecutive chunks of a signal are passed through by decimate_chunk.
+
+    The low-pass filter is a Kaiser windowed sinc with decimation * taps_per_phase taps, cut
+    off at DECIMATION_PASSBAND of the output band. Its taps are split into one row per
+    polyphase branch. The filter history starts with half a filter of zeros, so that each
+    output lines up with every decimation-th input to within half a sample.
+
+    Args:
+        sample_rate (float): Sampling rate of the input (samples per second).
+        decimation (int): Number of input samples per output sample.
+        center_frequency (float): Frequency in Hz shifted to 0 Hz before filtering, giving
+            complex output. None does not shift the data.
+        taps_per_phase (int): Filter taps per polyphase branch.
+
+    Returns:
+        dict: The decimator.
+    """
+    decimation = int(decimation)
+    num_taps = decimation * taps_per_phase
+    output_rate = sample_rate / decimation
+
+    # Real output keeps the passband above 0 Hz, and complex output either side of it
+    taps = firwin(num_taps, DECIMATION_PASSBAND * output_rate / 2, window=("kaiser", 8.0), fs=sample_rate) if decimation > 1 else np.ones(1)
+
+    return {
+        "sample_rate": sample_rate,
+        "decimation": decimation,
+        "output_rate": output_rate,
+        "center_frequency": center_frequency,
+        # Row j holds the taps applied to the j-th block of decimation inputs of each window
+        "branches": taps[::-1].astype(prec.real_dtype()).reshape(-1, decimation),
+        "history": np.zeros((len(taps) - 1) // 2, dtype=prec.real_dtype()),
+        "mixer_phase": 0.0,
+    }
+
+def decimate_chunk(decimator, values, flush=False):
+    """
+    Shifts, filters and decimates the next chunk of a signal.
+
+    Args:
+        decimator (dict): Decimator from start_decimator.
+        values (np.ndarray): The next samples of the signal.
+        flush (bool): If True the signal ends here, and it is padded with zeros to give the last outputs.
+
+    Returns:
+        np.ndarray: The decimated samples, complex if the decimator shifts the data.
+    """
+    values = prec.as_working_dtype(values)
+
+    if decimator["center_frequency"] is not None:
+        # Mix down, carrying the mixer phase on to the next chunk
+        phase_step = -2 * np.pi * decimator["center_frequency"] / decimator["sample_rate"]
+        phases = decimator["mixer_phase"] + phase_step * np.arange(len(values))
+        values = values * np.exp(1j * phases).astype(prec.complex_dtype())
+        decimator["mixer_phase"] = (decimator["mixer_phase"] + phase_step * len(values)) % (2 * np.pi)
+
+    branches = decimator["branches"]
+    taps_per_phase, decimation = branches.shape
+    buffer = np.concatenate((decimator["history"], values))
+    if flush:
+        buffer = np.concatenate((buffer, np.zeros(branches.size // 2, dtype=buffer.dtype)))
+
+    # Output m is the sum over branches j of block m + j of the buffer times branch j
+    num_blocks = len(buffer) // decimation
+    num_outputs = max(0, num_blocks - taps_per_phase + 1)
+    blocks = buffer[:num_blocks * decimation].reshape(num_blocks, decimation)
+
+    output = np.zeros(num_outputs, dtype=buffer.dtype)
+    for j in range(taps_per_phase):
+        output += blocks[j:j + num_outputs] @ branches[j]
+
+    decimator["history"] = buffer[num_outputs * decimation:]
+    return output
+
+def decimate(values, sample_rate, decimation, center_frequency=None):
+    """
+    Decimates a whole signal at once (see start_decimator).
+
+    Returns:
+        tuple: The decimated samples and their sample rate.
+    """
+    decimator = start_decimator(sample_rate, decimation, center_frequency)
+    return decimate_chunk(decimator, values, flush=True), decimator["output_rate"]
+
+def decimate_template(decimator, template):
+    """
+    Passes a template through a fresh copy of a decimator's filter and mixer, so that it can
+    be correlated with the data the decimator gives.
+
+    Returns:
+        np.ndarray: The decimated template.
+    """
+    return decimate(template, decimator["sample_rate"], decimator["decimation"], decimator["center_frequency"])[0]
+
+def decimate_data(decimator, data):
+    """
+    Decimates the next chunk of data from fr.build_vdif_data, giving a chunk with the
+    decimated samples and a time axis at the output rate. The time axis of the first chunk
+    is kept by the decimator, and each chunk after it starts where the last one ended.
+
+    Returns:
+        dict: The decimated samples and their time axis.
+    """
+    samples = decimate_chunk(decimator, data["samples"])
+
+    if "time_axis" not in decimator:
+        # Missing frames are counted per chunk of input, so they are not passed on
+        time_axis = {key: value for key, value in data["time_axis"].items() if key != "missing_frames"}
+        time_axis["start_seconds_from_epoch"] += time_axis["start_frame_number"] / time_axis["frames_per_second"]
+        time_axis["start_frame_number"] = 0
+        time_axis["sample_rate"] = decimator["output_rate"]
+        decimator["time_axis"] = time_axis
+        decimator["outputs_done"] = 0
+
+    time_axis = {**decimator["time_axis"],
+                 "start_seconds_from_epoch": decimator["time_axis"]["start_seconds_from_epoch"] + decimator["outputs_done"] / decimator["output_rate"],
+                 "num_samples": len(samples)}
+    decimator["outputs_done"] += len(samples)
+
+    return {"samples": samples, "time_axis": time_axis}
@@ -0,0 +1,452 @@
+"""
+-------------------------------------------------
+File: vdif_detection.py
+Description: Finds echoes in match filtered data with a constant false alarm
+             rate (CFAR) detector, so that whole observations can be searched
+             without looking at plots. Each fast time bin is compared with a
+             threshold scaled from the noise in the training cells on either
+             side of it, estimated by their mean (CA-CFAR) or by one of their
+             ordered values (OS-CFAR), which nearby echoes do not raise.
+             Real correlations are detected on their envelope, the magnitude
+             of their analytic signal, so that the noise power has the
+             exponential distribution the thresholds are scaled for.
+             Detections are returned as a table, and are written to a CSV log
+             as a long section is streamed.
+License: see LICENCE.txt
+Dependencies:
+    - numpy
+-------------------------------------------------
+"""
+
+import csv
+import numpy as np
+import src.vdif_analysing as anal
+import src.vdif_data_frame_reader as fr
+import src.vdif_compute as comp
+import src.vdif_fft as fft
+import src.vdif_precision as prec
+
+# Cells either side of the cell under test that are left out of the noise estimate
+CFAR_GUARD_CELLS = 4
+
+# Cells either side of the guard cells that the noise is estimated from
+CFAR_TRAINING_CELLS = 16
+
+# Probability of a noise cell crossing the threshold of a row
+CFAR_PROBABILITY_FALSE_ALARM = 1e-6
+
+# Height above the local mean, in units of the noise of the mean, that detects a bin of the integrated profile
+PROFILE_SNR_THRESHOLD = 6.0
+
+# Rows passed through the OS-CFAR at a time, bounding the size of its sorted training cells
+CFAR_BATCH_ROWS = 256
+
+# One row per detection
+DETECTION_DTYPE = np.dtype([
+    ("slow_time", np.float64),   # Seconds since the reference epoch of the start of the row, NaN for the integrated profile
+    ("row", np.int64),           # Slow time row, -1 for the integrated profile
+    ("delay_bin", np.int64),     # Fast time bin
+    ("delay", np.float64),       # Delay from the start of the row in seconds
+    ("value", np.float64),       # Power of the cell, or the mean magnitude for the integrated profile
+    ("threshold", np.float64),
+    ("snr", np.float64),
+])
+
+def get_ca_cfar_scale(training_cells, probability_false_alarm, oversampling=1):
+    """
+    Returns the factor the mean power of 2 * training_cells noise cells is multiplied by
+    to give a threshold with the probability of false alarm, for exponentially distributed
+    noise power (the square of the magnitude of complex Gaussian noise). The power of a real
+    correlation is not exponential, so its analytic signal is detected (see get_analytic_correlation).
+    Only one in every oversampling cells is counted as independent.
+    """
+    num_cells = 2 * training_cells / oversampling
+    return num_cells * (probability_false_alarm ** (-1 / num_cells) - 1)
+
+def get_os_cfar_scale(training_cells, rank, probability_false_alarm, oversampling=1):
+    """
+    Returns the factor the rank-th smallest power (from 0) of 2 * training_cells noise
+    cells is multiplied by to give a threshold with the probability of false alarm.
+    The probability of false alarm of a factor a is the product of (N - i) / (N - i + a)
+    for i up to rank, which is solved for a by bisection. Only one in every oversampling
+    cells is counted as independent, for both N and the rank.
+    """
+    num_cells = 2 * training_cells / oversampling
+    terms = num_cells - np.arange(int(rank / oversampling) + 1)
+
+    low, high = 0.0, 1.0
+    while np.prod(terms / (terms + high)) > probability_false_alarm:
+        high *= 2
+
+    for _ in range(100):
+        middle = (low + high) / 2
+        if np.prod(terms / (terms + middle)) > probability_false_alarm:
+            low = middle
+        else:
+            high = middle
+
+    return high
+
+def get_analytic_correlation(correlation):
+    """
+    Returns the analytic signal of a real correlation, whose magnitude is its envelope.
+    Complex correlations are returned as they are.
+    """
+    if np.iscomplexobj(correlation):
+        return correlation
+    return fft.analytic_inverse(fft.rfft(correlation), len(correlation))
+
+def get_oversampling(values):
+    """
+    Returns the cells per independent noise cell of the envelope of a correlation of values
+    (see detect_rows).
+    """
+    return 1 if np.iscomplexobj(values) else 2
+
+def get_window_means(values, half_width, guard_cells):
+    """
+    Returns the mean of the cells from guard_cells + 1 to half_width cells either side of
+    each cell along the last axis, from one cumulative sum. Rows wrap around at their ends.
+    """
+    num_cells = values.shape[-1]
+    padding = [(0, 0)] * (values.ndim - 1) + [(half_width, half_width)]
+    cumulative = np.cumsum(np.pad(values, padding, mode="wrap"), axis=-1, dtype=np.float64)
+    cumulative = np.concatenate((np.zeros(values.shape[:-1] + (1,)), cumulative), axis=-1)
+
+    def window_sum(width):
+        return cumulative[..., half_width + width + 1:half_width + width + 1 + num_cells] - cumulative[..., half_width - width:half_width - width + num_cells]
+
+    return (window_sum(half_width) - window_sum(guard_cells)) / (2 * (half_width - guard_cells))
+
+def get_cfar_noise(power, guard_cells=CFAR_GUARD_CELLS, training_cells=CFAR_TRAINING_CELLS, method="ca", rank=None):
+    """
+    Estimates the noise power around each cell along the last axis.
+    Args:
+        power (np.ndarray): Power of each cell, one row per slow time row.
+        guard_cells (int): Cells either side of the cell under test left out of the estimate.
+        training_cells (int): Cells either side of the guard cells the noise is estimated from.
+        method (str): "ca" for the mean of the training cells, or "os" for the rank-th smallest of them.
+        rank (int): Rank of the OS-CFAR estimate. Defaults to three quarters of the training cells.
+    Returns:
+        np.ndarray: The noise estimate of each cell.
+    """
+    half_width = guard_cells + training_cells
+    if method == "ca":
+        return get_window_means(power, half_width, guard_cells)
+
+    if method != "os":
+        raise ValueError(f"Unknown CFAR method {method!r}, expected 'ca' or 'os'.")
+
+    if rank is None:
+        rank = get_default_rank(training_cells)
+
+    padding = [(0, 0)] * (power.ndim - 1) + [(half_width, half_width)]
+    windows = np.lib.stride_tricks.sliding_window_view(np.pad(power, padding, mode="wrap"), 2 * half_width + 1, axis=-1)
+    training = np.concatenate((windows[..., :training_cells], windows[..., -training_cells:]), axis=-1)
+    return np.partition(training, rank, axis=-1)[..., rank]
+
+def get_default_rank(training_cells):
+    return (3 * 2 * training_cells) // 4
+
+def get_local_peaks(values, guard_cells):
+    """
+    Returns whether each cell is the largest within guard_cells cells either side of it
+    along the last axis, so that one echo gives one detection.
+    """
+    padding = [(0, 0)] * (values.ndim - 1) + [(guard_cells, guard_cells)]
+    windows = np.lib.stride_tricks.sliding_window_view(np.pad(values, padding, mode="wrap"), 2 * guard_cells + 1, axis=-1)
+    return values >= np.max(windows, axis=-1)
+
+def detect_rows(rows, sample_rate, first_row=0, start_seconds=0.0, skip_samples=0, method="ca",
+                guard_cells=CFAR_GUARD_CELLS, training_cells=CFAR_TRAINING_CELLS,
+                probability_false_alarm=CFAR_PROBABILITY_FALSE_ALARM, rank=None, oversampling=1):
+    """
+    Runs a CFAR detector along the fast time of each row of a fast time vs. slow time correlation.
+
+    Args:
+        rows (np.ndarray): Complex correlation values or their magnitudes, one row per pulse period
+            (slow time x fast time). Real correlations must be passed as the magnitude of their
+            analytic signal (see get_analytic_correlation), or false alarms are far more likely.
+        sample_rate (float): Sampling rate of the correlation (samples per second).
+        first_row (int): Slow time row number of the first row.
+        start_seconds (float): Time of the first lag of the correlation, in seconds since the reference epoch.
+        skip_samples (int): Number of lags of the correlation before the first row.
+        method (str): "ca" or "os" (see get_cfar_noise).
+        guard_cells, training_cells, rank: See get_cfar_noise.
+        probability_false_alarm (float): Probability of a noise cell crossing the threshold.
+        oversampling (float): Cells per independent noise cell. The analytic signal of a real
+            correlation fills half the band of its sample rate, so neighbouring cells are
+            correlated and it is 2.
+
+    Returns:
+        np.ndarray: Table of the detections (DETECTION_DTYPE), in row then delay order.
+    """
+    if method == "ca":
+        scale = get_ca_cfar_scale(training_cells, probability_false_alarm, oversampling)
+    else:
+        scale = get_os_cfar_scale(training_cells, get_default_rank(training_cells) if rank is None else rank, probability_false_alarm, oversampling)
+
+    fast_time_samples = rows.shape[-1]
+    tables = []
+
+    for batch_start in range(0, len(rows), CFAR_BATCH_ROWS):
+        power = np.abs(prec.as_working_dtype(rows[batch_start:batch_start + CFAR_BATCH_ROWS]))**2
+        noise = get_cfar_noise(power, guard_cells, training_cells, method, rank)
+        threshold = scale * noise
+
+        batch_rows, delay_bins = np.nonzero((power > threshold) & get_local_peaks(power, guard_cells))
+        row_numbers = first_row + batch_start + batch_rows
+
+        table = np.empty(len(batch_rows), dtype=DETECTION_DTYPE)
+        table["slow_time"] = start_seconds + (skip_samples + row_numbers * fast_time_samples) / sample_rate
+        table["row"] = row_numbers
+        table["delay_bin"] = delay_bins
+        table["delay"] = delay_bins / sample_rate
+        table["value"] = power[batch_rows, delay_bins]
+        table["threshold"] = threshold[batch_rows, delay_bins]
+        table["snr"] = table["value"] / np.maximum(noise[batch_rows, delay_bins], np.finfo(np.float64).tiny)
+        tables.append(table)
+
+    return np.concatenate(tables) if tables else np.empty(0, dtype=DETECTION_DTYPE)
+
+def detect_profile(report, sample_rate, guard_cells=CFAR_GUARD_CELLS, training_cells=CFAR_TRAINING_CELLS, snr_threshold=PROFILE_SNR_THRESHOLD):
+    """
+    Runs a CA-CFAR detector along an integrated profile. After many rows the mean magnitude of
+    each bin is close to Gaussian, so the threshold is the mean of the training cells plus
+    snr_threshold times the noise of the mean, the standard deviation of the bins over the rows
+    divided by the square root of the number of rows.
+
+    Args:
+        report (dict): Integration report from comp.get_integration_report.
+        sample_rate (float): Sampling rate of the correlation (samples per second).
+        snr_threshold (float): Height above the local mean, in units of the noise of the mean, that is detected.
+
+    Returns:
+        np.ndarray: Table of the detections (DETECTION_DTYPE), with a row of -1.
+    """
+    profile = report["profile"]
+    half_width = guard_cells + training_cells
+    local_mean = get_window_means(profile, half_width, guard_cells)
+    noise = get_window_means(report["std"], half_width, guard_cells) / np.sqrt(max(report["count"], 1))
+    threshold = local_mean + snr_threshold * noise
+
+    delay_bins = np.nonzero((profile > threshold) & (noise > 0) & get_local_peaks(profile, guard_cells))[0]
+
+    table = np.empty(len(delay_bins), dtype=DETECTION_DTYPE)
+    table["slow_time"] = np.nan
+    table["row"] = -1
+    table["delay_bin"] = delay_bins
+    table["delay"] = delay_bins / sample_rate
+    table["value"] = profile[delay_bins]
+    table["threshold"] = threshold[delay_bins]
+    table["snr"] = (profile[delay_bins] - local_mean[delay_bins]) / noise[delay_bins]
+    return table
+
+def detect_correlation(result, sample_rate, start_seconds=0.0, method="ca", **kwargs):
+    """
+    Runs the CFAR detector over the fast time vs. slow time map of a correlation, and over its
+    profile integrated across slow time.
+
+    Args:
+        result (dict): Result of comp.compute_correlation, comp.compute_chirp_correlation or comp.compute_auto_correlation.
+        sample_rate (float): Sampling rate of the correlation (samples per second).
+        start_seconds (float): Time of the first lag of the correlation, in seconds since the reference epoch.
+        method (str): "ca" or "os" (see get_cfar_noise).
+        **kwargs: Further arguments of detect_rows.
+
+    Returns:
+        tuple: The tables of detections in the rows and in the integrated profile.
+    """
+    kwargs.setdefault("oversampling", get_oversampling(result["correlation"]))
+    correlation = get_analytic_correlation(result["correlation"])
+    rows = np.abs(comp.compute_fast_slow_time(correlation, sample_rate, result["fast_time_duration"])["correlation_2d"])
+    integrator = comp.start_integrator(rows.shape[-1])
+    comp.add_to_integrator(integrator, rows)
+
+    # compute_fast_slow_time drops the first 100 lags
+    row_detections = detect_rows(rows, sample_rate, start_seconds=start_seconds, skip_samples=100, method=method, **kwargs)
+    profile_detections = detect_profile(comp.get_integration_report(integrator), sample_rate)
+    return row_detections, profile_detections
+
+def start_detector(sample_rate, fast_time_samples, start_seconds=0.0, log_path=None, method="ca", skip_samples=100, **kwargs):
+    """
+    Starts a detector that correlation blocks are added to by add_to_detector, so that a
+    section of any length can be searched. Detections are written to the CSV log as they are
+    found, and the rows are integrated so the profile can be searched at the end.
+
+    Args:
+        sample_rate (float): Sampling rate of the correlation (samples per second).
+        fast_time_samples (int): Number of samples in each row (one pulse period).
+        start_seconds (float): Time of the first lag of the correlation, in seconds since the reference epoch.
+        log_path (str): Path of the CSV file to log detections to. None does not log them.
+        method (str): "ca" or "os" (see get_cfar_noise).
+        skip_samples (int): Number of lags dropped from the start of the correlation.
+        **kwargs: Further arguments of detect_rows.
+
+    Returns:
+        dict: The detector.
+    """
+    detector = {
+        "sample_rate": sample_rate,
+        "fast_time_samples": fast_time_samples,
+        "start_seconds": start_seconds,
+        "method": method,
+        "options": kwargs,
+        "skip_samples": skip_samples,
+        "dropped_samples": skip_samples,
+        "remainder": np.zeros(0, dtype=prec.real_dtype()),
+        "rows_done": 0,
+        "detections": [],
+        "integrator": comp.start_integrator(fast_time_samples),
+        "log_file": None,
+        "log_writer": None,
+    }
+
+    if log_path is not None:
+        detector["log_file"] = open(log_path, "w", newline="")
+        detector["log_writer"] = csv.writer(detector["log_file"])
+        detector["log_writer"].writerow(DETECTION_DTYPE.names)
+
+    return detector
+
+def add_to_detector(detector, correlation):
+    """
+    Cuts the next lags of a correlation into rows of one pulse period, and runs the
+    CFAR detector over them. Lags of a real correlation must be of its analytic signal
+    (see comp.matched_filter_chunk).
+
+    Returns:
+        np.ndarray: Table of the detections in the new rows (DETECTION_DTYPE).
+    """
+    fast_time_samples = detector["fast_time_samples"]
+
+    skip = min(detector["skip_samples"], len(correlation))
+    detector["skip_samples"] -= skip
+    values = np.concatenate((detector["remainder"], correlation[skip:]))
+
+    num_rows = len(values) // fast_time_samples
+    rows = np.abs(values[:num_rows * fast_time_samples].reshape(num_rows, fast_time_samples))
+    detector["remainder"] = values[num_rows * fast_time_samples:]
+    comp.add_to_integrator(detector["integrator"], rows)
+
+    table = detect_rows(rows, detector["sample_rate"], detector["rows_done"], detector["start_seconds"],
+                        detector["dropped_samples"], detector["method"], **detector["options"])
+    detector["rows_done"] += num_rows
+
+    log_detections(detector, table)
+    return table
+
+def finish_detector(detector):
+    """
+    Searches the profile integrated over every row added to a detector, and closes its log.
+
+    Returns:
+        dict:
+            - "detections": Table of the detections in the rows (DETECTION_DTYPE).
+            - "profile_detections": Table of the detections in the integrated profile.
+            - "report": The integration report (see comp.get_integration_report).
+    """
+    report = comp.get_integration_report(detector["integrator"])
+    profile_detections = detect_profile(report, detector["sample_rate"])
+    log_detections(detector, profile_detections)
+    close_detector(detector)
+
+    detections = detector["detections"]
+    return {
+        "detections": np.concatenate(detections) if detections else np.empty(0, dtype=DETECTION_DTYPE),
+        "profile_detections": profile_detections,
+        "report": report,
+    }
+
+def close_detector(detector):
+    """
+    Closes the log of a detector, if it has one. Closing it again does nothing.
+    """
+    if detector["log_file"] is not None:
+        detector["log_file"].close()
+
+def log_detections(detector, table):
+    """
+    Keeps the detections of a table and writes them to the detector's log, if it has one.
+    """
+    if len(table) == 0:
+        return
+
+    if table["row"][0] >= 0:
+        detector["detections"].append(table)
+    if detector["log_writer"] is not None:
+        detector["log_writer"].writerows(table.tolist())
+        detector["log_file"].flush()
+
+def detect_chirp_streaming(file_path, bandwidth, pulse_width, phase_offset, start_time=None, end_time=None, log_path=None,
+                           fast_time_duration=25e-6, method="ca", **kwargs):
+    """
+    Match filters a section of a vdif file with a chirp block by block (overlap-save), and runs
+    the CFAR detector over the envelope of each pulse period as it is correlated. Nothing is
+    plotted, so long sections can be searched unattended.
+
+    Args:
+        file_path (str or VdifFile): Path to vdif file, or an open session on it.
+        bandwidth, pulse_width, phase_offset (float): Parameters of the transmitted chirp.
+        start_time, end_time (float): The section in seconds since the reference epoch. The user is asked for it if None.
+        log_path (str): Path of the CSV file to log detections to. None does not log them.
+        fast_time_duration (float): Pulse period in seconds, the length of each fast time row.
+        method (str): "ca" or "os" (see get_cfar_noise).
+        **kwargs: Further arguments of detect_rows.
+
+    Returns:
+        dict: The result of finish_detector. The report is None if the section held no data.
+    """
+    correlation = {"detector": None, "remainder": None}
+
+    def correlate_chunk(file_info, starting_header, data, start_seconds, end_seconds):
+        sample_rate = file_info["sample_rate"]
+        if correlation["detector"] is None:
+            template = comp.generate_chirp(sample_rate, bandwidth, pulse_width, phase_offset)
+            fft_length = comp.get_overlap_save_length(len(template))
+            first_sample_seconds = fr.generate_time_data(data["time_axis"], 0, 1)[0]
+
+            correlation.update({"template_length": len(template),
+                                "fft_length": fft_length,
+                                "template_spectrum": comp.get_chirp_spectrum(sample_rate, bandwidth, pulse_width, phase_offset, fft_length, np.iscomplexobj(data["samples"])),
+                                "detector": start_detector(sample_rate, int(fast_time_duration * sample_rate), first_sample_seconds, log_path, method,
+                                                           **{"oversampling": get_oversampling(data["samples"]), **kwargs}),
+                                "remainder": np.zeros(0, dtype=data["samples"].dtype)})
+
+        correlate_values(np.concatenate((correlation["remainder"], data["samples"])))
+
+    def correlate_values(values, flush=False):
+        lags, correlation["remainder"] = comp.matched_filter_chunk(values,
+                                                                   correlation["template_spectrum"],
+                                                                   correlation["template_length"],
+                                                                   correlation["fft_length"],
+                                                                   flush,
+                                                                   analytic=True)
+        add_to_detector(correlation["detector"], lags)
+
+    try:
+        anal.process_data_chunks(file_path, correlate_chunk, start_time, end_time)
+        if correlation["remainder"] is None:
+            print("No data was found in the section.")
+            return {"detections": np.empty(0, dtype=DETECTION_DTYPE), "profile_detections": np.empty(0, dtype=DETECTION_DTYPE), "report": None}
+
+        # Correlate the lags at the end of the section
+        correlate_values(correlation["remainder"], flush=True)
+
+        return finish_detector(correlation["detector"])
+    finally:
+        if correlation["detector"] is not None:
+            close_detector(correlation["detector"])
+
+def print_detections(table, max_rows=20):
+    """
+    Prints the strongest detections of a table, highest SNR first.
+    """
+    order = np.argsort(table["snr"])[::-1][:max_rows]
+
+    print(f"{'Slow Time (s)':>18} | {'Row':>8} | {'Delay (µs)':>11} | {'Value':>12} | {'Threshold':>12} | {'SNR':>10}")
+    print("-" * 86)
+    for i in order:
+        print(f"{table['slow_time'][i]:>18.6f} | {table['row'][i]:>8} | {table['delay'][i] * 1e6:>11.3f} | "
+              f"{table['value'][i]:>12.4g} | {table['threshold'][i]:>12.4g} | {table['snr'][i]:>10.2f}")
+    print(f"{len(table)} detections")
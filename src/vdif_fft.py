@@ -0,0 +1,137 @@
+"""
+-------------------------------------------------
+File: vdif_fft.py
+Description: The FFTs used by the spectral and correlation commands. Real
+             samples use real-input transforms, which need half the work and
+             memory of complex ones. scipy.fft is used when it is installed,
+             running each transform on several threads and keeping the plans
+             of recent lengths between calls; otherwise numpy.fft is used.
+             Values are transformed at the precision set in vdif_precision.
+License: see LICENCE.txt
+Dependencies:
+    - numpy
+    - scipy (optional)
+-------------------------------------------------
+"""
+
+import os
+import numpy as np
+import src.vdif_precision as prec
+
+try:
+    import scipy.fft as scipy_fft
+except ImportError:
+    scipy_fft = None
+
+# Number of threads each scipy.fft transform runs on
+FFT_WORKERS = os.cpu_count() or 1
+
+def set_fft_workers(workers):
+    """
+    Sets the number of threads each transform runs on when scipy.fft is available.
+    """
+    global FFT_WORKERS
+    FFT_WORKERS = max(1, int(workers))
+
+def next_fast_length(length):
+    """
+    Returns the smallest length of at least length whose FFT is fast, having no prime
+    factors other than 2, 3 and 5.
+    """
+    if scipy_fft is not None:
+        return scipy_fft.next_fast_len(int(length), real=True)
+
+    fast_length = max(1, int(length))
+    while True:
+        remaining = fast_length
+        for factor in (2, 3, 5):
+            while remaining % factor == 0:
+                remaining //= factor
+        if remaining == 1:
+            return fast_length
+        fast_length += 1
+
+def rfft(values, n=None, axis=-1):
+    """
+    Computes the FFT of real values, returning only the n // 2 + 1 non-negative frequencies.
+    Args:
+        values (np.ndarray): Real values.
+        n (int): Length of the transform. The values are zero-padded or cut to it. Defaults to their length.
+        axis (int): Axis to transform along.
+    """
+    values = prec.as_working_dtype(values)
+    if scipy_fft is not None:
+        return scipy_fft.rfft(values, n, axis=axis, workers=FFT_WORKERS)
+    return prec.as_working_dtype(np.fft.rfft(values, n, axis=axis))
+
+def irfft(spectrum, n, axis=-1):
+    """
+    Inverts rfft, giving n real values.
+    """
+    if scipy_fft is not None:
+        return scipy_fft.irfft(spectrum, n, axis=axis, workers=FFT_WORKERS)
+    return prec.as_working_dtype(np.fft.irfft(spectrum, n, axis=axis))
+
+def fft(values, n=None, axis=-1):
+    """
+    Computes the FFT of complex values, such as complex VDIF samples.
+    """
+    values = prec.as_working_dtype(values)
+    if scipy_fft is not None:
+        return scipy_fft.fft(values, n, axis=axis, workers=FFT_WORKERS)
+    return prec.as_working_dtype(np.fft.fft(values, n, axis=axis))
+
+def ifft(spectrum, n=None, axis=-1):
+    """
+    Inverts fft.
+    """
+    if scipy_fft is not None:
+        return scipy_fft.ifft(spectrum, n, axis=axis, workers=FFT_WORKERS)
+    return prec.as_working_dtype(np.fft.ifft(spectrum, n, axis=axis))
+
+def spectrum(values, n=None, full=None):
+    """
+    Computes the FFT of real or complex samples, using rfft for real ones.
+    Args:
+        values (np.ndarray): Real or complex samples.
+        n (int): Length of the transform. Defaults to the length of the values.
+        full (bool): Whether to return every frequency, as needed to multiply with the spectrum
+            of complex samples. Defaults to True for complex values and False for real ones.
+    Returns:
+        np.ndarray: The n // 2 + 1 non-negative frequencies, or all n if full.
+    """
+    if full is None:
+        full = np.iscomplexobj(values)
+    return fft(values, n) if full else rfft(values, n)
+
+def inverse_spectrum(spectrum, n, full):
+    """
+    Inverts spectrum, returning the real part of the n values.
+    """
+    return ifft(spectrum, n).real if full else irfft(spectrum, n)
+
+def spectrum_frequencies(n, sample_rate, full=False):
+    """
+    Returns the frequency of each bin of a spectrum of length n.
+    """
+    return np.fft.fftfreq(n, d=1/sample_rate) if full else np.fft.rfftfreq(n, d=1/sample_rate)
+
+def analytic_inverse(spectrum, n, axis=-1):
+    """
+    Inverts the rfft of real values into their analytic signal: complex values whose real
+    part is the real values and whose spectrum has no negative frequencies.
+    Args:
+        spectrum (np.ndarray): The n // 2 + 1 bins of an rfft.
+        n (int): Length of the transform.
+        axis (int): Axis of the bins.
+    Returns:
+        np.ndarray: The n complex values of the analytic signal.
+    """
+    spectrum = np.moveaxis(spectrum, axis, -1)
+    full_spectrum = np.zeros(spectrum.shape[:-1] + (n,), dtype=np.result_type(spectrum.dtype, np.complex64))
+
+    # Double the positive frequencies, keeping the DC and Nyquist bins as they are
+    full_spectrum[..., :n // 2 + 1] = spectrum
+    full_spectrum[..., 1:(n + 1) // 2] *= 2
+
+    return np.moveaxis(ifft(full_spectrum, n), -1, axis)
@@ -0,0 +1,231 @@
+"""
+-------------------------------------------------
+File: vdif_file.py
+Description: A session on one VDIF file. The file is opened and memory-mapped
+             once, and its properties, header table and frame index are
+             computed on first use and kept, so that repeated commands on a
+             large file do not repeat the setup I/O.
+License: see LICENCE.txt
+Dependencies:
+    - numpy
+    - tqdm
+-------------------------------------------------
+"""
+
+import os
+import mmap
+import time
+import contextlib
+import src.vdif_properties as props
+import src.vdif_data_frame_reader as fr
+import src.vdif_index as idx
+import src.vdif_is_simple as simp
+
+class VdifFile:
+    """
+    An open VDIF file. Use it as a context manager, or call close() when done.
+
+    Args:
+        file_path (str): Path to the VDIF file.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file = open(file_path, 'rb')
+        self.mmapped_file = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._properties = None
+        self._header_table = None
+        self._index = None
+
+    @property
+    def properties(self):
+        """dict: The file properties (see props.read_vdif_file_properties)."""
+        if self._properties is None:
+            self._properties = props.read_vdif_file_properties(self.file_path, self.mmapped_file)
+        return self._properties
+
+    @property
+    def header_table(self):
+        """numpy.ndarray: The headers of every frame (see fr.read_vdif_header_table)."""
+        if self._header_table is None:
+            self._header_table = fr.read_vdif_header_table(self.mmapped_file)
+        return self._header_table
+
+    @property
+    def index(self):
+        """dict: The frame index, loaded from or saved to its sidecar (see idx.get_vdif_index)."""
+        if self._index is None:
+            self._index = idx.get_vdif_index(self.file_path, self.mmapped_file)
+        return self._index
+
+    def print_properties(self):
+        """
+        Prints the file properties and returns them.
+        """
+        props.print_file_properties(self.properties)
+        return self.properties
+
+    def print_index(self):
+        """
+        Prints a summary of the frame index of each thread.
+        """
+        idx.print_vdif_index_summary(self.index)
+
+    def read(self, start_seconds_from_epoch, end_seconds_from_epoch, workers=1, thread_id=None, channel=0):
+        """
+        Reads the data of one thread between the specified time range.
+
+        Args:
+            start_seconds_from_epoch (float): Start of the range.
+            end_seconds_from_epoch (float): End of the range.
+            workers (int): Number of processes to extract the data with.
+            thread_id (int): Thread to read. Defaults to the lowest thread ID.
+            channel (int): Channel of multi-channel data to keep. None keeps every channel.
+
+        Returns:
+            tuple: The header of the first frame and the data (see fr.build_vdif_data).
+        """
+        starting_header, data = idx.generate_data_from_time_range(self.properties,
+                                                                  self.mmapped_file,
+                                                                  self.index,
+                                                                  start_seconds_from_epoch,
+                                                                  end_seconds_from_epoch,
+                                                                  workers,
+                                                                  thread_id)
+        if channel is not None:
+            data = fr.select_channel(data, channel)
+        return starting_header, data
+
+    def iterate_chunks(self, start_seconds_from_epoch, end_seconds_from_epoch, frames_per_chunk=1000, overlap_frames=0, thread_id=None, channel=0):
+        """
+        Yields the data of one thread between the specified time range in chunks
+        (see idx.iterate_data_chunks).
+
+        Yields:
+            tuple: The header of the first frame of the chunk and the chunk's data.
+        """
+        chunks = idx.iterate_data_chunks(self.properties,
+                                         self.mmapped_file,
+                                         self.index,
+                                         start_seconds_from_epoch,
+                                         end_seconds_from_epoch,
+                                         frames_per_chunk,
+                                         overlap_frames,
+                                         thread_id)
+        for starting_header, data in chunks:
+            if channel is not None:
+                data = fr.select_channel(data, channel)
+            yield starting_header, data
+
+    def read_frame(self, offset=0, channel=0):
+        """
+        Reads the header and data of the frame at a byte offset.
+
+        Returns:
+            tuple: The frame header and data (see fr.read_vdif_frame_data).
+        """
+        header_info, data = fr.read_vdif_frame_data(self.mmapped_file, offset, self.properties)
+        if channel is not None:
+            data = fr.select_channel(data, channel)
+        return header_info, data
+
+    def check_simplicity(self, workers=1):
+        """
+        Checks whether the file is simple, contiguous and ordered (see simp.check_simplicity).
+        """
+        simp.check_simplicity(self.file_path, self.mmapped_file, workers)
+
+    def refresh(self, max_frames=None):
+        """
+        Picks up frames appended to a file that is still being recorded. If the file has
+        grown it is mapped again, and the index is extended with the new complete frames
+        only (see idx.update_vdif_index). The sidecar is not rewritten.
+
+        Args:
+            max_frames (int): Largest number of new frames to take in one call.
+
+        Returns:
+            numpy.ndarray: Header table of the new frames, empty if there were none.
+        """
+        if os.fstat(self._file.fileno()).st_size > len(self.mmapped_file):
+            self._remap()
+
+        new_headers = idx.update_vdif_index(self.index, self.file_path, self.mmapped_file, max_frames)
+        if len(new_headers):
+            # The end time and frame counts have changed. The frames per second are taken
+            # from the first change of second, so the incomplete last second does not lower them
+            self._properties = None
+            self._header_table = None
+        return new_headers
+
+    def follow(self, poll_interval=1.0, idle_timeout=None, max_frames=100000):
+        """
+        Watches a file that is still being recorded, like tail -f. Each time new frames are
+        found they are indexed and their headers are yielded. Taking at most max_frames at
+        a time bounds the delay between data landing and it being handed on.
+
+        Args:
+            poll_interval (float): Seconds to wait between checks when there is nothing new.
+            idle_timeout (float): Stop after this many seconds without new frames. None follows forever.
+            max_frames (int): Largest number of new frames yielded at once.
+
+        Yields:
+            numpy.ndarray: Header table of each batch of new frames.
+        """
+        last_growth = time.monotonic()
+        while True:
+            new_headers = self.refresh(max_frames)
+            if len(new_headers):
+                last_growth = time.monotonic()
+                yield new_headers
+                continue
+
+            if idle_timeout is not None and time.monotonic() - last_growth > idle_timeout:
+                return
+            time.sleep(poll_interval)
+
+    def _remap(self):
+        old_mmapped_file = self.mmapped_file
+        self.mmapped_file = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            old_mmapped_file.close()
+        except BufferError:
+            # Arrays still view the old mapping, which is released with them
+            pass
+
+    def close(self):
+        """
+        Closes the memory map and the file.
+        """
+        if not self.mmapped_file.closed:
+            try:
+                self.mmapped_file.close()
+            except BufferError:
+                # Arrays still view the mapping, which is released with them
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        return f"VdifFile({self.file_path!r})"
+
+
+def open_vdif_file(vdif_file):
+    """
+    Gives a session for either a path or an existing session. A session opened here
+    is closed on leaving the with block, but an existing session is left open.
+
+    Args:
+        vdif_file (str or VdifFile): Path to the VDIF file, or an open session.
+
+    Returns:
+        A context manager that gives the VdifFile.
+    """
+    if isinstance(vdif_file, VdifFile):
+        return contextlib.nullcontext(vdif_file)
+    return VdifFile(vdif_file)
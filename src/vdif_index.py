@@ -0,0 +1,504 @@
+"""
+-------------------------------------------------
+File: vdif_index.py
+Description: Builds, stores and searches an index of where each frame of a
+             VDIF file is, so that time ranges can be found in files that
+             are not simple (dropped, repeated or reordered frames). Each
+             thread of a multi-thread file is indexed as its own stream.
+License: see LICENCE.txt
+Dependencies:
+    - numpy
+    - tqdm
+-------------------------------------------------
+"""
+
+import os
+import numpy as np
+from tqdm import tqdm
+import src.vdif_data_frame_reader as fr
+
+INDEX_VERSION = 2
+INDEX_EXTENSION = ".idx.npz"
+
+# Number of frame headers decoded at a time while scanning a file
+SCAN_BLOCK_FRAMES = 1 << 20
+
+def get_vdif_index(file_path, mmapped_file):
+    """
+    Loads the index of a VDIF file from its sidecar, or scans the file and saves a new
+    sidecar if there is none or the file has changed since it was written.
+    Args:
+        file_path (str): Path to the VDIF file.
+        mmapped_file (mmap.mmap): Memory-mapped file object of the same file.
+    Returns:
+        dict: The index of the file, as described in build_vdif_index.
+    """
+    index = load_vdif_index(file_path)
+
+    if index is None:
+        index = build_vdif_index(file_path, mmapped_file)
+        try:
+            save_vdif_index(index, file_path)
+        except OSError as e:
+            print(f"Could not save the index of {file_path}: {e}")
+
+    return index
+
+def build_vdif_index(file_path, mmapped_file):
+    """
+    Scans every frame header of a VDIF file once and builds an index of each thread in it.
+    Args:
+        file_path (str): Path to the VDIF file.
+        mmapped_file (mmap.mmap): Memory-mapped file object of the same file.
+    Returns:
+        dict: The index of the file, holding the size and modification time of the file it was
+              built from, and "threads", the index of each thread keyed by thread ID (see
+              build_index_from_headers).
+    """
+    file_stat = os.stat(file_path)
+    frame_length = fr.read_vdif_frame_header(mmapped_file, 0)["frame_length"]
+    total_frames = len(mmapped_file) // frame_length
+
+    seconds = []
+    frame_numbers = []
+    invalid = []
+    thread_ids = []
+
+    with tqdm(total=total_frames, desc="Indexing VDIF", unit="frame") as pbar:
+        for start_frame in range(0, total_frames, SCAN_BLOCK_FRAMES):
+            header_table = fr.read_vdif_header_table(mmapped_file, frame_length, start_frame, SCAN_BLOCK_FRAMES)
+            seconds.append(header_table["seconds_from_epoch"])
+            frame_numbers.append(header_table["frame_number"])
+            invalid.append(header_table["invalid_data"])
+            thread_ids.append(header_table["thread_id"])
+            pbar.update(len(header_table))
+
+    seconds = np.concatenate(seconds)
+    frame_numbers = np.concatenate(frame_numbers)
+    invalid = np.concatenate(invalid)
+    thread_ids = np.concatenate(thread_ids)
+    offsets = np.arange(total_frames, dtype=np.int64) * frame_length
+
+    # Index the frames of each thread separately
+    threads = {}
+    for thread_id in np.unique(thread_ids):
+        in_thread = thread_ids == thread_id
+        threads[int(thread_id)] = build_index_from_headers(seconds[in_thread], frame_numbers[in_thread], offsets[in_thread],
+                                                           invalid[in_thread], frame_length)
+
+    return {
+        "version": INDEX_VERSION,
+        "file_size": len(mmapped_file),
+        "file_mtime_ns": file_stat.st_mtime_ns,
+        "frame_length": frame_length,
+        "threads": threads,
+    }
+
+def get_thread_index(index, thread_id=None):
+    """
+    Returns the index of one thread of a file.
+    Args:
+        index (dict): The index of the file.
+        thread_id (int): ID of the thread. Defaults to the lowest thread ID in the file.
+    Returns:
+        dict: The index of the thread, as described in build_index_from_headers.
+    """
+    threads = index["threads"]
+
+    if thread_id is None:
+        thread_id = min(threads)
+    elif thread_id not in threads:
+        raise ValueError(f"Thread {thread_id} is not in the file. Threads found: {sorted(threads)}")
+
+    return threads[thread_id]
+
+def build_index_from_headers(seconds, frame_numbers, offsets, invalid, frame_length, frames_per_second=None):
+    """
+    Builds an index from the headers of every frame of one thread of a file.
+
+    Seconds whose frames are in order, have consecutive frame numbers, and are evenly spaced
+    in the file are "regular", and only their first frame is stored. The frames of every other
+    second are stored individually, sorted by time.
+
+    Args:
+        seconds (np.ndarray): Seconds from epoch of each frame, in file order.
+        frame_numbers (np.ndarray): Frame number within the second of each frame.
+        offsets (np.ndarray): Byte offset of each frame.
+        invalid (np.ndarray): Invalid data flag of each frame.
+        frame_length (int): Length of each frame in bytes.
+        frames_per_second (int): Number of frames per second. Found from the largest frame number if None.
+    Returns:
+        dict: The index, holding
+            - frames_per_second, frame_length, num_frames
+            - seconds, first_frame_numbers, first_frame_offsets, frame_counts, frame_strides
+              and regular, one entry per second in the file
+            - irregular_keys and irregular_offsets, the frames of seconds that are not regular
+            - gaps, rows of [first missing time key, number of missing frames]
+            - invalid_runs, rows of [byte offset of the first frame, number of consecutive invalid frames]
+    """
+    if len(seconds) == 0:
+        raise ValueError("The file does not contain any complete frames.")
+
+    if frames_per_second is None:
+        frames_per_second = int(np.max(frame_numbers)) + 1
+    keys = seconds.astype(np.int64) * frames_per_second + frame_numbers
+
+    # Sort the frames by time, keeping file order for repeated times
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    sorted_offsets = offsets[order]
+    sorted_seconds = sorted_keys // frames_per_second
+
+    # Group the sorted frames by second
+    second_starts = np.flatnonzero(np.r_[True, sorted_seconds[1:] != sorted_seconds[:-1]])
+    frame_counts = np.diff(np.r_[second_starts, len(sorted_keys)])
+    second_of_frame = np.repeat(np.arange(len(second_starts)), frame_counts)
+
+    # Spacing between the first two frames of each second
+    next_frames = np.minimum(second_starts + 1, len(sorted_keys) - 1)
+    frame_strides = np.where(frame_counts > 1, sorted_offsets[next_frames] - sorted_offsets[second_starts], frame_length)
+
+    # A second is regular if each of its frames follows the last by one frame number and one stride
+    same_second = second_of_frame[1:] == second_of_frame[:-1]
+    breaks_pattern = (np.diff(sorted_keys) != 1) | (np.diff(sorted_offsets) != frame_strides[second_of_frame[1:]])
+    irregular_seconds = np.bincount(second_of_frame[1:][same_second & breaks_pattern], minlength=len(second_starts)) > 0
+    regular = ~irregular_seconds & (frame_strides > 0)
+    irregular_frames = ~regular[second_of_frame]
+
+    # Runs of missing time keys between the first and last frame
+    key_steps = np.diff(sorted_keys)
+    gap_positions = np.flatnonzero(key_steps > 1)
+    gaps = np.column_stack((sorted_keys[gap_positions] + 1, key_steps[gap_positions] - 1))
+
+    # Runs of frames flagged as invalid, in file order
+    invalid_edges = np.diff(np.r_[0, invalid.astype(np.int8), 0])
+    run_starts = np.flatnonzero(invalid_edges == 1)
+    run_ends = np.flatnonzero(invalid_edges == -1)
+    invalid_runs = np.column_stack((offsets[run_starts], run_ends - run_starts))
+
+    return {
+        "frames_per_second": frames_per_second,
+        "frame_length": frame_length,
+        "num_frames": len(keys),
+        "seconds": sorted_seconds[second_starts],
+        "first_frame_numbers": sorted_keys[second_starts] % frames_per_second,
+        "first_frame_offsets": sorted_offsets[second_starts],
+        "frame_counts": frame_counts,
+        "frame_strides": frame_strides,
+        "regular": regular,
+        "irregular_keys": sorted_keys[irregular_frames],
+        "irregular_offsets": sorted_offsets[irregular_frames],
+        "gaps": gaps.astype(np.int64).reshape(-1, 2),
+        "invalid_runs": invalid_runs.astype(np.int64).reshape(-1, 2),
+    }
+
+def update_vdif_index(index, file_path, mmapped_file, max_frames=None):
+    """
+    Extends the index of a file that has grown, such as one that is still being recorded,
+    by scanning only the complete frames appended since the index was built or last updated.
+    Args:
+        index (dict): The index of the file, updated in place.
+        file_path (str): Path to the VDIF file.
+        mmapped_file (mmap.mmap): Memory-mapped file object of the grown file.
+        max_frames (int): Largest number of frames to add. Defaults to every appended frame.
+    Returns:
+        np.ndarray: The header table of the frames added to the index, empty if there were none.
+    """
+    frame_length = index["frame_length"]
+    first_frame = index["file_size"] // frame_length
+    header_table = fr.read_vdif_header_table(mmapped_file, frame_length, first_frame, max_frames)
+    if len(header_table) == 0:
+        return header_table
+
+    for thread_id in np.unique(header_table["thread_id"]):
+        headers = header_table[header_table["thread_id"] == thread_id]
+        thread_id = int(thread_id)
+        if thread_id in index["threads"]:
+            index["threads"][thread_id] = extend_thread_index(index["threads"][thread_id], headers, mmapped_file)
+        else:
+            index["threads"][thread_id] = build_index_from_headers(headers["seconds_from_epoch"], headers["frame_number"],
+                                                                   headers["offset"], headers["invalid_data"], frame_length)
+
+    index["file_size"] = (first_frame + len(header_table)) * frame_length
+    index["file_mtime_ns"] = os.stat(file_path).st_mtime_ns
+
+    return header_table
+
+def extend_thread_index(thread_index, headers, mmapped_file):
+    """
+    Adds frames appended to a file to the index of one of its threads.
+
+    Appended frames may belong to the last indexed second, or even to earlier ones if they
+    arrive out of order, so every indexed second from the earliest one they touch onwards is
+    indexed again together with them. If the appended frames show that there are more frames
+    per second than were seen before, every time key changes and the whole thread is indexed
+    again. The frames are rebuilt from the index itself, so the file is never read again.
+    Args:
+        thread_index (dict): The index of the thread, as described in build_index_from_headers.
+        headers (np.ndarray): Header table of the appended frames of the thread, in file order.
+        mmapped_file (mmap.mmap): Memory-mapped file object of the grown file.
+    Returns:
+        dict: The index of the thread including the appended frames.
+    """
+    frame_length = thread_index["frame_length"]
+    old_frames_per_second = thread_index["frames_per_second"]
+    frames_per_second = max(old_frames_per_second, int(np.max(headers["frame_number"])) + 1)
+
+    if frames_per_second == old_frames_per_second:
+        first_second = min(int(thread_index["seconds"][-1]), int(np.min(headers["seconds_from_epoch"])))
+    else:
+        first_second = min(int(thread_index["seconds"][0]), int(np.min(headers["seconds_from_epoch"])))
+    first_key = first_second * old_frames_per_second
+
+    # Index the frames of the seconds being redone together with the appended frames
+    old_keys, old_offsets = get_indexed_frames(thread_index, first_second)
+    seconds = np.concatenate((old_keys // old_frames_per_second, headers["seconds_from_epoch"]))
+    frame_numbers = np.concatenate((old_keys % old_frames_per_second, headers["frame_number"]))
+    offsets = np.concatenate((old_offsets, headers["offset"]))
+    invalid = np.concatenate((np.zeros(len(old_keys), dtype=headers["invalid_data"].dtype), headers["invalid_data"]))
+    tail = build_index_from_headers(seconds, frame_numbers, offsets, invalid, frame_length, frames_per_second)
+
+    # Keep the seconds before the redone ones as they are
+    earlier = thread_index["seconds"] < first_second
+    earlier_irregular = thread_index["irregular_keys"] < first_key
+    extended = {
+        "frames_per_second": frames_per_second,
+        "frame_length": frame_length,
+        "num_frames": thread_index["num_frames"] + len(headers),
+        "irregular_keys": np.concatenate((thread_index["irregular_keys"][earlier_irregular], tail["irregular_keys"])),
+        "irregular_offsets": np.concatenate((thread_index["irregular_offsets"][earlier_irregular], tail["irregular_offsets"])),
+    }
+    for key in ("seconds", "first_frame_numbers", "first_frame_offsets", "frame_counts", "frame_strides", "regular"):
+        extended[key] = np.concatenate((thread_index[key][earlier], tail[key]))
+
+    # Gaps before the last kept frame are unchanged, and the gap after it is found again
+    last_kept_keys = list(thread_index["irregular_keys"][earlier_irregular][-1:])
+    earlier_regular = np.flatnonzero(earlier & thread_index["regular"])
+    if len(earlier_regular):
+        last = earlier_regular[-1]
+        last_kept_keys.append(thread_index["seconds"][last] * old_frames_per_second
+                              + thread_index["first_frame_numbers"][last] + thread_index["frame_counts"][last] - 1)
+
+    gaps = [tail["gaps"]]
+    if last_kept_keys:
+        last_kept_key = int(max(last_kept_keys))
+        first_tail_key = int(tail["seconds"][0]) * frames_per_second + int(tail["first_frame_numbers"][0])
+        boundary_gap = np.array([[last_kept_key + 1, first_tail_key - last_kept_key - 1]], dtype=np.int64)
+        gaps = [thread_index["gaps"][thread_index["gaps"][:, 0] <= last_kept_key], boundary_gap[boundary_gap[:, 1] > 0]] + gaps
+    extended["gaps"] = np.concatenate(gaps)
+
+    # Join a run of invalid frames that carries on into the appended frames
+    invalid_runs = tail["invalid_runs"]
+    old_runs = thread_index["invalid_runs"]
+    if len(old_runs) and len(invalid_runs) and invalid_runs[0, 0] == headers["offset"][0]:
+        if fr.read_vdif_frame_header(mmapped_file, get_last_frame_offset(thread_index))["invalid_data"]:
+            old_runs = old_runs.copy()
+            old_runs[-1, 1] += invalid_runs[0, 1]
+            invalid_runs = invalid_runs[1:]
+    extended["invalid_runs"] = np.concatenate((old_runs, invalid_runs))
+
+    return extended
+
+def get_indexed_frames(thread_index, first_second):
+    """
+    Rebuilds the time key and byte offset of every indexed frame of a thread from a second onwards.
+    Returns:
+        tuple:
+            - np.ndarray: Time key of each frame, sorted, with repeated keys in file order.
+            - np.ndarray: Byte offset of each frame.
+    """
+    frames_per_second = thread_index["frames_per_second"]
+
+    # Frames of regular seconds follow on from the first frame of their second
+    later = (thread_index["seconds"] >= first_second) & thread_index["regular"]
+    frame_counts = thread_index["frame_counts"][later]
+    frames_into_second = np.arange(np.sum(frame_counts)) - np.repeat(np.cumsum(frame_counts) - frame_counts, frame_counts)
+    first_keys = thread_index["seconds"][later] * frames_per_second + thread_index["first_frame_numbers"][later]
+    keys = np.repeat(first_keys, frame_counts) + frames_into_second
+    offsets = (np.repeat(thread_index["first_frame_offsets"][later], frame_counts)
+               + frames_into_second * np.repeat(thread_index["frame_strides"][later], frame_counts))
+
+    # Frames of irregular seconds are stored individually
+    irregular = thread_index["irregular_keys"] >= first_second * frames_per_second
+    keys = np.concatenate((keys, thread_index["irregular_keys"][irregular])).astype(np.int64)
+    offsets = np.concatenate((offsets, thread_index["irregular_offsets"][irregular])).astype(np.int64)
+
+    order = np.argsort(keys, kind="stable")
+    return keys[order], offsets[order]
+
+def get_last_frame_offset(thread_index):
+    """
+    Returns the byte offset of the last indexed frame of a thread in file order.
+    """
+    regular = thread_index["regular"]
+    last_offsets = (thread_index["first_frame_offsets"][regular]
+                    + (thread_index["frame_counts"][regular] - 1) * thread_index["frame_strides"][regular])
+    return int(np.max(np.concatenate((last_offsets, thread_index["irregular_offsets"]))))
+
+def get_sidecar_path(file_path):
+    return file_path + INDEX_EXTENSION
+
+def save_vdif_index(index, file_path):
+    """
+    Saves an index next to its VDIF file. The entries of each thread are stored
+    under "thread_<id>/<entry>".
+    """
+    entries = {key: value for key, value in index.items() if key != "threads"}
+    for thread_id, thread_index in index["threads"].items():
+        for key, value in thread_index.items():
+            entries[f"thread_{thread_id}/{key}"] = value
+
+    np.savez(get_sidecar_path(file_path), **entries)
+
+def load_vdif_index(file_path):
+    """
+    Loads the index sidecar of a VDIF file.
+    Returns:
+        dict: The index, or None if there is no sidecar or it no longer matches the file.
+    """
+    sidecar_path = get_sidecar_path(file_path)
+    if not os.path.exists(sidecar_path):
+        return None
+
+    try:
+        with np.load(sidecar_path, allow_pickle=False) as sidecar:
+            entries = {key: sidecar[key] for key in sidecar.files}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable index {sidecar_path}: {e}")
+        return None
+
+    index = {"threads": {}}
+    for key, value in entries.items():
+        # Unwrap the scalar entries
+        if value.ndim == 0:
+            value = value.item()
+
+        if key.startswith("thread_"):
+            thread_key, entry = key.split("/", 1)
+            index["threads"].setdefault(int(thread_key[len("thread_"):]), {})[entry] = value
+        else:
+            index[key] = value
+
+    file_stat = os.stat(file_path)
+    if (index.get("version") != INDEX_VERSION
+            or index.get("file_size") != file_stat.st_size
+            or index.get("file_mtime_ns") != file_stat.st_mtime_ns):
+        return None
+
+    return index
+
+def lookup_frame_offsets(index, keys):
+    """
+    Finds the byte offset of the frame at each time key by binary searching the index.
+    Args:
+        index (dict): The index of one thread of the file, from get_thread_index.
+        keys (np.ndarray): Time keys (frames since the reference epoch) to look up.
+    Returns:
+        np.ndarray: The byte offset of each frame, or -1 where the frame is missing.
+    """
+    frames_per_second = index["frames_per_second"]
+    offsets = np.full(len(keys), -1, dtype=np.int64)
+
+    # Frames of regular seconds are found from the first frame of their second
+    seconds = keys // frames_per_second
+    positions = np.minimum(np.searchsorted(index["seconds"], seconds), len(index["seconds"]) - 1)
+    frames_into_second = keys % frames_per_second - index["first_frame_numbers"][positions]
+
+    found = ((index["seconds"][positions] == seconds)
+             & index["regular"][positions]
+             & (frames_into_second >= 0)
+             & (frames_into_second < index["frame_counts"][positions]))
+    offsets[found] = (index["first_frame_offsets"][positions[found]]
+                      + frames_into_second[found] * index["frame_strides"][positions[found]])
+
+    # Frames of irregular seconds are stored individually
+    irregular_keys = index["irregular_keys"]
+    if len(irregular_keys):
+        positions = np.minimum(np.searchsorted(irregular_keys, keys), len(irregular_keys) - 1)
+        found = ~found & (irregular_keys[positions] == keys)
+        offsets[found] = index["irregular_offsets"][positions[found]]
+
+    return offsets
+
+def get_frame_offsets(index, start_seconds_from_epoch, end_seconds_from_epoch):
+    """
+    Finds the frames of one thread, given its index, that lie within the specified time range.
+    Returns:
+        tuple:
+            - int: Time key of the first frame in the range.
+            - np.ndarray: Byte offset of the frame at each time in the range, or -1 where it is missing.
+    """
+    frames_per_second = index["frames_per_second"]
+    first_key = int(frames_per_second * start_seconds_from_epoch)
+    end_key = max(first_key, int(frames_per_second * end_seconds_from_epoch))
+
+    keys = np.arange(first_key, end_key, dtype=np.int64)
+    return first_key, lookup_frame_offsets(index, keys)
+
+def generate_data_from_time_range(file_info, mmapped_file, index, start_seconds_from_epoch, end_seconds_from_epoch, workers=1, thread_id=None):
+    """
+    Generates the data of one thread between the specified time range, locating its
+    frames with the index. See fr.generate_data_from_time_range.
+    """
+    thread_index = get_thread_index(index, thread_id)
+    first_key, frame_offsets = get_frame_offsets(thread_index, start_seconds_from_epoch, end_seconds_from_epoch)
+
+    return fr.generate_data_from_frame_offsets(file_info, mmapped_file, first_key, frame_offsets, thread_index["frames_per_second"], workers)
+
+def iterate_data_chunks(file_info,
+                        mmapped_file,
+                        index,
+                        start_seconds_from_epoch,
+                        end_seconds_from_epoch,
+                        frames_per_chunk=1000,
+                        overlap_frames=0,
+                        thread_id=None):
+    """
+    Yields the data of one thread between the specified time range in chunks, locating
+    its frames with the index. See fr.iterate_data_chunks.
+
+    Chunks that fall entirely within a gap are yielded as zeros, with every frame counted in
+    the missing_frames of their time axis, so that the samples of consecutive chunks stay
+    consecutive in time for consumers that count samples. Nothing is yielded if the range
+    holds no frames at all.
+    """
+    if not 0 <= overlap_frames < frames_per_chunk:
+        raise ValueError("overlap_frames must be at least 0 and less than frames_per_chunk.")
+
+    thread_index = get_thread_index(index, thread_id)
+    first_key, frame_offsets = get_frame_offsets(thread_index, start_seconds_from_epoch, end_seconds_from_epoch)
+    total_frames = len(frame_offsets)
+    step = frames_per_chunk - overlap_frames
+
+    present_offsets = frame_offsets[frame_offsets >= 0]
+    if len(present_offsets) == 0:
+        return
+
+    chunk_start = 0
+    while chunk_start < total_frames:
+        chunk_offsets = frame_offsets[chunk_start:chunk_start + frames_per_chunk]
+
+        # Chunks within a gap are described by the first frame of the range
+        yield fr.generate_data_from_frame_offsets(file_info, mmapped_file, first_key + chunk_start, chunk_offsets, thread_index["frames_per_second"],
+                                                  reference_offset=present_offsets[0])
+
+        if chunk_start + len(chunk_offsets) >= total_frames:
+            break
+        chunk_start += step
+
+def print_vdif_index_summary(index):
+    """
+    Prints the gaps and invalid frames found in each thread while indexing a file.
+    """
+    print(f"Threads: {sorted(index['threads'])}")
+
+    for thread_id, thread_index in sorted(index["threads"].items()):
+        frames_per_second = thread_index["frames_per_second"]
+
+        print(f"\nThread {thread_id}")
+        print(f"Indexed Frames: {thread_index['num_frames']}")
+        print(f"Indexed Seconds: {len(thread_index['seconds'])} ({np.count_nonzero(~thread_index['regular'])} irregular)")
+        print(f"Missing Frames: {int(np.sum(thread_index['gaps'][:, 1]))} in {len(thread_index['gaps'])} gaps")
+        for first_key, count in thread_index["gaps"][:10]:
+            print(f"  Gap of {count} frames from second {first_key // frames_per_second}, frame {first_key % frames_per_second}")
+        print(f"Invalid Frames: {int(np.sum(thread_index['invalid_runs'][:, 1]))} in {len(thread_index['invalid_runs'])} runs")
@@ -1,89 +1,200 @@
-import os
 import mmap
+import contextlib
+import functools
+import multiprocessing
+import numpy as np
 from tqdm import tqdm
-from collections import defaultdict
 import src.vdif_datetime as dt
 import src.vdif_data_frame_reader as fr
 
-def check_simplicity(file_path):
+# Number of frame headers decoded at a time
+SCAN_BLOCK_FRAMES = 1 << 20
+
+def check_simplicity(file_path, mmapped_file=None, workers=1):
     """
     Processes a VDIF file to extract properties and determine if it is "simple,"
     "contiguous," and "ordered."
-    
+
     A "simple" VDIF file has the same number of frames associated with each second.
     A "contiguous" VDIF file has each elapsed second incrementing by one.
     An "ordered" VDIF file has time stamps in ascending order.
-    
+    Each thread of a multi-thread file is checked as its own stream.
+
     Args:
         file_path (str): Path to the VDIF file.
+        mmapped_file (mmap.mmap): The file, if it is already memory-mapped.
+        workers (int): Number of processes to split the file between.
     """
     try:
-        file_size = os.path.getsize(file_path)  # Get the total file size for progress tracking
-
-        with open(file_path, 'rb') as file:
-            # Memory-map the file for efficient access
-            mmapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
-
-            total_frames = 0
-            total_samples = 0
-            reference_epoch = None
-            start_seconds_from_epoch = None
-            end_seconds_from_epoch = None
-            frames_per_second = defaultdict(int)  # Count frames per second
-
-            previous_second = None
-            is_contiguous = True
-            is_ordered = True
-
-            with tqdm(total=file_size, unit='B', unit_scale=True, desc="Processing VDIF") as pbar:
-                offset = 0
-
-                while offset < file_size:
-                    # Read the header of the current frame from the memory-mapped file
-                    header_info = fr.read_vdif_frame_header(mmapped_file, offset)
-
-                    if reference_epoch is None:
-                        # Set reference epoch and starting time
-                        reference_epoch = header_info['reference_epoch']
-                        start_seconds_from_epoch = header_info['seconds_from_epoch']
-
-                    # Update the ending time as the file is read
-                    current_second = header_info['seconds_from_epoch']
-                    if previous_second is not None:
-                        # Check if seconds are contiguous
-                        if current_second != previous_second + 1 and current_second != previous_second:
-                            is_contiguous = False
-                        # Check if seconds are ordered
-                        if current_second < previous_second:
-                            is_ordered = False
-
-                    previous_second = current_second
-                    end_seconds_from_epoch = current_second
-                    
-                    # Count frames for the current second
-                    frames_per_second[current_second] += 1
-                    
-                    # Increment frame and sample counters
-                    total_frames += 1
-                    total_samples += header_info['num_channels'] * header_info['frame_length']
-
-                    # Calculate frame length and update the offset
-                    frame_length = header_info['frame_length']
-                    offset += frame_length
-
-                    # Update progress bar
-                    pbar.update(frame_length)
-
-            # Check if the file is "simple"
-            frame_counts = set(frames_per_second.values())
-            is_simple = len(frame_counts) == 1  # Simple if all seconds have the same frame count
+        with contextlib.ExitStack() as stack:
+            if mmapped_file is None:
+                # Memory-map the file for efficient access
+                file = stack.enter_context(open(file_path, 'rb'))
+                mmapped_file = stack.enter_context(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+            stats = scan_simplicity(file_path, mmapped_file, workers)
     except Exception as e:
         print(f"Error while processing VDIF file: {e}")
         return
 
+    print_simplicity(stats)
+
+
+def scan_simplicity(file_path, mmapped_file, workers=1):
+    """
+    Decodes every frame header of a VDIF file in blocks and collects the statistics the
+    simplicity checks are made from. With more than one worker, the file is split into
+    one run of frames per worker process and their statistics are merged in file order.
+    Args:
+        file_path (str): Path to the VDIF file, opened again by each worker process.
+        mmapped_file (mmap.mmap): Memory-mapped file object of the same file.
+        workers (int): Number of processes to split the file between.
+    Returns:
+        dict: The statistics of the whole file (see get_block_stats).
+    """
+    frame_length = fr.read_vdif_frame_header(mmapped_file, 0)["frame_length"]
+    total_frames = len(mmapped_file) // frame_length
+    bounds = np.linspace(0, total_frames, max(1, min(workers, total_frames)) + 1).astype(int)
+
+    with tqdm(total=total_frames * frame_length, unit='B', unit_scale=True, desc="Processing VDIF") as pbar:
+        if len(bounds) == 2:
+            return scan_frames(mmapped_file, frame_length, 0, total_frames, pbar)
+
+        tasks = [(file_path, frame_length, bounds[i], bounds[i + 1]) for i in range(len(bounds) - 1)]
+        parts = []
+        with multiprocessing.Pool(len(tasks)) as pool:
+            for (_, _, start_frame, end_frame), part in zip(tasks, pool.imap(scan_frames_in_file, tasks)):
+                parts.append(part)
+                pbar.update((end_frame - start_frame) * frame_length)
+
+    return functools.reduce(merge_block_stats, parts)
+
+
+def scan_frames_in_file(task):
+    """
+    Worker process of scan_simplicity. Maps the file itself and scans its run of frames.
+    """
+    file_path, frame_length, start_frame, end_frame = task
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mmapped_file:
+            return scan_frames(mmapped_file, frame_length, start_frame, end_frame)
+
+
+def scan_frames(mmapped_file, frame_length, start_frame, end_frame, pbar=None):
+    """
+    Scans a run of frames SCAN_BLOCK_FRAMES at a time and merges the statistics of each block.
+    Returns:
+        dict: The statistics of the run (see get_block_stats).
+    """
+    stats = None
+    for block_start in range(start_frame, end_frame, SCAN_BLOCK_FRAMES):
+        num_frames = min(SCAN_BLOCK_FRAMES, end_frame - block_start)
+        header_table = fr.read_vdif_header_table(mmapped_file, frame_length, block_start, num_frames)
+        block_stats = get_block_stats(header_table)
+        stats = block_stats if stats is None else merge_block_stats(stats, block_stats)
+
+        if pbar is not None:
+            pbar.update(num_frames * frame_length)
+
+    return stats
+
+
+def get_block_stats(header_table):
+    """
+    Computes the simplicity statistics of a run of consecutive frames with array operations.
+    Args:
+        header_table (np.ndarray): Header table from fr.read_vdif_header_table.
+    Returns:
+        dict: Statistics that can be merged with those of the following run by merge_block_stats:
+            - "reference_epoch", "start_seconds_from_epoch", "end_seconds_from_epoch": Of the
+              first and last frames.
+            - "total_frames", "total_samples": Counts over the run.
+            - "first_seconds", "last_seconds": The first and last second of each thread, keyed by thread ID.
+            - "is_contiguous", "is_ordered": Whether the seconds of each thread within the run
+              only step by 0 or 1, and never decrease.
+            - "second_keys", "frame_counts": Number of frames of each (thread, second) pair, with
+              the pair packed into one key as thread_id << 32 | second.
+    """
+    seconds = header_table["seconds_from_epoch"].astype(np.int64)
+    thread_ids = header_table["thread_id"].astype(np.int64)
+
+    # Put the frames of each thread together, keeping their order in the file
+    order = np.argsort(thread_ids, kind="stable")
+    thread_seconds = seconds[order]
+    same_thread = thread_ids[order][1:] == thread_ids[order][:-1]
+    steps = np.diff(thread_seconds)
+
+    threads, first_frames, frames_per_thread = np.unique(thread_ids[order], return_index=True, return_counts=True)
+    last_frames = first_frames + frames_per_thread - 1
+
+    second_keys, frame_counts = np.unique((thread_ids << 32) | seconds, return_counts=True)
+
+    return {
+        "reference_epoch": int(header_table["reference_epoch"][0]),
+        "start_seconds_from_epoch": int(seconds[0]),
+        "end_seconds_from_epoch": int(seconds[-1]),
+        "total_frames": len(header_table),
+        "total_samples": int(np.sum(header_table["num_channels"].astype(np.int64) * header_table["frame_length"])),
+        "first_seconds": dict(zip(threads.tolist(), thread_seconds[first_frames].tolist())),
+        "last_seconds": dict(zip(threads.tolist(), thread_seconds[last_frames].tolist())),
+        "is_contiguous": not np.any(same_thread & (steps != 0) & (steps != 1)),
+        "is_ordered": not np.any(same_thread & (steps < 0)),
+        "second_keys": second_keys,
+        "frame_counts": frame_counts,
+    }
+
+
+def merge_block_stats(earlier, later):
+    """
+    Merges the statistics of two consecutive runs of frames, checking the step between the
+    last second of each thread in the earlier run and its first second in the later run.
+    Returns:
+        dict: The statistics of both runs together.
+    """
+    is_contiguous = earlier["is_contiguous"] and later["is_contiguous"]
+    is_ordered = earlier["is_ordered"] and later["is_ordered"]
+
+    for thread_id, first_second in later["first_seconds"].items():
+        previous_second = earlier["last_seconds"].get(thread_id)
+        if previous_second is None:
+            continue
+        if first_second != previous_second + 1 and first_second != previous_second:
+            is_contiguous = False
+        if first_second < previous_second:
+            is_ordered = False
+
+    # Sum the frame counts of seconds that are split between the runs
+    second_keys, inverse = np.unique(np.concatenate((earlier["second_keys"], later["second_keys"])), return_inverse=True)
+    frame_counts = np.bincount(inverse, weights=np.concatenate((earlier["frame_counts"], later["frame_counts"])))
+
+    return {
+        "reference_epoch": earlier["reference_epoch"],
+        "start_seconds_from_epoch": earlier["start_seconds_from_epoch"],
+        "end_seconds_from_epoch": later["end_seconds_from_epoch"],
+        "total_frames": earlier["total_frames"] + later["total_frames"],
+        "total_samples": earlier["total_samples"] + later["total_samples"],
+        "first_seconds": {**later["first_seconds"], **earlier["first_seconds"]},
+        "last_seconds": {**earlier["last_seconds"], **later["last_seconds"]},
+        "is_contiguous": is_contiguous,
+        "is_ordered": is_ordered,
+        "second_keys": second_keys,
+        "frame_counts": frame_counts.astype(np.int64),
+    }
+
+
+def print_simplicity(stats):
+    """
+    Prints the file properties and simplicity checks from the statistics of a whole file.
+    Args:
+        stats (dict): Statistics from scan_simplicity.
+    """
+    # Simple if all seconds have the same frame count
+    is_simple = len(np.unique(stats["frame_counts"])) == 1
+
     # Convert seconds to human-readable date and time
-    start_datetime = dt.convert_to_datetime(reference_epoch, start_seconds_from_epoch)
-    end_datetime = dt.convert_to_datetime(reference_epoch, end_seconds_from_epoch + 1)
+    reference_epoch = stats["reference_epoch"]
+    start_datetime = dt.convert_to_datetime(reference_epoch, stats["start_seconds_from_epoch"])
+    end_datetime = dt.convert_to_datetime(reference_epoch, stats["end_seconds_from_epoch"] + 1)
 
     # Print file properties and simplicity checks
     print("")
@@ -92,15 +203,16 @@ def check_simplicity(file_path):
     print("=" * 40)
     print(f"Start Date and Time: {start_datetime}")
     print(f"End Date and Time: {end_datetime}")
-    print(f"Total Number of Frames: {total_frames}")
-    print(f"Total Number of Samples: {total_samples}")
+    print(f"Total Number of Frames: {stats['total_frames']}")
+    print(f"Total Number of Samples: {stats['total_samples']}")
     print(f"Reference Epoch: {reference_epoch}")
+    print(f"Threads: {sorted(stats['last_seconds'])}")
     print(f"File Simplicity: {'Simple' if is_simple else 'Not Simple'}")
-    print(f"File Contiguity: {'Contiguous' if is_contiguous else 'Not Contiguous'}")
-    print(f"File Order: {'Ordered' if is_ordered else 'Not Ordered'}")
-    
+    print(f"File Contiguity: {'Contiguous' if stats['is_contiguous'] else 'Not Contiguous'}")
+    print(f"File Order: {'Ordered' if stats['is_ordered'] else 'Not Ordered'}")
+
     if not is_simple:
         print("\nFrame counts per second:")
-        for second, count in frames_per_second.items():
-            print(f"Second {second}: {count} frames")
+        for key, count in zip(stats["second_keys"], stats["frame_counts"]):
+            print(f"Thread {key >> 32}, Second {key & 0xFFFFFFFF}: {count} frames")
     print("")
@@ -1,14 +1,14 @@
 import src.vdif_data_frame_reader as fr
-import src.vdif_properties as props
+import src.vdif_file as vf
 import src.vdif_datetime as dt
 import src.vdif_analysing as anal
 import src.vdif_correlating as corr
+import src.vdif_compute as comp
+import src.vdif_detection as det
+import src.vdif_decimation as dec
 import src.vdif_builder as build
 import matplotlib.pyplot as plt
-import mmap
 import numpy as np
-from scipy.signal import stft
-from tqdm import tqdm
 import os
 
 def plot_data(data):
@@ -18,7 +18,7 @@ def plot_data(data):
     print("Plotting data...")
 
     plt.figure(figsize=(10, 5))
-    plt.plot(data[:, 0], data[:, 1], label="Data Samples")
+    plt.plot(fr.generate_time_data(data["time_axis"]), data["samples"], label="Data Samples")
     plt.title("VDIF Frame Data")
     plt.xlabel("Time since epoch")
     plt.ylabel("Amplitude")
@@ -35,18 +35,14 @@ def plot_data_fourier(data):
     """
     print("Processing Data (Fourier transforming)...")
 
-    time = data[:, 0]
-    values = data[:, 1]
-    time_step = np.mean(np.diff(time))
-    fft_result = np.fft.fft(values)
-    fft_shifted_result = np.fft.fftshift(fft_result)
-    fft_freq = np.fft.fftfreq(len(values), d=time_step)
-    amplitude = np.abs(fft_shifted_result)
+    spectrum = comp.compute_spectrum(data["samples"], data["time_axis"]["sample_rate"])
+    fft_freq = spectrum["frequencies"]
+    amplitude = spectrum["amplitude"]
 
     print("Plotting data...")
 
     plt.figure(figsize=(10, 6))
-    plt.plot(4e6 - fft_freq[:len(fft_freq)//2], amplitude[:len(amplitude)//2], label="Amplitude Spectrum")
+    plt.plot(4e6 - fft_freq, amplitude, label="Amplitude Spectrum")
     plt.xlabel("Frequency (Hz)")
     plt.ylabel("Amplitude")
     plt.title("Fourier Transform: Amplitude vs. Frequency")
@@ -62,55 +58,26 @@ def plot_data_waterfall_chunked(data, chunk_duration=50e-6, window_size=32, over
     and create a waterfall plot.
 
     Parameters:
-        data (numpy.ndarray): A 2D array where the first column is time and the second column is signal values.
+        data (dict): The samples and time axis of the data, from fr.build_vdif_data.
         chunk_duration (float): Duration of each chunk in seconds.
         window_duration (float): Duration of the STFT window in seconds.
         overlap_duration (float): Duration of overlap between windows in seconds.
-        sampling_rate (float, optional): Sampling rate of the data. If None, it is calculated from the time array.
+        sampling_rate (float, optional): Sampling rate of the data. If None, it is taken from the time axis.
     """
     print("Processing Data (Chunking and STFT transforming)...")
 
-    time = data[:, 0]
-    values = data[:, 1]
-
     if sampling_rate is None:
-        time_step = np.mean(np.diff(time))
-        sampling_rate = 1 / time_step
-
-    # Convert durations to sample counts
-    chunk_size = int(chunk_duration * sampling_rate)
-
-    # Number of complete chunks
-    total_chunks = len(values) // chunk_size
-
-    # Initialize sum of STFT results
-    summed_amplitude = None
-    frequencies = None
-    times = None
-
-    # Process each chunk
-    print("Starting chunk processing...")
-    for chunk_idx in tqdm(range(total_chunks), desc="Processing Chunks"):
-        start_idx = chunk_idx * chunk_size
-        end_idx = start_idx + chunk_size
-        chunk = values[start_idx:end_idx]
-
-        # Perform STFT on the current chunk
-        f, t, Zxx = stft(chunk, fs=sampling_rate, nperseg=window_size, noverlap=overlap)
+        sampling_rate = data["time_axis"]["sample_rate"]
 
-        # Compute amplitude
-        amplitude = np.abs(Zxx)
+    summed_amplitude, frequencies, times, _ = comp.sum_waterfall_chunks(data["samples"], sampling_rate, chunk_duration, window_size, overlap)
 
-        amplitude = amplitude**3
+    plot_summed_waterfall(times, frequencies, summed_amplitude)
 
-        # Initialize or sum amplitudes
-        if summed_amplitude is None:
-            summed_amplitude = amplitude
-            frequencies = f
-            times = t + chunk_idx * chunk_duration
-        else:
-            summed_amplitude += amplitude
 
+def plot_summed_waterfall(times, frequencies, summed_amplitude):
+    """
+    Plot a summed waterfall from sum_waterfall_chunks.
+    """
     print("Plotting data...")
 
     # Create the 2D plot
@@ -133,25 +100,19 @@ def plot_data_waterfall(data, window_size=2048, overlap=0, sampling_rate=None):
     Perform a Short-Time Fourier Transform (STFT) on the data and plot a 2D waterfall plot with color representing amplitude.
     
     Parameters:
-        data (numpy.ndarray): A 2D array where the first column is time and the second column is signal values.
+        data (dict): The samples and time axis of the data, from fr.build_vdif_data.
         window_size (int): The size of the window for STFT.
         overlap (int): The number of points overlapping between segments.
-        sampling_rate (float, optional): Sampling rate of the data. If None, it is calculated from the time array.
+        sampling_rate (float, optional): Sampling rate of the data. If None, it is taken from the time axis.
     """
     print("Processing Data (STFT transforming)...")
 
-    time = data[:, 0]
-    values = data[:, 1]
-
     if sampling_rate is None:
-        time_step = np.mean(np.diff(time))
-        sampling_rate = 1 / time_step
+        sampling_rate = data["time_axis"]["sample_rate"]
 
     # Perform the Short-Time Fourier Transform (STFT)
-    f, t, Zxx = stft(values, fs=sampling_rate, nperseg=window_size, noverlap=overlap)
-
-    # Calculate amplitude
-    amplitude = np.abs(Zxx)
+    waterfall = comp.compute_waterfall(data["samples"], sampling_rate, window_size, overlap)
+    f, t, amplitude = waterfall["frequencies"], waterfall["times"], waterfall["amplitude"]
 
     print("Plotting data...")
 
@@ -233,32 +194,45 @@ def plot_frames_waterfall(file_path, start_time=None, end_time=None):
 
 def plot_repeated_waterfall(file_path, start_time=None, end_time=None):
     """
-    Plot Fourier Transform of the data retrieved from a VDIF file for a user-specified time range.
+    Plot the summed waterfall of the data retrieved from a VDIF file for a user-specified time range.
+    The range is streamed in chunks, so it may be longer than fits in memory.
     """
-    def plot_fourier(file_info, starting_header, data, start_seconds, end_seconds):
-        plot_data_waterfall_chunked(data)
+    waterfall = {"summed_amplitude": None, "frequencies": None, "times": None, "remainder": None}
+
+    def sum_chunk(file_info, starting_header, data, start_seconds, end_seconds):
+        values = data["samples"]
+        if waterfall["remainder"] is not None:
+            values = np.concatenate((waterfall["remainder"], values))
+
+        summed_amplitude, frequencies, times, remainder = comp.sum_waterfall_chunks(values, file_info["sample_rate"], summed_amplitude=waterfall["summed_amplitude"])
 
-    anal.process_data_window(file_path, plot_fourier)
+        waterfall["summed_amplitude"] = summed_amplitude
+        waterfall["remainder"] = remainder
+        if frequencies is not None:
+            waterfall["frequencies"] = frequencies
+            waterfall["times"] = times
+
+    anal.process_data_chunks(file_path, sum_chunk, start_time, end_time)
+
+    plot_summed_waterfall(waterfall["times"], waterfall["frequencies"], waterfall["summed_amplitude"])
 
 def plot_first_frame(file_path):
     """
     Plot the first frame's data from a VDIF file.
     """
-    file_info = props.get_vdif_file_properties(file_path)
-    with open(file_path, 'rb') as file:
-        mmapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    with vf.open_vdif_file(file_path) as session:
         offset = 0
-        _, data = fr.read_vdif_frame_data(mmapped_file, offset, file_info)
-        plot_data(data)
+        _, data = session.read_frame(offset)
+    plot_data(data)
 
 def auto_correlate(file_path, start_time=None, end_time=None):
     """
     Correlates a section of a vdif file with itself
     Args:
-        file_path (_type_): Path to vdif file
+        file_path (str or VdifFile): Path to vdif file, or an open session on it
     """    
     def function(file_info, starting_header, data, start_seconds, end_seconds):
-        corr.plot_auto_correlation(data, file_info["sample_rate"], file_path)
+        corr.plot_auto_correlation(data, file_info["sample_rate"], file_info["file_path"])
     
     anal.process_data_window(file_path, function, start_time, end_time)
 
@@ -266,25 +240,166 @@ def correlate_chirp(file_path, start_time=None, end_time=None, bandwidth=None, p
     """
     Correlates a section of a vdif file with itself
     Args:
-        file_path (_type_): Path to vdif file
+        file_path (str or VdifFile): Path to vdif file, or an open session on it
     """    
     def function(file_info, starting_header, signal, start_seconds, end_seconds):
-        template = corr.generate_chirp_template(signal, file_info["sample_rate"], bandwidth, pulse_width, phase_offset)
-        corr.plot_correlation(signal, template, file_info["sample_rate"], file_path)
+        corr.plot_chirp_correlation(signal, file_info["sample_rate"], file_info["file_path"], bandwidth, pulse_width, phase_offset)
     
     anal.process_data_window(file_path, function, start_time, end_time)
 
+def correlate_chirp_streaming(file_path, start_time=None, end_time=None, bandwidth=None, pulse_width=None, phase_offset=None, fast_time_duration=25e-6,
+                              decimate=False, decimation=None, center_frequency=None, compensate_doppler=False, predix_file=None):
+    """
+    Correlates a section of a vdif file with a chirp block by block (overlap-save), so the
+    section may be far longer than fits in memory. Only the fast time vs. slow time plot is made.
+    Args:
+        file_path (str or VdifFile): Path to vdif file, or an open session on it
+        fast_time_duration (float): Pulse period in seconds, the length of each fast time row.
+        decimate (bool): Whether to shift and decimate each block before it is correlated (see vdif_decimation).
+        decimation (int), center_frequency (float): The decimation and the frequency shifted to 0 Hz. The user is asked if decimation is None.
+        compensate_doppler (bool): Whether to reverse the Doppler shift of each block with the RTT of a PREDIX file before it is correlated (see build.inverse_doppler_shift).
+        predix_file (str): The PREDIX file. The user is asked to pick one if None.
+    """
+    bandwidth, pulse_width, phase_offset = corr.get_chirp_parameters(bandwidth, pulse_width, phase_offset)
+    correlation = {"summary": None, "remainder": None, "decimator": None, "compensator": None, "no_rtt": False}
+
+    def correlate_chunk(file_info, starting_header, data, start_seconds, end_seconds):
+        sample_rate = file_info["sample_rate"]
+        if correlation["no_rtt"]:
+            return
+        if correlation["summary"] is None:
+            if compensate_doppler:
+                rtt_interp = build.get_rtt_interpolator(file_info['reference_epoch'], predix_file)
+                if rtt_interp is None:
+                    correlation["no_rtt"] = True
+                    return
+
+                # Received sample numbers count from the first sample of the section
+                time_axis = data["time_axis"]
+                first_seconds = time_axis["start_seconds_from_epoch"] + time_axis["start_frame_number"] / time_axis["frames_per_second"]
+                rtt_reference = build.get_rtt_minimum(rtt_interp, first_seconds, end_seconds)
+                correlation["compensator"] = build.start_doppler_compensator(sample_rate, lambda indices: rtt_interp(first_seconds + indices / sample_rate),
+                                                                             rtt_reference, data["samples"].dtype)
+
+            template = comp.generate_chirp(sample_rate, bandwidth, pulse_width, phase_offset)
+
+            if decimate:
+                factor, shift = dec.get_decimation_parameters(sample_rate, bandwidth, decimation, center_frequency)
+                correlation["decimator"] = dec.start_decimator(sample_rate, factor, shift)
+                template = dec.decimate_template(correlation["decimator"], template)
+                sample_rate = correlation["decimator"]["output_rate"]
+                print(f"Decimating by {factor} to {sample_rate:g} samples per second")
+
+            fft_length = comp.get_overlap_save_length(len(template))
+            fast_time_samples = int(fast_time_duration * sample_rate)
+            expected_rows = int((end_seconds - start_seconds) * sample_rate) // fast_time_samples
+
+            if decimate:
+                template_spectrum = comp.get_template_spectrum(template, fft_length)
+            else:
+                template_spectrum = comp.get_chirp_spectrum(sample_rate, bandwidth, pulse_width, phase_offset, fft_length, np.iscomplexobj(data["samples"]))
+
+            correlation.update({"template_length": len(template),
+                                "fft_length": fft_length,
+                                "template_spectrum": template_spectrum,
+                                "summary": comp.start_fast_time_summary(fast_time_samples, expected_rows),
+                                "remainder": np.zeros(0, dtype=data["samples"].dtype),
+                                "sample_rate": sample_rate,
+                                "file_path": file_info["file_path"]})
+
+        values = data["samples"]
+        if correlation["compensator"] is not None:
+            values = build.compensate_doppler_chunk(correlation["compensator"], values)
+        correlate_values(np.concatenate((correlation["remainder"], decimate_values(values))))
+
+    def decimate_values(values):
+        if correlation["decimator"] is not None:
+            values = dec.decimate_chunk(correlation["decimator"], values)
+        return values
+
+    def correlate_values(values, flush=False):
+        lags, correlation["remainder"] = comp.matched_filter_chunk(values,
+                                                                   correlation["template_spectrum"],
+                                                                   correlation["template_length"],
+                                                                   correlation["fft_length"],
+                                                                   flush)
+        comp.add_to_fast_time_summary(correlation["summary"], lags)
+
+    anal.process_data_chunks(file_path, correlate_chunk, start_time, end_time)
+    if correlation["summary"] is None:
+        return
+
+    # Correlate the lags at the end of the section, with the samples the compensator held back
+    if correlation["compensator"] is not None:
+        values = build.flush_doppler_compensator(correlation["compensator"])
+        correlation["remainder"] = np.concatenate((correlation["remainder"], decimate_values(values)))
+    correlate_values(correlation["remainder"], flush=True)
+
+    corr.print_integration_report(comp.get_integration_report(correlation["summary"]["integrator"]), correlation["sample_rate"])
+    corr.plot_fast_time_summary(correlation["summary"], correlation["sample_rate"], correlation["file_path"])
+
+def correlate_chirp_bank(file_path, start_time=None, end_time=None, bandwidths=None, pulse_widths=None, phase_offsets=None):
+    """
+    Correlates a section of a vdif file with every chirp of a grid of parameters, and prints and plots the SNR of each.
+    Args:
+        file_path (str or VdifFile): Path to vdif file, or an open session on it
+    """
+    def function(file_info, starting_header, signal, start_seconds, end_seconds):
+        grid = corr.get_chirp_grid(bandwidths, pulse_widths, phase_offsets)
+        bank = comp.compute_template_bank(signal["samples"], file_info["sample_rate"], *grid)
+        corr.print_template_bank(bank, file_info["sample_rate"])
+        corr.plot_template_bank(bank, file_info["file_path"])
+
+    anal.process_data_window(file_path, function, start_time, end_time)
+
+def detect_chirp(file_path, start_time=None, end_time=None, bandwidth=None, pulse_width=None, phase_offset=None, log_path=None):
+    """
+    Correlates a section of a vdif file with a chirp block by block, and lists the echoes the
+    CFAR detector finds in it instead of plotting them. Detections are logged to a CSV file.
+    Args:
+        file_path (str or VdifFile): Path to vdif file, or an open session on it
+    """
+    bandwidth, pulse_width, phase_offset = corr.get_chirp_parameters(bandwidth, pulse_width, phase_offset)
+    if log_path is None:
+        log_path = input("Enter the CSV file to log detections to (default: detections.csv): ") or "detections.csv"
+
+    detection = det.detect_chirp_streaming(file_path, bandwidth, pulse_width, phase_offset, start_time, end_time, log_path)
+    if detection["report"] is None:
+        return
+
+    print("\nDetections in each pulse period:")
+    det.print_detections(detection["detections"])
+    print("\nDetections in the integrated profile:")
+    det.print_detections(detection["profile_detections"])
+    print(f"Detections logged to {log_path}")
+
+def plot_frames_range_doppler(file_path, start_time=None, end_time=None, pulse_period=None, bandwidth=None, pulse_width=None, phase_offset=None, carrier_frequency=None):
+    """
+    Plots the range-Doppler map of a section of a vdif file, pulse-compressing each pulse repetition period with a chirp.
+    Args:
+        file_path (str or VdifFile): Path to vdif file, or an open session on it
+    """
+    def function(file_info, starting_header, signal, start_seconds, end_seconds):
+        period, carrier = corr.get_range_doppler_parameters(pulse_period, carrier_frequency)
+        chirp_bandwidth, chirp_pulse_width, chirp_phase_offset = corr.get_chirp_parameters(bandwidth, pulse_width, phase_offset)
+
+        print("Computing range-Doppler map...")
+        range_doppler = comp.compute_range_doppler(signal["samples"], file_info["sample_rate"], period,
+                                                   chirp_bandwidth, chirp_pulse_width, chirp_phase_offset, carrier)
+        corr.plot_range_doppler(range_doppler, file_info["file_path"])
+
+    anal.process_data_window(file_path, function, start_time, end_time)
+
 def correlate_chirp_shifted(file_path, predix_file=None, start_time=None, end_time=None, bandwidth=None, pulse_width=None, phase_offset=None):
     """
     Correlates a section of a vdif file with itself
     Args:
-        file_path (_type_): Path to vdif file
+        file_path (str or VdifFile): Path to vdif file, or an open session on it
     """    
     def function(file_info, starting_header, signal, start_seconds, end_seconds):
         sample_rate = file_info["sample_rate"]
         rtt = build.generate_rtt_from_predix(file_info['reference_epoch'], start_seconds, end_seconds-start_seconds, sample_rate, predix_file)
-        signal[:,1] = build.inverse_doppler_shift(signal[:,1], rtt, sample_rate)
-        template = corr.generate_chirp_template(signal, sample_rate, bandwidth, pulse_width, phase_offset)
-        corr.plot_correlation(signal, template, sample_rate, file_path)
+        signal["samples"] = build.inverse_doppler_shift(signal["samples"], rtt, sample_rate)
+        corr.plot_chirp_correlation(signal, sample_rate, file_info["file_path"], bandwidth, pulse_width, phase_offset)
     
     anal.process_data_window(file_path, function, start_time, end_time)
\ No newline at end of file
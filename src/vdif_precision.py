@@ -0,0 +1,55 @@
+"""
+-------------------------------------------------
+File: vdif_precision.py
+Description: The floating point precision the samples are processed in. VDIF
+             samples have at most 16 bits, so single precision keeps more
+             resolution than they carry while halving the memory traffic of
+             double precision, and is the default. Times since the epoch and
+             running sums over many blocks are kept in double precision
+             whatever the setting.
+License: see LICENCE.txt
+Dependencies:
+    - numpy
+-------------------------------------------------
+"""
+
+import numpy as np
+
+# The real and complex dtypes of each precision
+PRECISIONS = {
+    "single": (np.dtype(np.float32), np.dtype(np.complex64)),
+    "double": (np.dtype(np.float64), np.dtype(np.complex128)),
+}
+
+PRECISION = "single"
+
+def set_precision(precision):
+    """
+    Sets the precision samples, spectra and correlations are computed in.
+    Args:
+        precision (str): "single" for float32/complex64, or "double" for float64/complex128.
+    """
+    global PRECISION
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {', '.join(PRECISIONS)}.")
+    PRECISION = precision
+
+def real_dtype():
+    """
+    Returns the dtype of real values at the current precision.
+    """
+    return PRECISIONS[PRECISION][0]
+
+def complex_dtype():
+    """
+    Returns the dtype of complex values at the current precision.
+    """
+    return PRECISIONS[PRECISION][1]
+
+def as_working_dtype(values):
+    """
+    Converts integer or floating point values to the real or complex dtype of the current
+    precision, without copying values that already have it.
+    """
+    values = np.asarray(values)
+    return values.astype(complex_dtype() if np.iscomplexobj(values) else real_dtype(), copy=False)
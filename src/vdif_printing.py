@@ -1,8 +1,7 @@
 import src.vdif_data_frame_reader as fr
 import src.vdif_datetime as dt
-import src.vdif_properties as props
 import src.vdif_analysing as anal
-import mmap
+import src.vdif_file as vf
 
 # PUBLIC FUNCTIONS
 
@@ -23,7 +22,7 @@ def print_frames(file_path):
         print_data(data)
         print(f"Data range from {start_seconds} to {end_seconds} seconds since epoch")
         print(f"Data range from {start_datetime} to {end_datetime}")
-        print(f"Number of samples: {len(data)}\n")
+        print(f"Number of samples: {len(data['samples'])}\n")
 
     anal.process_data_window(file_path, print_details)
 
@@ -31,20 +30,16 @@ def print_frames(file_path):
 #HELPER FUNCTIONS
 
 def read_and_print_frame(file_path, print_all=False, offset=0):
-    file_info = props.get_vdif_file_properties(file_path)
-
-    # Memory-map the file for efficient access
-    with open(file_path, 'rb') as file:
-        mmapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    with vf.open_vdif_file(file_path) as session:
         # Read the first frame's header and data
-        header_info, data = fr.read_vdif_frame_data(mmapped_file, offset, file_info)
+        header_info, data = session.read_frame(offset)
     
     # Print frame header
     print_header(header_info)
     
     # Print frame data
     if print_all:
-        print_data(data, len(data), 0)
+        print_data(data, len(data["samples"]), 0)
     else:
         print_data(data)
 
@@ -66,14 +61,23 @@ def print_data(data, start_rows=5, end_rows=5):
     print(f"  {"Time since epoch (s)":<19} | {"Amplitude":<10}\n")
 
 
+    samples = data["samples"]
+    num_samples = len(samples)
+
+    # Only generate times for the rows being printed
+    head_times = fr.generate_time_data(data["time_axis"], 0, start_rows)
+
     # Print the first 5 and last 5 rows with right alignment
     for i in range(0, start_rows):
-        print(f"  {data[i][0]:<20.8f} | {int(data[i][1]):>10}")
+        print(f"  {head_times[i]:<20.8f} | {samples[i]:>10}")
 
     if end_rows:
         print("...")
 
-        for i in range(len(data) - (end_rows + 1), len(data) - 1):
-            print(f"  {data[i][0]:<20.8f} | {int(data[i][1]):>10}")
+        tail_start = num_samples - (end_rows + 1)
+        tail_times = fr.generate_time_data(data["time_axis"], tail_start, num_samples - 1)
+
+        for i in range(tail_start, num_samples - 1):
+            print(f"  {tail_times[i - tail_start]:<20.8f} | {samples[i]:>10}")
 
     print("(End of data)\n")
\ No newline at end of file
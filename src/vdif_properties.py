@@ -1,8 +1,11 @@
-import os
 import mmap
+import numpy as np
 import src.vdif_data_frame_reader as fr
 import src.vdif_datetime as dt
 
+# Number of frames at the start of a file searched for thread IDs
+THREAD_SCAN_FRAMES = 1024
+
 def get_vdif_file_properties(file_path):
     """
     Reads the first and last frames of a VDIF file to compute essential properties, including the sampling rate.
@@ -14,59 +17,112 @@ def get_vdif_file_properties(file_path):
         dict: A dictionary containing the computed properties of the VDIF file.
     """
     try:
-        file_size = os.path.getsize(file_path)  # Get the total file size
-
         with open(file_path, 'rb') as file:
             # Memory-map the file for efficient access
-            mmapped_file = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
-
-            # Read the first frame
-            offset = 0
-            header_info = fr.read_vdif_frame_header(mmapped_file, offset)
-            header_size = 32 if header_info["legacy_mode"] == 0 else 16
-            frame_length = header_info["frame_length"]
-            bytes_per_sample = header_info["bits_per_sample"] / 8
-            samples_per_frame = (frame_length - header_size) / bytes_per_sample
-            reference_epoch = header_info["reference_epoch"]
-            start_seconds_from_epoch = header_info["seconds_from_epoch"]
-
-            # Jump to the last frame
-            last_frame_offset = file_size - frame_length
-            last_frame_header = fr.read_vdif_frame_header(mmapped_file, last_frame_offset)
-            end_seconds_from_epoch = last_frame_header["seconds_from_epoch"] + 1
-            frame_number_of_last_frame = last_frame_header["frame_number"]
-
-            # Calculate derived properties
-            total_frames = file_size // frame_length
-            total_samples = total_frames * samples_per_frame
-            frames_per_second = frame_number_of_last_frame + 1
-
-            # Calculate sampling rate
-            sampling_rate = frames_per_second * samples_per_frame
-
-            # Convert seconds to human-readable date and time
-            start_datetime = dt.convert_to_datetime(reference_epoch, start_seconds_from_epoch)
-            end_datetime = dt.convert_to_datetime(reference_epoch, end_seconds_from_epoch + 1)
-
-            # Return properties as a dictionary
-            return {
-                "start_datetime": start_datetime,
-                "end_datetime": end_datetime,
-                "frame_length": frame_length,
-                "total_frames": total_frames,
-                "total_samples": int(total_samples),
-                "reference_epoch": reference_epoch,
-                "frames_per_second": frames_per_second,
-                "samples_per_frame": samples_per_frame,
-                "sample_rate": sampling_rate,
-                "start_seconds_from_epoch": start_seconds_from_epoch,
-                "end_seconds_from_epoch": end_seconds_from_epoch,
-            }
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mmapped_file:
+                return read_vdif_file_properties(file_path, mmapped_file)
     except Exception as e:
         print(f"Error while processing VDIF file: {e}")
         return None
 
 
+def read_vdif_file_properties(file_path, mmapped_file):
+    """
+    Computes the properties of a VDIF file that is already memory-mapped.
+
+    Args:
+        file_path (str): Path to the VDIF file.
+        mmapped_file (mmap.mmap): Memory-mapped VDIF file.
+
+    Returns:
+        dict: A dictionary containing the computed properties of the VDIF file.
+    """
+    file_size = len(mmapped_file)
+
+    # Read the first frame
+    offset = 0
+    header_info = fr.read_vdif_frame_header(mmapped_file, offset)
+    header_size = 32 if header_info["legacy_mode"] == 0 else 16
+    frame_length = header_info["frame_length"]
+    bytes_per_sample = header_info["bits_per_sample"] / 8
+    num_channels = header_info["num_channels"]
+    values_per_sample = 2 if header_info["data_type"] == "Complex" else 1
+
+    # Samples of each channel per frame, counting each I/Q pair as one sample
+    samples_per_frame = (frame_length - header_size) / (bytes_per_sample * num_channels * values_per_sample)
+    reference_epoch = header_info["reference_epoch"]
+    start_seconds_from_epoch = header_info["seconds_from_epoch"]
+
+    # Jump to the last complete frame, as a file being recorded may end part way through one
+    last_frame_offset = (file_size // frame_length - 1) * frame_length
+    last_frame_header = fr.read_vdif_frame_header(mmapped_file, last_frame_offset)
+    end_seconds_from_epoch = last_frame_header["seconds_from_epoch"] + 1
+    frame_number_of_last_frame = last_frame_header["frame_number"]
+
+    # Find the threads interleaved in the file
+    first_headers = fr.read_vdif_header_table(mmapped_file, frame_length, 0, THREAD_SCAN_FRAMES)
+    thread_ids = [int(thread_id) for thread_id in np.unique(first_headers["thread_id"])]
+
+    # Calculate derived properties, counting samples per thread
+    total_frames = file_size // frame_length
+    total_samples = total_frames / len(thread_ids) * samples_per_frame
+    frames_per_second = max(find_frames_per_second(mmapped_file, frame_length), frame_number_of_last_frame + 1)
+
+    # Calculate sampling rate
+    sampling_rate = frames_per_second * samples_per_frame
+
+    # Convert seconds to human-readable date and time
+    start_datetime = dt.convert_to_datetime(reference_epoch, start_seconds_from_epoch)
+    end_datetime = dt.convert_to_datetime(reference_epoch, end_seconds_from_epoch + 1)
+
+    # Return properties as a dictionary
+    return {
+        "file_path": file_path,
+        "start_datetime": start_datetime,
+        "end_datetime": end_datetime,
+        "frame_length": frame_length,
+        "total_frames": total_frames,
+        "total_samples": int(total_samples),
+        "reference_epoch": reference_epoch,
+        "frames_per_second": frames_per_second,
+        "samples_per_frame": samples_per_frame,
+        "num_channels": num_channels,
+        "thread_ids": thread_ids,
+        "data_type": header_info["data_type"],
+        "bits_per_sample": header_info["bits_per_sample"],
+        "sample_rate": sampling_rate,
+        "start_seconds_from_epoch": start_seconds_from_epoch,
+        "end_seconds_from_epoch": end_seconds_from_epoch,
+    }
+
+
+def find_frames_per_second(mmapped_file, frame_length):
+    """
+    Finds the number of frames per second from the largest frame number before the first
+    change of second, so that a file whose last second is incomplete, such as one that is
+    still being recorded, gives the full number. Only the headers up to the first change of
+    second are read. A file shorter than that gives its largest frame number plus one.
+
+    Args:
+        mmapped_file (mmap.mmap): Memory-mapped VDIF file.
+        frame_length (int): Length of each frame in bytes.
+
+    Returns:
+        int: The number of frames per second of each thread.
+    """
+    total_frames = len(mmapped_file) // frame_length
+    num_frames = THREAD_SCAN_FRAMES
+    while True:
+        headers = fr.read_vdif_header_table(mmapped_file, frame_length, 0, num_frames)
+        later = np.flatnonzero(headers["seconds_from_epoch"] != headers["seconds_from_epoch"][0])
+        if len(later) or num_frames >= total_frames:
+            break
+        num_frames *= 2
+
+    first_second = headers[:later[0]] if len(later) else headers
+    return int(np.max(first_second["frame_number"])) + 1
+
+
 def print_vdif_file_properties(file_path):
     """
     Prints the properties of a VDIF file.
@@ -75,7 +131,18 @@ def print_vdif_file_properties(file_path):
         file_properties (dict): A dictionary containing the VDIF file properties.
     """
     file_properties = get_vdif_file_properties(file_path)
+    print_file_properties(file_properties)
 
+    return file_properties
+
+
+def print_file_properties(file_properties):
+    """
+    Prints properties of a VDIF file that have already been computed.
+
+    Args:
+        file_properties (dict): A dictionary containing the VDIF file properties.
+    """
     print("\n" + "=" * 40)
     print("VDIF File Properties")
     print("=" * 40)
@@ -86,8 +153,8 @@ def print_vdif_file_properties(file_path):
     print(f"Reference Epoch: {file_properties['reference_epoch']}")
     print(f"Frames Per Second: {file_properties['frames_per_second']}")
     print(f"Sample rate: {file_properties['sample_rate']} Hz")
+    print(f"Threads: {file_properties['thread_ids']}")
+    print(f"Channels: {file_properties['num_channels']} ({file_properties['data_type']}, {file_properties['bits_per_sample']} bit)")
     print(f"Seconds Since Epoch of Start of File: {file_properties['start_seconds_from_epoch']}")
     print(f"Seconds Since Epoch of End of File: {file_properties['end_seconds_from_epoch']}")
     print("")
-
-    return file_properties
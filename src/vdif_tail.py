@@ -0,0 +1,95 @@
+"""
+-------------------------------------------------
+File: vdif_tail.py
+Description: Follows a VDIF file while it is still being recorded. The frames
+             already in the file are validated once, and after that only the
+             newly appended frames are validated, indexed and analysed, so
+             data quality and results are seen shortly after the data lands.
+License: see LICENCE.txt
+Dependencies:
+    - numpy
+    - tqdm
+-------------------------------------------------
+"""
+
+import numpy as np
+import src.vdif_data_frame_reader as fr
+import src.vdif_file as vf
+import src.vdif_index as idx
+import src.vdif_is_simple as simp
+
+def tail_vdif_file(vdif_file, process_function=None, poll_interval=1.0, idle_timeout=None, max_frames=100000, thread_id=None, channel=0):
+    """
+    Follows a VDIF file until it stops growing for idle_timeout seconds, or until Ctrl+C.
+    A status line is printed for each batch of new frames, and the simplicity of the whole
+    file is printed at the end.
+    Args:
+        vdif_file (str or VdifFile): Path to the VDIF file, or an open session on it.
+        process_function (callable): Function to analyse each batch of new data with, called
+            as in anal.process_data_window. None only validates.
+        poll_interval (float): Seconds to wait between checks when there is nothing new.
+        idle_timeout (float): Stop after this many seconds without new frames. None follows forever.
+        max_frames (int): Largest number of new frames handled at once.
+        thread_id (int): Thread to analyse. Defaults to the lowest thread ID.
+        channel (int): Channel of multi-channel data to analyse. None passes every channel.
+    Returns:
+        dict: The simplicity statistics of the file (see simp.get_block_stats).
+    """
+    with vf.open_vdif_file(vdif_file) as session:
+        # Validate and index what has been recorded so far
+        stats = simp.scan_simplicity(session.file_path, session.mmapped_file)
+        session.index
+
+        print(f"Following {session.file_path}, press Ctrl+C to stop")
+        try:
+            for new_headers in session.follow(poll_interval, idle_timeout, max_frames):
+                stats = simp.merge_block_stats(stats, simp.get_block_stats(new_headers))
+                print_tail_status(stats, new_headers)
+
+                if process_function is not None:
+                    process_new_frames(session, new_headers, process_function, thread_id, channel)
+        except KeyboardInterrupt:
+            print("\nStopped following the file.")
+
+    simp.print_simplicity(stats)
+    return stats
+
+
+def process_new_frames(session, new_headers, process_function, thread_id=None, channel=0):
+    """
+    Extracts the data spanned by a batch of new frames of one thread and passes it to a
+    process function. Frames of the span that have not arrived are filled with zeros.
+    """
+    thread_index = idx.get_thread_index(session.index, thread_id)
+    if thread_id is None:
+        thread_id = min(session.index["threads"])
+
+    frames_per_second = thread_index["frames_per_second"]
+    keys = fr.get_frame_time_keys(new_headers[new_headers["thread_id"] == thread_id], frames_per_second)
+    if len(keys) == 0:
+        return
+
+    first_key = int(np.min(keys))
+    frame_offsets = idx.lookup_frame_offsets(thread_index, np.arange(first_key, np.max(keys) + 1, dtype=np.int64))
+
+    file_info = session.properties
+    starting_header, data = fr.generate_data_from_frame_offsets(file_info, session.mmapped_file, first_key, frame_offsets, frames_per_second)
+    if channel is not None:
+        data = fr.select_channel(data, channel)
+
+    start_seconds = first_key / frames_per_second
+    end_seconds = (first_key + len(frame_offsets)) / frames_per_second
+    process_function(file_info, starting_header, data, start_seconds, end_seconds)
+
+
+def print_tail_status(stats, new_headers):
+    """
+    Prints one line describing a batch of new frames and the file so far.
+    """
+    latest_second = int(np.max(new_headers["seconds_from_epoch"]))
+    invalid_frames = int(np.count_nonzero(new_headers["invalid_data"]))
+
+    print(f"Second {latest_second}: {len(new_headers)} new frames ({invalid_frames} invalid), "
+          f"{stats['total_frames']} in total, "
+          f"{'Contiguous' if stats['is_contiguous'] else 'Not Contiguous'}, "
+          f"{'Ordered' if stats['is_ordered'] else 'Not Ordered'}")
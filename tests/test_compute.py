@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import src.vdif_compute as comp
+import src.vdif_precision as prec
+
+@pytest.fixture
+def double_precision():
+    precision = prec.PRECISION
+    prec.set_precision("double")
+    yield
+    prec.set_precision(precision)
+
+def get_signal_and_template(is_complex, num_samples=50000, template_length=333):
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-128, 128, num_samples).astype(np.float64)
+    template = rng.integers(-64, 64, template_length).astype(np.float64)
+    if is_complex:
+        samples = samples + 1j * rng.integers(-128, 128, num_samples)
+        template = template + 1j * rng.integers(-64, 64, template_length)
+    return samples, template
+
+def correlate_in_blocks(samples, template, block_lengths):
+    fft_length = comp.get_overlap_save_length(len(template))
+    template_spectrum = comp.get_template_spectrum(template, fft_length)
+
+    lags = []
+    remainder = samples[:0]
+    for block in np.split(samples, np.cumsum(block_lengths)):
+        block_lags, remainder = comp.matched_filter_chunk(np.concatenate((remainder, block)), template_spectrum, len(template), fft_length)
+        lags.append(block_lags)
+    block_lags, _ = comp.matched_filter_chunk(remainder, template_spectrum, len(template), fft_length, flush=True)
+    lags.append(block_lags)
+
+    return np.concatenate(lags)
+
+@pytest.mark.parametrize("is_complex", [False, True])
+@pytest.mark.parametrize("block_lengths", [[], [1, 100, 4096, 20000], [332, 333, 334]])
+def test_overlap_save_matches_full_correlation(double_precision, is_complex, block_lengths):
+    samples, template = get_signal_and_template(is_complex)
+
+    lags = correlate_in_blocks(samples, template, block_lengths)
+
+    # Lags past the end of the signal correlate with zeros
+    expected = np.correlate(np.concatenate((samples, np.zeros(len(template) - 1))), template, mode="valid")
+    assert len(lags) == len(samples)
+    np.testing.assert_allclose(lags, expected, rtol=0, atol=1e-6)
+
+def test_overlap_save_in_single_precision():
+    samples, template = get_signal_and_template(False)
+
+    lags = correlate_in_blocks(samples, template, [7000, 7000])
+
+    expected = np.correlate(np.concatenate((samples, np.zeros(len(template) - 1))), template, mode="valid")
+    assert lags.dtype == prec.real_dtype()
+    np.testing.assert_allclose(lags, expected, rtol=0, atol=1e-5 * np.max(np.abs(expected)))
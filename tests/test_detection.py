@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import src.vdif_compute as comp
+import src.vdif_detection as det
+
+SAMPLE_RATE = 8e6
+BANDWIDTH = 4e6
+PULSE_WIDTH = 2.5e-6
+FAST_TIME_SAMPLES = 200
+
+def get_false_alarm_rate(rows, method, probability_false_alarm, oversampling=1):
+    power = np.abs(rows).astype(np.float64)**2
+    if method == "ca":
+        scale = det.get_ca_cfar_scale(det.CFAR_TRAINING_CELLS, probability_false_alarm, oversampling)
+    else:
+        scale = det.get_os_cfar_scale(det.CFAR_TRAINING_CELLS, det.get_default_rank(det.CFAR_TRAINING_CELLS), probability_false_alarm, oversampling)
+    noise = det.get_cfar_noise(power, det.CFAR_GUARD_CELLS, det.CFAR_TRAINING_CELLS, method)
+    return np.mean(power > scale * noise)
+
+def match_filter_noise(samples):
+    template = comp.generate_chirp(SAMPLE_RATE, BANDWIDTH, PULSE_WIDTH, 0)
+    fft_length = comp.get_overlap_save_length(len(template))
+    template_spectrum = comp.get_chirp_spectrum(SAMPLE_RATE, BANDWIDTH, PULSE_WIDTH, 0, fft_length, np.iscomplexobj(samples))
+    lags, _ = comp.matched_filter_chunk(samples, template_spectrum, len(template), fft_length, flush=True, analytic=True)
+    return lags[:len(lags) // FAST_TIME_SAMPLES * FAST_TIME_SAMPLES].reshape(-1, FAST_TIME_SAMPLES)
+
+@pytest.mark.parametrize("method", ["ca", "os"])
+def test_pfa_of_complex_gaussian_noise(method):
+    rng = np.random.default_rng(0)
+    rows = rng.normal(size=(10000, FAST_TIME_SAMPLES)) + 1j * rng.normal(size=(10000, FAST_TIME_SAMPLES))
+
+    assert 0.7e-3 < get_false_alarm_rate(rows, method, 1e-3) < 1.4e-3
+
+@pytest.mark.parametrize("method", ["ca", "os"])
+def test_pfa_of_real_match_filtered_noise(method):
+    rng = np.random.default_rng(0)
+    samples = np.clip(np.round(rng.normal(0, 20, 2_000_000)), -128, 127).astype(np.int8)
+    rows = match_filter_noise(samples)
+
+    assert np.iscomplexobj(rows)
+    assert 0.5e-3 < get_false_alarm_rate(rows, method, 1e-3, det.get_oversampling(samples)) < 1.5e-3
+
+def test_analytic_correlation_keeps_real_part():
+    rng = np.random.default_rng(0)
+    samples = rng.normal(size=100000)
+    template = comp.generate_chirp(SAMPLE_RATE, BANDWIDTH, PULSE_WIDTH, 0)
+    fft_length = comp.get_overlap_save_length(len(template))
+    template_spectrum = comp.get_chirp_spectrum(SAMPLE_RATE, BANDWIDTH, PULSE_WIDTH, 0, fft_length)
+
+    real_lags, _ = comp.matched_filter_chunk(samples, template_spectrum, len(template), fft_length, flush=True)
+    analytic_lags, _ = comp.matched_filter_chunk(samples, template_spectrum, len(template), fft_length, flush=True, analytic=True)
+
+    np.testing.assert_allclose(analytic_lags.real, real_lags, atol=1e-3 * np.max(np.abs(real_lags)))
+
+def test_detect_chirp_streaming_without_data(monkeypatch, tmp_path):
+    monkeypatch.setattr(det.anal, "process_data_chunks", lambda *args, **kwargs: None)
+
+    detection = det.detect_chirp_streaming("missing.vdif", BANDWIDTH, PULSE_WIDTH, 0, log_path=str(tmp_path / "detections.csv"))
+
+    assert detection["report"] is None
+    assert len(detection["detections"]) == 0
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+from scipy.interpolate import interp1d
+import src.vdif_builder as build
+
+SAMPLE_RATE = 1e6
+
+def doppler_shift_loop(data, rtt, sample_rate):
+    """
+    The per-sample loop doppler_shift was before it was vectorised.
+    """
+    dt = 1 / sample_rate
+    signal_time = np.arange(len(data)) * dt
+    rtt_shifted = rtt - np.min(rtt)
+    received_array = np.zeros(len(rtt))
+
+    for i, rtt_value in enumerate(rtt_shifted):
+        delayed_index = int((signal_time[i] - rtt_value) / dt)
+        if delayed_index >= len(data) or delayed_index < 0:
+            continue
+        received_array[i] = data[delayed_index]
+
+    return received_array.astype(np.int8)
+
+def inverse_doppler_shift_loop(received_data, rtt, sample_rate):
+    """
+    The per-sample loop inverse_doppler_shift was before it was vectorised.
+    """
+    dt = 1 / sample_rate
+    received_time = np.arange(len(received_data)) * dt
+    transmitted_time = received_time - (rtt - np.min(rtt))
+    transmitted_array = np.zeros(len(received_data), dtype=received_data.dtype)
+
+    valid_indices = (transmitted_time >= 0) & (transmitted_time < received_time[-1])
+    valid_received_data = received_data[valid_indices]
+    transmitted_indices = np.clip(np.round(transmitted_time[valid_indices] / dt).astype(int), 0, len(received_data) - 1)
+
+    for i in range(len(transmitted_indices)):
+        transmitted_array[transmitted_indices[i]] = valid_received_data[i]
+
+    return transmitted_array.astype(np.int8)
+
+def get_rtt(shape, num_samples):
+    time = np.arange(num_samples) / SAMPLE_RATE
+    if shape == "decreasing":
+        return 0.01 - 2e-3 * time
+    if shape == "constant":
+        return np.full(num_samples, 0.01)
+    if shape == "increasing":
+        return 0.01 + 2e-3 * time
+    return 0.01 + 3e-6 * np.sin(20 * time)
+
+@pytest.mark.parametrize("shape", ["decreasing", "constant", "increasing", "sinusoidal"])
+@pytest.mark.parametrize("num_samples", [1, 777, build.DOPPLER_CHUNK_SAMPLES + 3])
+def test_inverse_doppler_shift_matches_loop(shape, num_samples):
+    received_data = np.random.default_rng(num_samples).integers(-128, 128, num_samples).astype(np.int8)
+    rtt = get_rtt(shape, num_samples)
+
+    transmitted = build.inverse_doppler_shift(received_data, rtt, SAMPLE_RATE)
+
+    np.testing.assert_array_equal(transmitted, inverse_doppler_shift_loop(received_data, rtt, SAMPLE_RATE))
+
+@pytest.mark.parametrize("shape", ["decreasing", "constant", "increasing", "sinusoidal"])
+def test_compensator_chunks_match_loop(shape):
+    num_samples = 5000
+    received_data = np.random.default_rng(1).integers(-128, 128, num_samples).astype(np.int8)
+    rtt = get_rtt(shape, num_samples)
+
+    compensator = build.start_doppler_compensator(SAMPLE_RATE, lambda indices: rtt[indices], np.min(rtt))
+    chunks = [build.compensate_doppler_chunk(compensator, chunk) for chunk in np.array_split(received_data, [1, 2, 1000, 1001, 3333])]
+    chunks.append(build.flush_doppler_compensator(compensator))
+
+    np.testing.assert_array_equal(np.concatenate(chunks), inverse_doppler_shift_loop(received_data, rtt, SAMPLE_RATE))
+
+def test_fill_holes_holds_previous_sample():
+    num_samples = 5000
+    received_data = np.arange(1, num_samples + 1).astype(np.int8) | 1
+    rtt = get_rtt("decreasing", num_samples)
+
+    zero_filled = build.inverse_doppler_shift(received_data, rtt, SAMPLE_RATE)
+    hole_filled = build.inverse_doppler_shift(received_data, rtt, SAMPLE_RATE, fill_holes=True)
+
+    holes = np.flatnonzero(zero_filled == 0)
+    holes = holes[holes > 0]
+    assert len(holes) > 0
+    np.testing.assert_array_equal(hole_filled[holes], hole_filled[holes - 1])
+    np.testing.assert_array_equal(hole_filled[zero_filled != 0], zero_filled[zero_filled != 0])
+
+@pytest.mark.parametrize("shape", ["decreasing", "constant", "increasing", "sinusoidal"])
+def test_doppler_shift_matches_loop(shape):
+    num_samples = build.DOPPLER_CHUNK_SAMPLES + 1234
+    data = np.random.default_rng(2).integers(-128, 128, num_samples + 1000).astype(np.int8)
+    rtt = get_rtt(shape, num_samples)
+
+    np.testing.assert_array_equal(build.doppler_shift(data, rtt, SAMPLE_RATE), doppler_shift_loop(data, rtt, SAMPLE_RATE))
+
+def test_doppler_shift_with_rtt_function_matches_rtt_array():
+    num_samples = 2 * build.DOPPLER_CHUNK_SAMPLES + 5
+    start_seconds = 15572600.0
+    data = np.random.default_rng(3).integers(-128, 128, num_samples + 1000).astype(np.int8)
+    knots = start_seconds + np.arange(-10.0, 10.0)
+    rtt_interp = interp1d(knots, 0.01 + 1e-4 * np.cos(knots / 3), kind="linear", fill_value="extrapolate")
+
+    rtt = rtt_interp(start_seconds + np.arange(num_samples) / SAMPLE_RATE)
+    rtt_reference = build.get_rtt_minimum(rtt_interp, start_seconds, start_seconds + (num_samples - 1) / SAMPLE_RATE)
+    shifted = build.doppler_shift_with_rtt_function(data, lambda indices: rtt_interp(start_seconds + indices / SAMPLE_RATE),
+                                                    rtt_reference, num_samples, SAMPLE_RATE)
+
+    assert rtt_reference == pytest.approx(np.min(rtt), abs=1e-12)
+    np.testing.assert_array_equal(shifted, doppler_shift_loop(data, rtt, SAMPLE_RATE))
@@ -0,0 +1,65 @@
+import numpy as np
+import src.vdif_builder as build
+import src.vdif_file as vf
+
+SAMPLE_RATE = 1_000_000
+SAMPLES_PER_FRAME = SAMPLE_RATE // 1000
+START_SECONDS = 15572600
+
+def write_vdif_file(path, num_frames):
+    samples = np.random.default_rng(0).integers(-100, 100, num_frames * SAMPLES_PER_FRAME).astype(np.int8)
+    build.create_vdif_file(samples, SAMPLE_RATE, str(path), start_seconds_from_epoch=START_SECONDS)
+    return samples.reshape(num_frames, SAMPLES_PER_FRAME), path.read_bytes()
+
+def test_chunks_within_a_gap_are_zeros(tmp_path):
+    samples, contents = write_vdif_file(tmp_path / "full.vdif", 2000)
+    frame_length = len(contents) // 2000
+
+    # Drop frames 250 to 849, several whole chunks
+    gap_path = tmp_path / "gap.vdif"
+    gap_path.write_bytes(contents[:250 * frame_length] + contents[850 * frame_length:])
+    expected = samples.copy()
+    expected[250:850] = 0
+
+    with vf.VdifFile(str(gap_path)) as session:
+        chunks = [(np.array(data["samples"]), data["time_axis"]) for _, data in session.iterate_chunks(START_SECONDS, START_SECONDS + 2, frames_per_chunk=100)]
+
+    np.testing.assert_array_equal(np.concatenate([chunk for chunk, _ in chunks]), expected.reshape(-1))
+    assert [time_axis["start_frame_number"] for _, time_axis in chunks] == list(range(0, 1000, 100)) * 2
+    assert [time_axis["missing_frames"] for _, time_axis in chunks][2:9] == [50, 100, 100, 100, 100, 100, 50]
+
+def test_incremental_update_matches_full_rebuild(tmp_path):
+    _, contents = write_vdif_file(tmp_path / "full.vdif", 2000)
+    frame_length = len(contents) // 2000
+    frames = [bytearray(contents[frame * frame_length:(frame + 1) * frame_length]) for frame in range(2000)]
+
+    # A gap, a swapped pair of frames and a run of invalid frames
+    for frame in frames[400:405]:
+        frame[3] |= 0x80
+    frames[300], frames[301] = frames[301], frames[300]
+    del frames[100:150]
+    contents = b"".join(frames)
+
+    full_path = tmp_path / "irregular.vdif"
+    full_path.write_bytes(contents)
+    with vf.VdifFile(str(full_path)) as session:
+        expected = session.index
+
+    # Grow the file in pieces that end part way through frames and between the swapped pair
+    growing_path = tmp_path / "growing.vdif"
+    ends = [120 * frame_length + 5, 251 * frame_length, 1234 * frame_length + 500, len(contents)]
+    growing_path.write_bytes(contents[:ends[0]])
+    with vf.VdifFile(str(growing_path)) as session:
+        session.index
+        for start, end in zip(ends[:-1], ends[1:]):
+            with open(growing_path, "ab") as growing_file:
+                growing_file.write(contents[start:end])
+            session.refresh()
+        index = session.index
+
+    assert index["file_size"] == expected["file_size"]
+    assert index["threads"].keys() == expected["threads"].keys()
+    for thread_id, thread_index in expected["threads"].items():
+        assert index["threads"][thread_id].keys() == thread_index.keys()
+        for key, value in thread_index.items():
+            np.testing.assert_array_equal(index["threads"][thread_id][key], value, err_msg=key)
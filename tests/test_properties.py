@@ -0,0 +1,44 @@
+import numpy as np
+import src.vdif_builder as build
+import src.vdif_file as vf
+import src.vdif_properties as props
+
+SAMPLE_RATE = 1_000_000
+START_SECONDS = 15572600.5
+
+def write_vdif_file(path, num_samples):
+    samples = np.random.default_rng(0).integers(-50, 50, num_samples).astype(np.int8)
+    build.create_vdif_file(samples, SAMPLE_RATE, str(path), start_seconds_from_epoch=START_SECONDS)
+    return path.read_bytes()
+
+def test_properties_of_file_cut_part_way_through_a_second_and_a_frame(tmp_path):
+    full_file = write_vdif_file(tmp_path / "full.vdif", 3 * SAMPLE_RATE)
+    frame_length = len(full_file) // 3000
+
+    cut_path = tmp_path / "cut.vdif"
+    cut_path.write_bytes(full_file[:1500 * frame_length + frame_length // 2])
+    properties = props.get_vdif_file_properties(str(cut_path))
+
+    assert properties["frames_per_second"] == 1000
+    assert properties["sample_rate"] == SAMPLE_RATE
+    assert properties["total_frames"] == 1500
+    assert properties["end_seconds_from_epoch"] == int(START_SECONDS) + 2
+
+def test_refresh_of_growing_file(tmp_path):
+    full_file = write_vdif_file(tmp_path / "full.vdif", 3 * SAMPLE_RATE)
+    frame_length = len(full_file) // 3000
+
+    growing_path = tmp_path / "growing.vdif"
+    growing_path.write_bytes(full_file[:700 * frame_length + 3])
+
+    with vf.VdifFile(str(growing_path)) as session:
+        session.index
+        with open(growing_path, "ab") as growing_file:
+            growing_file.write(full_file[700 * frame_length + 3:1900 * frame_length + 77])
+
+        new_headers = session.refresh()
+
+        assert len(new_headers) == 1200
+        assert session.properties["frames_per_second"] == 1000
+        assert session.properties["sample_rate"] == SAMPLE_RATE
+        assert session.properties["total_frames"] == 1900
@@ -0,0 +1,67 @@
+import mmap
+import numpy as np
+import pytest
+import src.vdif_builder as build
+import src.vdif_data_frame_reader as fr
+import src.vdif_properties as props
+
+SAMPLE_RATE = 1_000_000
+SAMPLES_PER_FRAME = SAMPLE_RATE // 1000
+START_SECONDS = 15572600
+INVALID_FRAMES = [0, 7, 8, 500, 1999]
+
+@pytest.fixture
+def vdif_file(tmp_path):
+    samples = np.random.default_rng(0).integers(-100, 100, 2 * SAMPLE_RATE).astype(np.int8)
+    path = tmp_path / "invalid.vdif"
+    build.create_vdif_file(samples, SAMPLE_RATE, str(path), start_seconds_from_epoch=START_SECONDS)
+
+    # The invalid data flag is the top bit of word 0
+    contents = bytearray(path.read_bytes())
+    frame_length = len(contents) // 2000
+    for frame in INVALID_FRAMES:
+        contents[frame * frame_length + 3] |= 0x80
+    path.write_bytes(bytes(contents))
+
+    expected = samples.reshape(-1, SAMPLES_PER_FRAME).copy()
+    expected[INVALID_FRAMES] = 0
+    return str(path), expected.reshape(-1)
+
+@pytest.mark.parametrize("workers", [1, 2, 3])
+def test_time_range_is_the_same_for_any_number_of_workers(vdif_file, workers):
+    path, expected = vdif_file
+    file_info = props.get_vdif_file_properties(path)
+
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mmapped_file:
+        header, data = fr.generate_data_from_time_range(file_info, mmapped_file, START_SECONDS, START_SECONDS + 2, workers)
+        samples = np.array(data["samples"])
+        time_axis = data["time_axis"]
+        del data
+
+    np.testing.assert_array_equal(samples, expected)
+    assert time_axis["missing_frames"] == len(INVALID_FRAMES)
+    assert time_axis["start_seconds_from_epoch"] == START_SECONDS
+    assert time_axis["start_frame_number"] == 0
+
+def test_chunks_mask_invalid_frames(vdif_file):
+    path, expected = vdif_file
+    file_info = props.get_vdif_file_properties(path)
+
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mmapped_file:
+        chunks = [(np.array(data["samples"]), data["time_axis"]["missing_frames"])
+                  for _, data in fr.iterate_data_chunks(file_info, mmapped_file, START_SECONDS, START_SECONDS + 2, frames_per_chunk=300)]
+
+    np.testing.assert_array_equal(np.concatenate([samples for samples, _ in chunks]), expected)
+    assert sum(missing for _, missing in chunks) == len(INVALID_FRAMES)
+
+def test_parallel_decode_without_fork(vdif_file, monkeypatch):
+    path, expected = vdif_file
+    file_info = props.get_vdif_file_properties(path)
+    monkeypatch.setattr(fr.multiprocessing, "get_all_start_methods", lambda: ["spawn"])
+
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mmapped_file:
+        _, data = fr.generate_data_from_time_range(file_info, mmapped_file, START_SECONDS, START_SECONDS + 2, 2)
+        samples = np.array(data["samples"])
+        del data
+
+    np.testing.assert_array_equal(samples, expected)